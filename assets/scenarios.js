@@ -0,0 +1,266 @@
+// Clientside evaluation of the recovery toggles (CLIENTSIDE_SCENARIOS=1).
+//
+// The server sends a bundle per price snapshot: the priced sheets and the ops of every recovery toggle
+// (data_processing/clientside.py). Toggling then applies the ops here, the way data_processing/ops.py applies them
+// to the ledgers, and rebuilds the figures as components/visualizations.py does. fixtures/check_clientside_parity.js
+// checks this file against the Python results.
+(function () {
+    var RELEVANT_ITEMS = ["Cash / Stablecoin", "Crypto - Category A", "Crypto - Category B", "Venture Investments",
+                          "Liquid Securities", "Clawbacks"];
+    var PIE_EXCLUDED = ['Crypto - Category A', 'Crypto - Category B', 'Liquid Securities', 'Venture Investments',
+                        'Property', 'Related Party Receivables', 'Clawbacks', 'Subsidiary Sales'];
+    var EXCHANGES = [
+        ['ftx_intl', 'ftx_intl_crypto_df', 'ftx_international_related_party_df'],
+        ['ftx_us', 'ftx_us_crypto_df', 'ftx_us_related_party_df']
+    ];
+    // plotly.express.colors.qualitative.D3
+    var COLORS = ['#1F77B4', '#FF7F0E', '#2CA02C', '#D62728', '#9467BD', '#8C564B', '#E377C2', '#7F7F7F',
+                  '#BCBD22', '#17BECF'];
+
+    // Python's round(): halves go to the even neighbour
+    function roundHalfEven(x) {
+        var floor = Math.floor(x);
+        var diff = x - floor;
+        if (diff > 0.5) return floor + 1;
+        if (diff < 0.5) return floor;
+        return floor % 2 === 0 ? floor : floor + 1;
+    }
+
+    function nansum(values) {
+        var total = 0;
+        for (var i = 0; i < values.length; i++) {
+            if (!isNaN(values[i])) total += values[i];
+        }
+        return total;
+    }
+
+    function loadSheets(bundle) {
+        var sheets = {};
+        Object.keys(bundle.sheets).forEach(function (name) {
+            var sheet = bundle.sheets[name];
+            var width = sheet.columns.length;
+            sheets[name] = {
+                index: sheet.index.slice(),
+                columns: sheet.columns,
+                rows: sheet.index.map(function (_, i) {
+                    return sheet.values.slice(i * width, (i + 1) * width).map(function (v) { return v === null ? NaN : v; });
+                })
+            };
+        });
+        return sheets;
+    }
+
+    function rowOf(sheet, label) {
+        return sheet.index.indexOf(label);
+    }
+
+    function get(sheet, row, column) {
+        return sheet.rows[rowOf(sheet, row)][sheet.columns.indexOf(column)];
+    }
+
+    function columnValues(sheet, column) {
+        var j = sheet.columns.indexOf(column);
+        return sheet.rows.map(function (row) { return row[j]; });
+    }
+
+    function applyAdd(sheets, op) {
+        var values = [];
+        op.sources.forEach(function (source) {
+            var sheet = sheets[source[0]];
+            if (source[1] === null) {
+                values = values.concat(columnValues(sheet, source[2]));
+            } else {
+                values.push(get(sheet, source[1], source[2]));
+            }
+        });
+        var amount;
+        if (op.rounding === 'each') {
+            amount = nansum(values.map(function (v) { return isNaN(v) ? v : roundHalfEven(v * op.scale); }));
+        } else {
+            amount = nansum(values) * op.scale;
+        }
+        if (op.rounding === 'total') amount = roundHalfEven(amount);
+
+        var target = sheets[op.target[0]];
+        if (rowOf(target, op.target[1]) < 0) {
+            target.index.push(op.target[1]);
+            target.rows.push(target.columns.map(function () { return 0; }));
+        }
+        target.rows[rowOf(target, op.target[1])][target.columns.indexOf(op.target[2])] += amount;
+    }
+
+    function applyZero(sheets, op) {
+        var sheet = sheets[op.sheet];
+        var columns = op.columns === null ? sheet.columns : op.columns;
+        sheet.index.forEach(function (label, i) {
+            if (op.rows !== null && op.rows.indexOf(label) < 0) return;
+            columns.forEach(function (column) { sheet.rows[i][sheet.columns.indexOf(column)] = 0; });
+        });
+    }
+
+    function evaluate(bundle, selected) {
+        // Sheets after the selected recovery toggles, applied in the bundle's order
+        var sheets = loadSheets(bundle);
+        bundle.order.forEach(function (toggle) {
+            if (selected.indexOf(toggle) < 0) return;
+            bundle.ops[toggle].forEach(function (op) {
+                if (op.op === 'add') applyAdd(sheets, op); else applyZero(sheets, op);
+            });
+        });
+        return sheets;
+    }
+
+    function exchangeDict(crypto, relatedParty) {
+        var assets = [], liabilities = [];
+        RELEVANT_ITEMS.forEach(function (item) {
+            if (rowOf(crypto, item) < 0) return;
+            assets.push([item, get(crypto, item, 'Located Assets')]);
+            liabilities.push([item, get(crypto, item, 'Customer Payables')]);
+        });
+        assets.push(['Receivables', nansum(columnValues(relatedParty, 'Estimated Receivables'))]);
+        liabilities.push(['Related Party Payables', nansum(columnValues(relatedParty, 'Estimated Payables'))]);
+        return {assets: assets, liabilities: liabilities};
+    }
+
+    function sumValues(items) {
+        return items.reduce(function (total, item) { return total + item[1]; }, 0);
+    }
+
+    function exchangeOutputs(sheets) {
+        // Recovery rates, bar items and pie slices, as the server-side callback computes them
+        var outputs = {recovery_rates: {}, exchanges: {}, pies: {}};
+        EXCHANGES.forEach(function (exchange) {
+            var crypto = sheets[exchange[1]];
+            var dict = exchangeDict(crypto, sheets[exchange[2]]);
+            outputs.exchanges[exchange[0]] = dict;
+            outputs.recovery_rates[exchange[0]] = sumValues(dict.assets) / sumValues(dict.liabilities) * 100;
+
+            var labels = [], values = [];
+            crypto.index.forEach(function (label) {
+                var value = get(crypto, label, 'Located Assets');
+                if (PIE_EXCLUDED.indexOf(label) < 0 && value > 0) {
+                    labels.push(label);
+                    values.push(value);
+                }
+            });
+            outputs.pies[exchange[0]] = {labels: labels, values: values};
+        });
+        return outputs;
+    }
+
+    function barTraces(dict) {
+        var colors = {}, traces = [], traceIndex = {};
+        ['assets', 'liabilities'].forEach(function (category) {
+            dict[category].forEach(function (item) {
+                if (!(item[0] in colors)) colors[item[0]] = COLORS[Object.keys(colors).length % COLORS.length];
+            });
+        });
+        ['assets', 'liabilities'].forEach(function (category) {
+            dict[category].forEach(function (item) {
+                if (item[1] === 0) return;
+                if (item[0] in traceIndex) {
+                    traces[traceIndex[item[0]]].x.push(category);
+                    traces[traceIndex[item[0]]].y.push(item[1]);
+                    return;
+                }
+                traceIndex[item[0]] = traces.length;
+                traces.push({
+                    hovertemplate: '<b>%{fullData.name}</b><br><i>Amount</i>: %{y}<extra></extra>',
+                    marker: {color: colors[item[0]]},
+                    name: item[0], x: [category], y: [item[1]], type: 'bar'
+                });
+            });
+        });
+        return traces;
+    }
+
+    function pieTrace(template, pie) {
+        var trace = Object.assign({}, template);
+        trace.labels = pie.labels;
+        trace.values = pie.values;
+        return trace;
+    }
+
+    function formatRate(rate, cap) {
+        return String(roundHalfEven(cap ? Math.min(rate, 100) : rate));
+    }
+
+    var api = {roundHalfEven: roundHalfEven, evaluate: evaluate, exchangeOutputs: exchangeOutputs, barTraces: barTraces};
+
+    if (typeof window !== 'undefined') {
+        var noUpdate = function () { return window.dash_clientside.no_update; };
+        window.dash_clientside = Object.assign({}, window.dash_clientside, {
+            scenarios: {
+                update_checkboxes: function (newValues, pricingValues, oldValues) {
+                    // Same rules as update_checkboxes in main.py
+                    newValues = newValues || [];
+                    var added = newValues.filter(function (v) { return (oldValues || []).indexOf(v) < 0; });
+                    if (added.indexOf('CLAIM_ALAMEDA') >= 0 &&
+                        (newValues.indexOf('SUBCON') >= 0 || newValues.indexOf('SUBCON_US') >= 0)) {
+                        newValues = newValues.filter(function (v) { return v !== 'SUBCON' && v !== 'SUBCON_US'; });
+                    }
+                    if ((added.indexOf('SUBCON') >= 0 || added.indexOf('SUBCON_US') >= 0) &&
+                        newValues.indexOf('CLAIM_ALAMEDA') >= 0) {
+                        newValues = newValues.filter(function (v) { return v !== 'CLAIM_ALAMEDA'; });
+                    }
+                    return [newValues, newValues];
+                },
+                update_exchange_graphs: function (selected, bundle, dotcomFigure, usFigure, intlPie, usPie) {
+                    if (!bundle) return [noUpdate(), noUpdate(), noUpdate(), noUpdate(), noUpdate()];
+                    var outputs = exchangeOutputs(evaluate(bundle, selected || []));
+                    return [
+                        {data: barTraces(outputs.exchanges.ftx_intl), layout: dotcomFigure.layout},
+                        {data: barTraces(outputs.exchanges.ftx_us), layout: usFigure.layout},
+                        {data: [pieTrace(intlPie.data[0], outputs.pies.ftx_intl)], layout: intlPie.layout},
+                        {data: [pieTrace(usPie.data[0], outputs.pies.ftx_us)], layout: usPie.layout},
+                        outputs.recovery_rates
+                    ];
+                },
+                update_recovery_rates: function (data, selected) {
+                    // Same rules as update_recovery_rates in main.py
+                    selected = selected || [];
+                    var recovery = ['CLAIM_ALAMEDA', 'SUBCON', 'SUBCON_US'];
+                    if (!data || Object.keys(data).length === 0 ||
+                        (recovery.every(function (v) { return selected.indexOf(v) < 0; }) && selected.length <= 1)) {
+                        return ["Recovery Rate: N/A%", "Recovery Rate: N/A%"];
+                    }
+                    var intl = "N/A", us = "N/A";
+                    if (selected.indexOf('SUBCON') >= 0 || selected.indexOf('CLAIM_ALAMEDA') >= 0) {
+                        if ('ftx_intl' in data) intl = formatRate(data.ftx_intl, false);
+                        if ('ftx_us' in data) us = formatRate(data.ftx_us, true);
+                    }
+                    if (selected.indexOf('SUBCON_US') >= 0 && 'ftx_us' in data) us = formatRate(data.ftx_us, true);
+                    return ["Recovery Rate: " + intl + "%", "Recovery Rate: " + us + "%"];
+                },
+                update_recovery_history_graph: function (selected, bundle) {
+                    // Same figure as create_recovery_history_graph in main.py, with the combination's series
+                    var history = bundle && bundle.history;
+                    if (!history) return noUpdate();
+                    selected = selected || [];
+                    var key = selected.filter(function (v) { return bundle.order.indexOf(v) >= 0; })
+                        .sort().join('|');
+                    var series = history.series[key];
+                    var figure = JSON.parse(JSON.stringify(history.figure));
+                    figure.data.forEach(function (trace, i) { trace.y = series ? series[i] : []; });
+                    var label = selected.slice().sort().join(', ');
+                    figure.layout.title.text = 'Recovery Rate Since the Petition Date' + (label ? ' - ' + label : '');
+                    return figure;
+                },
+                update_recovery_distribution: function (selected, bundle) {
+                    var key = (selected || []).slice().sort().join('|');
+                    var distribution = bundle && bundle.distributions && bundle.distributions[key];
+                    if (!distribution) return ['', ''];
+                    return ['ftx_intl', 'ftx_us'].map(function (name) {
+                        var summary = distribution[name], p = summary.percentiles;
+                        return 'Simulated (' + summary.draws.toLocaleString('en-US') + ' draws): 5th ' +
+                            p['5'].toFixed(0) + '% | median ' + p['50'].toFixed(0) + '% | 95th ' + p['95'].toFixed(0) + '%';
+                    });
+                }
+            }
+        });
+    }
+
+    if (typeof module !== 'undefined' && module.exports) {
+        module.exports = api;
+    }
+})();
@@ -0,0 +1,364 @@
+"""Benchmark suite.
+
+    python -m benchmarks.run [--scales 1,10,100] [--only NAME] [--output PATH] [--compare PATH]
+
+Times loading, the transforms, the figures and a full callback on the real workbook and on synthetic copies with
+10x and 100x the token rows (benchmarks/workbooks.py), so costs that grow with the book show up. The import time and
+peak memory of the computation core, the pricing layer, the batch runner and the app are measured in fresh
+interpreters (IMPORT_BENCHMARKS). Results go to benchmarks/results/<commit>.json; ``--compare`` prints the change
+against an earlier results file and exits 1 if anything got more than REGRESSION_THRESHOLD times slower.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Keep the suite off the network and out of the app's own caches; these are read when the modules load
+BENCH_DIR = tempfile.mkdtemp(prefix='ftx-bench-')
+os.environ['PRICE_REFRESHER'] = '0'
+os.environ['SCENARIO_WARMUP'] = ''
+os.environ['SCENARIO_CACHE_DIR'] = os.path.join(BENCH_DIR, 'scenario_cache')
+os.environ['DATASET_DIR'] = os.path.join(BENCH_DIR, 'versions')
+os.environ['DATASET_POLL'] = '0'
+
+import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
+from data_processing.data import load_data, load_petition_prices
+from data_processing.ops import apply_ops
+from data_processing.scenario_cache import ScenarioCache
+from data_processing.scenario_state import ScenarioState
+from data_processing.scenarios import SCENARIO_SHEETS, ScenarioEngine, all_scenarios
+from data_processing.transforms import claim_alameda, subcon_alameda_dotcom_ventures, subcon_wrs, zero_out_sam_coins, \
+    inject_last_close_crypto_prices, reprice, CATEGORY_A_CRYPTO
+from benchmarks.workbooks import scale_dataframes, scaled_ledgers, stub_prices, write_workbook
+
+RESULTS_DIR = os.path.join('benchmarks', 'results')
+DEFAULT_SCALES = [1, 10, 100]
+# Samples per benchmark, each at least MIN_SAMPLE_TIME long
+REPEAT = 5
+MIN_SAMPLE_TIME = 0.05
+REGRESSION_THRESHOLD = 1.2
+
+BENCHMARKS = []
+
+# Modules timed with -X importtime in a fresh interpreter. Importing main also loads the dataset and builds the layout,
+# so it is what a worker pays to start without gunicorn's preload_app.
+IMPORT_BENCHMARKS = ['data_processing.scenarios', 'data_processing.pricing', 'data_processing.batch', 'main']
+
+
+def benchmark(name, scaled=True, per_call_setup=False):
+    """Register ``factory(context) -> (fn, setup)``; ``setup`` runs before every call when ``per_call_setup``."""
+    def register(factory):
+        BENCHMARKS.append((name, scaled, per_call_setup, factory))
+        return factory
+    return register
+
+
+def measure(fn, setup=None, per_call_setup=False, repeat=REPEAT):
+    # Seconds per call: min, median and spread over ``repeat`` samples, each a loop long enough to time reliably
+    if per_call_setup:
+        number = 1
+    else:
+        if setup:
+            setup()
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            if time.perf_counter() - start >= MIN_SAMPLE_TIME:
+                break
+            number *= 10
+
+    samples = []
+    for _ in range(repeat):
+        if setup and per_call_setup:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'number': number,
+        'repeat': repeat,
+    }
+
+
+# Printed by the child after the import: its resident memory in MB. Not ru_maxrss, which Linux carries across exec,
+# so the child would report this process's peak.
+RSS_SCRIPT = """
+try:
+    print(next(int(line.split()[1]) / 1024 for line in open('/proc/self/status') if line.startswith('VmRSS:')))
+except FileNotFoundError:
+    import resource, sys
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024))
+"""
+
+
+def measure_import(module, repeat=REPEAT):
+    """Cumulative import time of ``module`` as -X importtime reports it, one fresh interpreter per sample.
+
+    Also records the interpreter's resident memory once the import is done, and the modules with the most self time
+    in the median sample, which is where to look when the import gets slower.
+    """
+    script = f'import {module}\n{RSS_SCRIPT}'
+    samples = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], capture_output=True, text=True,
+                                 check=True)
+        # 'import time: <self us> | <cumulative us> | <indented module>', one line per module, children first
+        timings = [line[len('import time:'):].split('|') for line in process.stderr.splitlines()
+                   if line.startswith('import time:') and not line.endswith('imported package')]
+        timings = [(name.strip(), int(own), int(cumulative)) for own, cumulative, name in timings
+                   if own.strip().isdigit()]
+        total = next(cumulative for name, _, cumulative in reversed(timings) if name == module)
+        rss = float(process.stdout.split()[-1])
+        samples.append((total / 1e6, rss, timings))
+
+    samples.sort(key=lambda sample: sample[0])
+    times = [seconds for seconds, _, _ in samples]
+    _, rss, timings = samples[len(samples) // 2]
+    return {
+        'min': times[0],
+        'median': statistics.median(times),
+        'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'number': 1,
+        'repeat': repeat,
+        'rss_mb': rss,
+        'slowest': [[name, own / 1e6] for name, own, _ in sorted(timings, key=lambda timing: -timing[1])[:10]],
+    }
+
+
+class Context:
+    """The workbook at one scale, with the engine and stub prices built once for every benchmark."""
+
+    def __init__(self, dataframes, reference_prices, scale):
+        self.scale = scale
+        self.dataframes = scale_dataframes(dataframes, scale)
+        self.engine = ScenarioEngine(scaled_ledgers(dataframes, SCENARIO_SHEETS, scale))
+        self.prices = stub_prices(self.engine.baseline, reference_prices)
+        self.directory = os.path.join(BENCH_DIR, f'x{scale}')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def state(self):
+        return ScenarioState(self.engine.baseline)
+
+    def workbook(self):
+        # Synthetic xlsx for the cold-start benchmark, written on first use
+        path = os.path.join(self.directory, 'workbook.xlsx')
+        if not os.path.exists(path):
+            write_workbook(self.dataframes, path)
+        return path
+
+
+@benchmark('load_data_cold', per_call_setup=True)
+def bench_load_data_cold(context):
+    path = context.workbook()
+    snapshot_dir = os.path.join(context.directory, 'snapshot_cold')
+    return lambda: load_data(path, snapshot_dir), lambda: shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+@benchmark('load_data_snapshot')
+def bench_load_data_snapshot(context):
+    path = context.workbook()
+    snapshot_dir = os.path.join(context.directory, 'snapshot_warm')
+    return lambda: load_data(path, snapshot_dir), lambda: load_data(path, snapshot_dir)
+
+
+@benchmark('split_dict_roundtrip')
+def bench_split_dict(context):
+    # The to_dict(orient='split') store main.py used to send with every callback, kept as a reference point
+    def roundtrip():
+        stored = {key: df.to_dict(orient='split') for key, df in context.dataframes.items()}
+        return {key: pd.DataFrame(**split) for key, split in stored.items()}
+    return roundtrip, None
+
+
+@benchmark('scenario_cache_json')
+def bench_scenario_cache_json(context):
+    # What replaced it: the figures of a scenario written to and read back from the scenario cache
+    import main
+    figures = list(main.create_exchange_figs(context.engine.run(['SUBCON', 'ZERO_SAM'], [])))
+    return lambda: json.loads(json.dumps(figures, cls=PlotlyJSONEncoder)), None
+
+
+def transform_benchmark(name, builder):
+    @benchmark(f'transform_{name}')
+    def bench(context):
+        return lambda: apply_ops(context.state(), builder(context.state())), None
+    return bench
+
+
+transform_benchmark('claim_alameda', claim_alameda)
+transform_benchmark('subcon_alameda_dotcom_ventures', subcon_alameda_dotcom_ventures)
+transform_benchmark('subcon_wrs', subcon_wrs)
+transform_benchmark('zero_out_sam_coins', zero_out_sam_coins)
+
+
+@benchmark('transform_inject_last_close_crypto_prices')
+def bench_inject_crypto(context):
+    closes = {ticker: context.prices.get(ticker, 1.0) for ticker in CATEGORY_A_CRYPTO}
+    return lambda: inject_last_close_crypto_prices(context.state(), closes), None
+
+
+@benchmark('transform_reprice_all_tokens')
+def bench_reprice_all(context):
+    return lambda: reprice(context.state(), context.prices), None
+
+
+@benchmark('scenario_run_all_toggles')
+def bench_scenario_run(context):
+    # Every recovery toggle combination, repriced at the stub prices
+    scenarios = [selected for selected, _ in all_scenarios()]
+
+    def run():
+        for selected in scenarios:
+            context.engine.run(selected, [], token_prices=context.prices)
+    return run, None
+
+
+@benchmark('create_exchange_figs')
+def bench_create_exchange_figs(context):
+    import main
+    data = context.engine.run(['SUBCON', 'SUBCON_US', 'ZERO_SAM'], [])
+    return lambda: main.create_exchange_figs(data), None
+
+
+def callback_payload(selected_items):
+    outputs = [('ftx_dotcom_exchange_overview_graph', 'figure'), ('ftx_us_exchange_overview_graph', 'figure'),
+               ('ftx_intl_pie_chart', 'figure'), ('ftx_us_pie_chart', 'figure'), ('recovery-rate-store', 'data'),
+               ('displayed-scenario', 'data')]
+    return {
+        'output': '..' + '...'.join(f'{id}.{prop}' for id, prop in outputs) + '..',
+        'outputs': [{'id': id, 'property': prop} for id, prop in outputs],
+        'inputs': [{'id': 'exchange-overview-checkbox', 'property': 'value', 'value': selected_items},
+                   {'id': 'exchange-overview-checkbox-pricing', 'property': 'value', 'value': []}],
+        'state': [{'id': 'displayed-scenario', 'property': 'data', 'value': None}],
+        'changedPropIds': ['exchange-overview-checkbox.value'],
+    }
+
+
+@benchmark('callback_exchange_graphs_uncached', scaled=False, per_call_setup=True)
+def bench_callback_uncached(context):
+    # Full request through Flask and Dash with an empty scenario cache
+    import main
+    client = main.server.test_client()
+    payload = callback_payload(['SUBCON', 'ZERO_SAM'])
+
+    def empty_cache():
+        main.current().cache = ScenarioCache(f'bench-{time.perf_counter_ns()}', cache_dir=os.path.join(BENCH_DIR, 'cb'),
+                                             encoder=PlotlyJSONEncoder)
+
+    def post():
+        response = client.post('/_dash-update-component', json=payload)
+        assert response.status_code == 200, response.status_code
+    return post, empty_cache
+
+
+@benchmark('callback_exchange_graphs_cached', scaled=False)
+def bench_callback_cached(context):
+    import main
+    client = main.server.test_client()
+    payload = callback_payload(['SUBCON', 'ZERO_SAM'])
+
+    def post():
+        response = client.post('/_dash-update-component', json=payload)
+        assert response.status_code == 200, response.status_code
+    return post, None
+
+
+def commit_id():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], text=True))
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def run(scales, only=None, repeat=REPEAT):
+    dataframes = load_data()
+    reference_prices = load_petition_prices().to_dict()
+    results = {}
+    for scale in scales:
+        context = Context(dataframes, reference_prices, scale)
+        for name, scaled, per_call_setup, factory in BENCHMARKS:
+            if (not scaled and scale != 1) or (only and only not in name):
+                continue
+            key = f'{name}[x{scale}]' if scaled else name
+            fn, setup = factory(context)
+            results[key] = measure(fn, setup, per_call_setup, repeat)
+            print(f"{key:<60} {results[key]['median'] * 1000:10.3f} ms")
+    for module in IMPORT_BENCHMARKS:
+        key = f'import_{module}'
+        if only and only not in key:
+            continue
+        results[key] = measure_import(module, repeat)
+        print(f"{key:<60} {results[key]['median'] * 1000:10.3f} ms {results[key]['rss_mb']:8.1f} MB")
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Print the median ratio per benchmark; returns the names that got slower than ``threshold``
+    regressions = []
+    print(f"\n{'benchmark':<60} {'before':>10} {'after':>10} {'ratio':>7}")
+    for key, result in results.items():
+        if key not in baseline['results']:
+            continue
+        before, after = baseline['results'][key]['median'], result['median']
+        ratio = after / before if before else float('inf')
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{key:<60} {before * 1000:9.3f}ms {after * 1000:9.3f}ms {ratio:7.2f}{flag}")
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', default=','.join(map(str, DEFAULT_SCALES)),
+                        help='token row multipliers, comma separated')
+    parser.add_argument('--only', help='run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', help='results file (default benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    commit, dirty = commit_id()
+    try:
+        results = run([int(scale) for scale in args.scales.split(',')], args.only, args.repeat)
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            sys.exit(f"{len(regressions)} benchmarks slower than {REGRESSION_THRESHOLD}x")
+
+
+if __name__ == '__main__':
+    main()
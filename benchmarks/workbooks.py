@@ -0,0 +1,57 @@
+import pandas as pd
+from data_processing.data import SHEETS
+from data_processing.ledger import Ledger
+from data_processing.transforms import REPRICED_SHEETS
+
+# Close used for every synthetic token; real tokens get their petition price
+SYNTHETIC_PRICE = 1.25
+
+
+def token_rows(df):
+    # Rows that are single tokens held in quantity: not cash, not the category totals
+    quantity = pd.to_numeric(df['Quantity'], errors='coerce')
+    return [label for label, q in zip(df.index, quantity)
+            if q > 0 and not label.startswith(('Cash', 'Stablecoin', 'All Other', 'Crypto - '))]
+
+
+def scale_dataframes(dataframes, factor):
+    """Copy of the workbook with ``factor`` times the token rows in each repriced sheet.
+
+    Every token row gets ``factor - 1`` copies named ``<TOKEN>_<k>``, appended after the sheet's own rows. They are
+    held in quantity, so repricing and any op reading whole columns see them, but they are in no category total.
+    """
+    scaled = dict(dataframes)
+    if factor <= 1:
+        return scaled
+    for key in REPRICED_SHEETS:
+        df = dataframes[key]
+        tokens = df.loc[token_rows(df)]
+        copies = [tokens.rename(index=lambda label: f'{label}_{k}') for k in range(1, factor)]
+        scaled[key] = pd.concat([df] + copies)
+    return scaled
+
+
+def scaled_ledgers(dataframes, keys, factor):
+    scaled = scale_dataframes(dataframes, factor)
+    return {key: Ledger.from_frame(scaled[key]).freeze() for key in keys}
+
+
+def stub_prices(data, reference_prices):
+    # Close for every token row of the repriced sheets, real and synthetic, without touching the network. Synthetic
+    # copies take their token's reference price.
+    prices = {}
+    for key in REPRICED_SHEETS:
+        for label in data[key].index:
+            base, _, k = label.rpartition('_')
+            if label in reference_prices:
+                prices[label] = float(reference_prices[label])
+            elif k.isdigit():
+                prices[label] = float(reference_prices.get(base, SYNTHETIC_PRICE))
+    return prices
+
+
+def write_workbook(dataframes, path):
+    # Write the sheets back out as an xlsx, under their workbook names, for cold-start timings
+    with pd.ExcelWriter(path) as writer:
+        for key, sheet in SHEETS.items():
+            dataframes[key].to_excel(writer, sheet_name=sheet)
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import time
+from plotly.utils import PlotlyJSONEncoder
+from data_processing.snapshot import SNAPSHOT_DIR
+from components.visualizations import create_static_figures
+
+# Rendered startup figures live next to the workbook snapshot, one JSON file per workbook hash:
+#   figures/<hash>.json      create_static_figures' output
+STATIC_FIGURES_DIR = os.path.join(SNAPSHOT_DIR, 'figures')
+
+
+def static_figures_path(fingerprint, directory=STATIC_FIGURES_DIR):
+    return os.path.join(directory, f'{fingerprint[:16]}.json')
+
+
+def load_static_figures(fingerprint, load_dataframes, directory=STATIC_FIGURES_DIR, keep=()):
+    """Startup figures for the workbook with content hash ``fingerprint``, rendered only if not stored yet.
+
+    ``load_dataframes`` is only called on a miss, so a hit skips the workbook and Plotly's figure validation
+    altogether. Files of other workbooks are removed when a new one is written, except those of the fingerprints in
+    ``keep``.
+    """
+    path = static_figures_path(fingerprint, directory)
+    start = time.perf_counter()
+    try:
+        with open(path, 'r') as f:
+            figures = json.load(f)
+        print(f"Static figures: hit {path} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return figures
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    figures = json.loads(json.dumps(create_static_figures(load_dataframes()), cls=PlotlyJSONEncoder))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(figures, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    kept = {static_figures_path(other, directory) for other in keep} | {path}
+    for name in os.listdir(directory):
+        if name.endswith('.json') and os.path.join(directory, name) not in kept:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    print(f"Static figures: miss, rendered {path} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+    return figures
+
@@ -1,36 +1,11 @@
+import math
 import pandas as pd
 import plotly.graph_objects as go
-from dash import dcc, dash_table
+from plotly.colors import qualitative
+from dash import dcc, dash_table, Patch
 from dash import html
-import plotly.express as px
-
-CATEGORY_B_ASSETS = ["FTT", "MAPS", "SRM", "FIDA", "MEDIA", "OXY", "All Other - Category B"]
-ASSET_VALUE_COL = "Located Assets"
-
-def create_exchange_dict(crypto_df: pd.DataFrame, related_party_df: pd.DataFrame) -> dict:
-    relevant_cols = ["Cash / Stablecoin", "Crypto - Category A", "Crypto - Category B", "Venture Investments", "Liquid Securities", "Clawbacks"]
-    assets_dict = {
-        asset: crypto_df.loc[asset, ASSET_VALUE_COL]
-        for asset in relevant_cols
-        if asset in crypto_df.index
-    }
-    assets_dict["Receivables"] = related_party_df["Estimated Receivables"].sum()
-
-    # Create the dictionary for liabilities
-    liabilities_dict = {
-        liability: crypto_df.loc[liability, "Customer Payables"]
-        for liability in relevant_cols
-        if liability in crypto_df.index
-    }
-    liabilities_dict["Related Party Payables"] = related_party_df["Estimated Payables"].sum()
-
-    # Create the final exchange dictionary
-    exchange = {
-        "assets": assets_dict,
-        "liabilities": liabilities_dict,
-    }
-
-    return exchange
+from data_processing.ventures import VENTURES_PAGE_SIZE
+from data_processing.recovery import create_exchange_dict, calculate_recovery_rate
 
 def create_cash_graphs(cash_df: pd.DataFrame):
     cash_fig = go.Figure(data=[
@@ -39,8 +14,9 @@ def create_cash_graphs(cash_df: pd.DataFrame):
     return cash_fig.update_layout(barmode='stack')
 
 
-def create_silo_graphs(assets_df: pd.DataFrame, liabilities_df: pd.DataFrame):
-    silo_graphs = []
+def create_silo_figures(assets_df: pd.DataFrame, liabilities_df: pd.DataFrame):
+    # [(silo, figure)] for every silo column
+    silo_figures = []
 
     for i, column in enumerate(assets_df.columns):
         fig = go.Figure()
@@ -79,7 +55,17 @@ def create_silo_graphs(assets_df: pd.DataFrame, liabilities_df: pd.DataFrame):
             paper_bgcolor='rgb(29, 31, 43)',
             font_color='white',
         )
+        silo_figures.append((column, fig))
+    return silo_figures
+
+
+def create_silo_graphs(assets_df: pd.DataFrame, liabilities_df: pd.DataFrame):
+    return silo_graphs_from_figures(create_silo_figures(assets_df, liabilities_df))
+
 
+def silo_graphs_from_figures(silo_figures):
+    silo_graphs = []
+    for column, fig in silo_figures:
         silo_graph = dcc.Graph(id=f'{column}-graph', figure=fig)
         silo_graphs.append(html.Div(silo_graph, className="four columns", style={'margin-top': '10px'}))
     return silo_graphs
@@ -92,7 +78,7 @@ def create_exchange_graph(asset_df, related_party_df, exchange=""):
     exchange = create_exchange_dict(asset_df, related_party_df)
 
     unique_labels = set(exchange['assets'].keys()).union(set(exchange['liabilities'].keys()))
-    colors = px.colors.qualitative.D3
+    colors = qualitative.D3
     label_color_map = {label: colors[i % len(colors)] for i, label in enumerate(unique_labels)}
 
     fig = go.Figure()
@@ -133,25 +119,41 @@ def create_exchange_graph(asset_df, related_party_df, exchange=""):
     return fig.to_dict()
 
 
-def calculate_recovery_rate(asset_df, related_party_df):
-    # Calculate the recovery rate
-    exchange = create_exchange_dict(asset_df, related_party_df)
-    total_assets = sum(exchange['assets'].values())
-    total_liabilities = sum(exchange['liabilities'].values())
-    recovery_rate = total_assets / total_liabilities * 100  # the recovery rate as a percentage
+def ventures_table_data(ventures_df: pd.DataFrame):
+    # Columns, records and per-column max widths of the ventures table, all JSON-serialisable
+    ventures_df = ventures_df.reset_index()
+    return {
+        'columns': list(ventures_df.columns),
+        'records': ventures_df.to_dict('records'),
+        'widths': {col: int(max(ventures_df[col].astype(str).str.len().max(), len(col)) * 12)
+                   for col in ventures_df.columns},
+    }
 
-    return recovery_rate
 
 def create_ventures_table(ventures_df: pd.DataFrame):
-    ventures_df.reset_index(inplace=True)
+    return ventures_table_from_data(ventures_table_data(ventures_df))
+
+
+def ventures_table_from_data(table_data):
+    # Filtering, sorting and paging run on the server (update_ventures_table in main.py), so the table starts with
+    # the first page only
+    columns = table_data['columns']
 
     # Create the Dash table from the ventures DataFrame
     ventures_table = dash_table.DataTable(
         id='ventures-table',
-        columns=[{'name': col, 'id': col} for col in ventures_df.columns],
-        data=ventures_df.to_dict('records'),
-        virtualization=True,  # Enable vertical scrolling instead of pagination
-        filter_action='native',  # Enables the search functionality
+        columns=[{'name': col, 'id': col} for col in columns],
+        data=table_data['records'][:VENTURES_PAGE_SIZE],
+        page_action='custom',
+        page_current=0,
+        page_size=VENTURES_PAGE_SIZE,
+        page_count=max(math.ceil(len(table_data['records']) / VENTURES_PAGE_SIZE), 1),
+        filter_action='custom',  # Enables the search functionality
+        filter_query='',
+        filter_options={'case': 'insensitive'},
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
         style_table={
             'overflowX': 'scroll',  # Enable horizontal scrolling
             'overflowY': 'scroll',  # Enable vertical scrolling
@@ -191,16 +193,15 @@ def create_ventures_table(ventures_df: pd.DataFrame):
         style_data_conditional=[
            {
                'if': {'column_id': col},
-               'maxWidth': f"{max(ventures_df[col].astype(str).str.len().max(), len(col)) * 12}px"
-           } for col in ventures_df.columns
+               'maxWidth': f"{table_data['widths'][col]}px"
+           } for col in columns
        ] + [
            {
-               'if': {'column_id': ventures_df.columns[0]},
+               'if': {'column_id': columns[0]},
                'maxWidth': '100px',  # Set a max width of 200px for the first column
                'textAlign': 'left',
            }
        ],
-        page_action='none',  # Disable pagination
         fixed_rows={'headers': True},
     )
 
@@ -215,6 +216,9 @@ def create_exchange_crypto_pie_chart(crypto_df: pd.DataFrame, exchange_name):
                                 'Property', 'Related Party Receivables', 'Clawbacks', 'Subsidiary Sales'])
         & (crypto_df['Located Assets'] > 0)
         ]
+    # plotly.express takes longer to import than the rest of plotly that dash already loads, and only this chart
+    # uses it, so it loads with the first uncached scenario rather than at startup
+    import plotly.express as px
     fig = px.pie(filtered_df, values='Located Assets', names=filtered_df.index, title='Crypto Holdings')
     fig.update_layout(
         title=f'{exchange_name}',
@@ -228,10 +232,133 @@ def create_exchange_crypto_pie_chart(crypto_df: pd.DataFrame, exchange_name):
         paper_bgcolor='rgb(29, 31, 43)',
         font_color='white',
     )
-    return fig
+    return fig.to_dict()
+
+def create_sweep_graph(rates, x_label, x_values, y_label=None, y_values=None, exchange_name=""):
+    # Recovery rate (%) over one parameter as a line, or over two as a heatmap with rates[y, x]
+    if y_label is None:
+        fig = go.Figure(go.Scatter(x=list(x_values), y=list(rates[0]), mode='lines',
+                                   hovertemplate=f'{x_label}: %{{x}}<br>Recovery: %{{y:.1f}}%<extra></extra>'))
+        fig.update_layout(xaxis_title=x_label, yaxis_title='Recovery Rate (%)')
+    else:
+        fig = go.Figure(go.Heatmap(x=list(x_values), y=list(y_values), z=rates.tolist(), colorscale='Viridis',
+                                   colorbar=dict(title='Recovery (%)'),
+                                   hovertemplate=f'{x_label}: %{{x}}<br>{y_label}: %{{y}}<br>'
+                                                 f'Recovery: %{{z:.1f}}%<extra></extra>'))
+        fig.update_layout(xaxis_title=x_label, yaxis_title=y_label)
+    fig.update_layout(
+        title=f'{exchange_name} - Recovery Sensitivity',
+        autosize=False,
+        width=600,
+        height=500,
+        margin=dict(l=20, r=20, b=100, t=100, pad=10),
+        plot_bgcolor='rgb(29, 31, 43)',
+        paper_bgcolor='rgb(29, 31, 43)',
+        font_color='white',
+    )
+    return fig.to_dict()
+
+
+def create_tornado_chart(base, bars, exchange_name=""):
+    # ``bars`` is [(label, rate at the low end, rate at the high end)]; widest swing on top, zero swings left out
+    bars = sorted((bar for bar in bars if bar[1] != bar[2]), key=lambda bar: abs(bar[2] - bar[1]))
+    labels = [bar[0] for bar in bars]
+    fig = go.Figure()
+    for name, rates, color in [('Low', [bar[1] for bar in bars], 'rgb(214, 39, 40)'),
+                               ('High', [bar[2] for bar in bars], 'rgb(14, 200, 64)')]:
+        fig.add_trace(go.Bar(name=name, y=labels, x=[rate - base for rate in rates], base=base, orientation='h',
+                             marker_color=color, customdata=rates,
+                             hovertemplate='<b>%{y}</b><br>Recovery: %{customdata:.1f}%<extra>' + name + '</extra>'))
+    fig.update_layout(
+        barmode='overlay',
+        title=f'{exchange_name} - Recovery Rate Drivers (base {base:.1f}%)',
+        xaxis_title='Recovery Rate (%)',
+        autosize=False,
+        width=600,
+        height=500,
+        margin=dict(l=20, r=20, b=100, t=100, pad=10),
+        plot_bgcolor='rgb(29, 31, 43)',
+        paper_bgcolor='rgb(29, 31, 43)',
+        font_color='white',
+    )
+    return fig.to_dict()
+
+def create_recovery_history_graph(days, rates, exchange_names, scenario_label=""):
+    # Recovery rate (%) per day, one line per exchange; ``rates`` is (days, exchanges)
+    fig = go.Figure()
+    for i, name in enumerate(exchange_names):
+        fig.add_trace(go.Scatter(x=[str(day) for day in days], y=[round(float(rate), 2) for rate in rates[:, i]],
+                                 mode='lines', name=name,
+                                 hovertemplate='%{x}<br>Recovery: %{y:.1f}%<extra>' + name + '</extra>'))
+    if not len(days):
+        fig.add_annotation(text="No price history yet: run python -m data_processing.recovery_history",
+                           showarrow=False, xref='paper', yref='paper', x=0.5, y=0.5)
+    fig.update_layout(
+        title=f'Recovery Rate Since the Petition Date{" - " + scenario_label if scenario_label else ""}',
+        xaxis_title='Close Date',
+        yaxis_title='Recovery Rate (%)',
+        autosize=False,
+        width=1200,
+        height=500,
+        margin=dict(l=20, r=20, b=100, t=100, pad=10),
+        plot_bgcolor='rgb(29, 31, 43)',
+        paper_bgcolor='rgb(29, 31, 43)',
+        font_color='white',
+    )
+    return fig.to_dict()
 
-def create_visualizations(dataframes):
 
+def create_diff_table(columns):
+    # Changed cells between two workbook versions, filled by the compare callback; paged and sorted in the browser
+    return dash_table.DataTable(
+        id='version-diff-table',
+        columns=[{'name': col.title(), 'id': col} for col in columns],
+        data=[],
+        page_size=25,
+        sort_action='native',
+        filter_action='native',
+        style_table={'overflowX': 'auto', 'maxWidth': '1200px', 'backgroundColor': 'rgb(29, 31, 43)'},
+        style_header={'backgroundColor': 'rgb(29, 31, 43)', 'fontWeight': '900', 'color': 'white',
+                      'border': '2px solid #0A0E17'},
+        style_cell={'backgroundColor': 'rgb(29, 31, 43)', 'color': 'white', 'textAlign': 'center',
+                    'border': '1px solid #0A0E17', 'fontFamily': 'Inter', 'maxWidth': '300px',
+                    'overflow': 'hidden', 'textOverflow': 'ellipsis'},
+        style_filter={'color': 'white'},
+    )
+
+
+def patch_figure(displayed, figure):
+    """Patch turning the ``displayed`` figure dict into ``figure``; the whole figure if nothing is displayed yet.
+
+    Only trace attributes that differ are sent (usually just ``y`` or ``values``), plus any traces added or dropped
+    and the layout if it changed.
+    """
+    if displayed is None:
+        return figure
+
+    patch = Patch()
+    if displayed['layout'] != figure['layout']:
+        patch['layout'] = figure['layout']
+
+    old_traces, new_traces = displayed['data'], figure['data']
+    for i, (old_trace, new_trace) in enumerate(zip(old_traces, new_traces)):
+        for key in old_trace.keys() | new_trace.keys():
+            if key not in new_trace:
+                del patch['data'][i][key]
+            elif old_trace.get(key) != new_trace[key]:
+                patch['data'][i][key] = new_trace[key]
+    for trace in new_traces[len(old_traces):]:
+        patch['data'].append(trace)
+    # Drop surplus traces from the end, so the indices still to delete stay valid
+    for i in range(len(old_traces) - 1, len(new_traces) - 1, -1):
+        del patch['data'][i]
+    return patch
+
+def create_static_figures(dataframes):
+    """Every figure and table the page starts with, as one JSON-serialisable dict.
+
+    None of them depend on the request, so the result can be stored once per workbook (components/static_figures.py).
+    """
     cash_df = dataframes.get("cash_df")
     assets_df = dataframes.get("assets_df")
     liabilities_df = dataframes.get("liabilities_df")
@@ -241,26 +368,46 @@ def create_visualizations(dataframes):
     ftx_us_related_party_df = dataframes.get("ftx_us_related_party_df")
     ventures_df = dataframes.get("venture_df")
 
-    exchange_graphs = []
-    cash_graphs = create_cash_graphs(cash_df)
-    silo_graphs = create_silo_graphs(assets_df, liabilities_df)
-    ftx_intl_fig = create_exchange_graph(ftx_intl_crypto_df, ftx_international_related_party_df)
-    ftx_us_fig = create_exchange_graph(ftx_us_crypto_df, ftx_us_related_party_df, "US")
-    ftx_intl_crypto_pie_chart = create_exchange_crypto_pie_chart(ftx_intl_crypto_df, "FTX.COM - Cash & Crypto")
-    ftx_us_crypto_pie_chart = create_exchange_crypto_pie_chart(ftx_us_crypto_df, "FTX.US - Cash & Crypto")
-    ventures_table = create_ventures_table(ventures_df)
+    return {
+        "cash_graphs": create_cash_graphs(cash_df).to_dict(),
+        "silo_graphs": [(column, fig.to_dict()) for column, fig in create_silo_figures(assets_df, liabilities_df)],
+        "exchange_graphs": {
+            "ftx_intl": create_exchange_graph(ftx_intl_crypto_df, ftx_international_related_party_df),
+            "ftx_us": create_exchange_graph(ftx_us_crypto_df, ftx_us_related_party_df, "US"),
+        },
+        "exchange_pie_charts": {
+            "ftx_intl": create_exchange_crypto_pie_chart(ftx_intl_crypto_df, "FTX.COM - Cash & Crypto"),
+            "ftx_us": create_exchange_crypto_pie_chart(ftx_us_crypto_df, "FTX.US - Cash & Crypto"),
+        },
+        "ventures_table": ventures_table_data(ventures_df),
+    }
+
 
-    ftx_intl_recovery_rate = calculate_recovery_rate(ftx_intl_crypto_df, ftx_international_related_party_df)
-    ftx_us_recovery_rate = calculate_recovery_rate(ftx_us_crypto_df, ftx_us_related_party_df)
+def create_visualizations(dataframes):
+    return visualizations_from_figures(create_static_figures(dataframes))
+
+
+def visualizations_from_figures(figures):
+    # Components of the page, from create_static_figures' output or its stored JSON
+    exchange_graphs = []
+    cash_graphs = figures["cash_graphs"]
+    silo_graphs = silo_graphs_from_figures(figures["silo_graphs"])
+    ftx_intl_fig = figures["exchange_graphs"]["ftx_intl"]
+    ftx_us_fig = figures["exchange_graphs"]["ftx_us"]
+    ftx_intl_crypto_pie_chart = figures["exchange_pie_charts"]["ftx_intl"]
+    ftx_us_crypto_pie_chart = figures["exchange_pie_charts"]["ftx_us"]
+    ventures_table = ventures_table_from_data(figures["ventures_table"])
 
     exchange_graphs.append(html.Div([
         html.H5(f'Recovery Rate: N/A%%', id="ftx_dotcom_recovery_rate", style={"color": "rgb(14, 200, 64)"}),
+        html.Small(id="ftx_dotcom_recovery_distribution", style={"color": "gray"}),
         dcc.Graph(id='ftx_dotcom_exchange_overview_graph', figure=ftx_intl_fig),
         # show recovery rate under the graph
     ], className="four columns", style={'marginRight': '240px'}))  # added width to div
 
     exchange_graphs.append(html.Div([
         html.H5(f'Recovery Rate: N/A%', id="ftx_us_recovery_rate", style={"color": "rgb(14, 200, 64)"}),
+        html.Small(id="ftx_us_recovery_distribution", style={"color": "gray"}),
         dcc.Graph(id='ftx_us_exchange_overview_graph', figure=ftx_us_fig),
         # show recovery rate under the graph
     ], className="four columns"))  # added width to div
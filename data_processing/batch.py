@@ -0,0 +1,197 @@
+"""Recovery rates for a list of scenarios, without the dashboard.
+
+    python -m data_processing.batch [SCENARIOS.json] [--all] [--price TOGGLE=SOURCE] [--workers N] [-o report.csv]
+
+A scenario is a set of recovery toggles plus the prices to run them at. SCENARIOS.json holds a list of them:
+
+    [{"name": "subcon", "toggles": ["SUBCON", "ZERO_SAM"]},
+     {"toggles": ["CLAIM_ALAMEDA"], "prices": {"CATEGORY_A_UPDATE": "cached", "LIQUID_SEC_UPDATE": "live"}},
+     {"toggles": ["SUBCON"], "prices": {"CATEGORY_A_UPDATE": {"BTC": 60000, "ETH": 2500, ...}}},
+     {"toggles": [], "token_prices": "petition"}]
+
+Each price toggle takes 'cached' (the newest complete set in the price cache), 'live' (fetched now) or a
+{token: price} object. 'token_prices' reprices every token row first, from an object or the petition date prices.
+--all adds every recovery toggle combination, priced with the --price sources. Results have one row per scenario
+and exchange, written as CSV (to stdout without -o) or as Parquet when the output ends in .parquet.
+
+Nothing here imports dash, plotly, requests or yfinance; the pricing layer loads the last two for 'live' prices.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from data_processing.data import WORKBOOK_PATH, load_ledgers, load_petition_prices, workbook_fingerprint
+from data_processing.price_refresher import PriceRefresher, PRICE_SOURCES
+from data_processing.recovery_history import scenario_name
+from data_processing.scenarios import ScenarioEngine, SCENARIO_SHEETS, RECOVERY_TOGGLES, PRICING_TOGGLES, \
+    all_scenarios
+from data_processing.simulation import exchange_totals
+from data_processing.snapshot import SNAPSHOT_DIR
+
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 1))
+# Scenarios handed to a worker at a time; one run is a few milliseconds, so single scenarios would be all overhead
+BATCH_CHUNK = 32
+
+RESULT_COLUMNS = ['scenario', 'recovery_toggles', 'pricing_toggles', 'exchange', 'assets', 'liabilities',
+                  'recovery_rate']
+
+# Engine of each worker process, built once by init_worker
+_engine = None
+
+
+def batch_snapshot_dir(path):
+    # Snapshot of one workbook, keyed by its content as the registry keys versions, so a batch over another
+    # workbook never overwrites the dashboard's snapshot
+    return os.path.join(SNAPSHOT_DIR, 'batch', workbook_fingerprint(path)[:16])
+
+
+def init_worker(path, snapshot_dir):
+    # The ledgers wrap the memory-mapped snapshot, so every worker shares the parent's page cache
+    global _engine
+    _engine = ScenarioEngine(load_ledgers(SCENARIO_SHEETS, path=path, snapshot_dir=snapshot_dir))
+
+
+def run_scenario(scenario):
+    """(exchange, assets, liabilities, recovery rate) rows of one resolved scenario, run on this worker's engine."""
+    data = _engine.run(scenario['toggles'], list(scenario['prices']), scenario['prices'],
+                       token_prices=scenario['token_prices'])
+    return [(name, assets, liabilities, assets / liabilities * 100)
+            for name, (assets, liabilities, _) in exchange_totals(data).items()]
+
+
+class PriceSources:
+    """Prices for each (toggle, source), looked up once however many scenarios use them."""
+
+    def __init__(self):
+        self._refresher = None
+        self._resolved = {}
+
+    def cached(self, toggle):
+        if self._refresher is None:
+            self._refresher = PriceRefresher()
+            self._refresher.load_cached()
+        snapshot = self._refresher.snapshot()
+        if toggle not in snapshot:
+            raise ValueError(f"The price cache has no complete set of prices for {toggle}")
+        return snapshot[toggle]['prices']
+
+    def resolve(self, toggle, source):
+        if isinstance(source, dict):
+            return {token: float(price) for token, price in source.items()}
+        if source not in ('cached', 'live'):
+            raise ValueError(f"Unknown price source {source!r} for {toggle}, expected 'cached', 'live' or prices")
+        if (toggle, source) not in self._resolved:
+            if source == 'cached':
+                self._resolved[toggle, source] = self.cached(toggle)
+            else:
+                symbols, fetch = PRICE_SOURCES[toggle]
+                self._resolved[toggle, source] = fetch(symbols)
+        return self._resolved[toggle, source]
+
+    def token_prices(self, source):
+        if source is None:
+            return None
+        if source == 'petition':
+            if ('token_prices', source) not in self._resolved:
+                self._resolved['token_prices', source] = load_petition_prices()
+            return self._resolved['token_prices', source]
+        if isinstance(source, dict):
+            return pd.Series(source, dtype=float)
+        raise ValueError(f"Unknown token_prices {source!r}, expected 'petition' or prices")
+
+
+def resolve_scenarios(specs, sources):
+    """Scenario specs (as in the module docstring) with their toggles checked and every price source looked up."""
+    scenarios = []
+    for spec in specs:
+        toggles = list(spec.get('toggles', []))
+        unknown = [toggle for toggle in toggles if toggle not in RECOVERY_TOGGLES]
+        if unknown:
+            raise ValueError(f"Unknown recovery toggles {unknown}, expected some of {RECOVERY_TOGGLES}")
+        price_specs = spec.get('prices', {})
+        unknown = [toggle for toggle in price_specs if toggle not in PRICING_TOGGLES]
+        if unknown:
+            raise ValueError(f"Unknown price toggles {unknown}, expected some of {PRICING_TOGGLES}")
+        prices = {toggle: sources.resolve(toggle, price_specs[toggle])
+                  for toggle in PRICING_TOGGLES if toggle in price_specs}
+        scenarios.append({
+            'name': spec.get('name') or scenario_name(toggles) or 'baseline',
+            'toggles': toggles,
+            'prices': prices,
+            'token_prices': sources.token_prices(spec.get('token_prices')),
+        })
+    return scenarios
+
+
+def run_batch(scenarios, path=WORKBOOK_PATH, workers=BATCH_WORKERS):
+    """Results of resolved scenarios as a DataFrame with RESULT_COLUMNS, in scenario order."""
+    # Built here first so a stale snapshot is compiled once, not by every worker at the same time
+    snapshot_dir = batch_snapshot_dir(path)
+    init_worker(path, snapshot_dir)
+    if workers <= 1 or len(scenarios) <= 1:
+        outcomes = map(run_scenario, scenarios)
+        return results_frame(scenarios, outcomes)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(path, snapshot_dir)) as pool:
+        return results_frame(scenarios, pool.map(run_scenario, scenarios, chunksize=BATCH_CHUNK))
+
+
+def results_frame(scenarios, outcomes):
+    rows = [(scenario['name'], '|'.join(scenario['toggles']), '|'.join(scenario['prices']), *row)
+            for scenario, outcome in zip(scenarios, outcomes) for row in outcome]
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def write_results(results, output):
+    if output is None:
+        results.to_csv(sys.stdout, index=False)
+    elif output.endswith('.parquet'):
+        # Needs pyarrow or fastparquet, as pandas does
+        results.to_parquet(output, index=False)
+    else:
+        results.to_csv(output, index=False)
+
+
+def parse_price(argument):
+    toggle, _, source = argument.partition('=')
+    if not source:
+        raise argparse.ArgumentTypeError(f"expected TOGGLE=SOURCE, got {argument!r}")
+    return toggle, source
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenarios', nargs='?', help='JSON file with a list of scenarios')
+    parser.add_argument('--all', action='store_true', help='add every recovery toggle combination')
+    parser.add_argument('--price', type=parse_price, action='append', default=[], metavar='TOGGLE=SOURCE',
+                        help="price source for the --all scenarios, 'cached' or 'live'")
+    parser.add_argument('--workbook', default=WORKBOOK_PATH)
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS)
+    parser.add_argument('-o', '--output', help='.csv or .parquet file (default CSV on stdout)')
+    args = parser.parse_args()
+    if args.scenarios is None and not args.all:
+        parser.error('give a scenarios file, --all or both')
+
+    specs = []
+    if args.scenarios:
+        with open(args.scenarios, 'r') as f:
+            specs += json.load(f)
+    if args.all:
+        specs += [{'toggles': selected, 'prices': dict(args.price)} for selected, _ in all_scenarios()]
+
+    started = time.perf_counter()
+    try:
+        scenarios = resolve_scenarios(specs, PriceSources())
+    except ValueError as e:
+        parser.error(str(e))
+    results = run_batch(scenarios, args.workbook, args.workers)
+    write_results(results, args.output)
+    # Progress goes to stderr, so CSV on stdout stays clean
+    print(f"Batch: {len(scenarios)} scenarios, {len(results)} rows ({(time.perf_counter() - started) * 1000:.0f} ms)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Local stand-in for Binance's /api/v3/klines.
+
+    python -m data_processing.binance_stub [--port 8765]
+    BINANCE_API_URL=http://127.0.0.1:8765 python -m data_processing.price_history
+
+Serves deterministic daily klines for any symbol ending in USDT, so backfills, the price refresher and benchmarks
+can run offline. Paging follows Binance: klines opening from ``startTime`` up to ``endTime``, oldest first, at most
+``limit`` (1000 at most) per response.
+"""
+import argparse
+import json
+import threading
+import zlib
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+DAY_MS = 86_400_000
+MAX_LIMIT = 1000
+# Every symbol has klines from this day up to yesterday
+LISTED_FROM = '2020-01-01'
+
+
+def stub_close(symbol, day):
+    # Deterministic close for a symbol and day number: a seeded walk that is the same however it is paged
+    seed = zlib.crc32(symbol.encode())
+    base = 1 + seed % 1000
+    rng = np.random.default_rng([seed, day])
+    return round(base * (1 + 0.5 * np.sin(day / 90 + seed)) * (1 + 0.02 * rng.standard_normal()), 6)
+
+
+def klines(symbol, start_time, end_time, limit):
+    # Binance's kline row layout: open time, open, high, low, close, volume, close time, then volume fields
+    first = max(-(-start_time // DAY_MS), int(np.datetime64(LISTED_FROM, 'D').astype(np.int64)))
+    yesterday = int(datetime.now(timezone.utc).timestamp() * 1000) // DAY_MS - 1
+    last = min(end_time // DAY_MS if end_time is not None else yesterday, yesterday)
+    rows = []
+    for day in range(first, min(last + 1, first + limit)):
+        close = str(stub_close(symbol, day))
+        rows.append([day * DAY_MS, close, close, close, close, '0', (day + 1) * DAY_MS - 1, '0', 0, '0', '0', '0'])
+    return rows
+
+
+class KlinesHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path != '/api/v3/klines':
+            return self.reply(404, {'code': -1, 'msg': 'Not found.'})
+        symbol = params.get('symbol', '')
+        if not symbol.endswith('USDT'):
+            return self.reply(400, {'code': -1121, 'msg': 'Invalid symbol.'})
+        try:
+            start_time = int(params.get('startTime', 0))
+            end_time = int(params['endTime']) if 'endTime' in params else None
+            limit = min(int(params.get('limit', 500)), MAX_LIMIT)
+        except ValueError:
+            return self.reply(400, {'code': -1100, 'msg': 'Illegal characters found in a parameter.'})
+        self.server.requests += 1
+        self.reply(200, klines(symbol, start_time, end_time, limit))
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-MBX-USED-WEIGHT-1m', '1')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0):
+    """Start the stub on a daemon thread; returns the server, whose ``url`` goes in BINANCE_API_URL and whose
+    ``requests`` counts the kline requests answered."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), KlinesHandler)
+    server.requests = 0
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), KlinesHandler)
+    server.requests = 0
+    print(f"Binance stub on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
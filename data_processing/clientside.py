@@ -0,0 +1,101 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+from data_processing.scenarios import RECOVERY_ORDER, RECOVERY_OPS, SCENARIO_SHEETS, all_scenarios
+from data_processing.scenario_state import ScenarioState
+from data_processing.recovery import create_exchange_dict, calculate_recovery_rate
+from components.visualizations import create_exchange_crypto_pie_chart
+
+# Serve the recovery toggles from a clientside callback instead of the workers
+CLIENTSIDE_SCENARIOS = os.environ.get('CLIENTSIDE_SCENARIOS', '') == '1'
+
+PARITY_FIXTURE_PATH = os.path.join('fixtures', 'clientside_parity.json')
+PARITY_CHECK_SCRIPT = os.path.join('fixtures', 'check_clientside_parity.js')
+
+# Stub closes for the priced fixture case, so the fixture does not depend on the market
+FIXTURE_PRICES = {
+    'CATEGORY_A_UPDATE': {'BTC': 30000.0, 'ETH': 2000.0, 'SOL': 25.5, 'XRP': 0.5, 'BNB': 300.0, 'MATIC': 0.75,
+                          'TRX': 0.08, 'DOGE': 0.07, 'APT': 8.25},
+    'LIQUID_SEC_UPDATE': {'BITW': 12.5, 'ETHE': 9.75, 'GBTC': 21.0, 'HOOD': 10.5},
+}
+
+
+def _json_values(values):
+    # Row-major cells with blanks as null, since JSON has no NaN
+    return [None if np.isnan(v) else float(v) for v in np.asarray(values, dtype=np.float64).ravel()]
+
+
+def scenario_bundle(state):
+    """What the browser needs to apply the recovery toggles to ``state``, a priced state before any of them.
+
+    The sheets go as flat value lists and every toggle as its op list, so the bundle is a few KB. Ops are built
+    against ``state``, which fixes the Alameda recovery rate for the price toggles it was priced with.
+    """
+    return {
+        'sheets': {name: {'index': list(state[name].index), 'columns': list(state[name].columns),
+                          'values': _json_values(state[name].values)} for name in SCENARIO_SHEETS},
+        'ops': {toggle: [op.to_dict() for op in RECOVERY_OPS[toggle](state)] for toggle in RECOVERY_ORDER},
+        'order': RECOVERY_ORDER,
+    }
+
+
+def trace_array(values):
+    # A trace attribute of a figure dict; plotly 6 and later write numeric arrays as base64 typed arrays
+    if isinstance(values, dict) and 'bdata' in values:
+        return np.frombuffer(base64.b64decode(values['bdata']), dtype=values['dtype'])
+    return np.asarray(values)
+
+
+def expected_outputs(data):
+    # What the server-side callback shows for ``data``: recovery rates, the bars' items and the pie slices
+    outputs = {'recovery_rates': {}, 'exchanges': {}, 'pies': {}}
+    for name, crypto_key, related_party_key in [
+        ('ftx_intl', 'ftx_intl_crypto_df', 'ftx_international_related_party_df'),
+        ('ftx_us', 'ftx_us_crypto_df', 'ftx_us_related_party_df'),
+    ]:
+        crypto_df = data[crypto_key].to_frame()
+        related_party_df = data[related_party_key].to_frame()
+        exchange = create_exchange_dict(crypto_df, related_party_df)
+        outputs['recovery_rates'][name] = float(calculate_recovery_rate(crypto_df, related_party_df))
+        outputs['exchanges'][name] = {category: {item: float(value) for item, value in items.items()}
+                                      for category, items in exchange.items()}
+        pie = create_exchange_crypto_pie_chart(crypto_df, '')['data'][0]
+        outputs['pies'][name] = {'labels': list(trace_array(pie['labels'])),
+                                 'values': [float(v) for v in trace_array(pie['values'])]}
+    return outputs
+
+
+def parity_fixture(engine):
+    """Bundles plus the server's outputs for every recovery toggle combination, at petition and at stub prices."""
+    fixture = {'bundles': {}, 'cases': []}
+    for bundle_name, pricing_items in [('petition', []), ('priced', list(FIXTURE_PRICES))]:
+        priced = engine.run([], pricing_items, FIXTURE_PRICES)
+        fixture['bundles'][bundle_name] = scenario_bundle(priced)
+        for selected, _ in all_scenarios():
+            data = engine.run(selected, pricing_items, FIXTURE_PRICES)
+            fixture['cases'].append({'bundle': bundle_name, 'selected': selected, 'expected': expected_outputs(data)})
+    return fixture
+
+
+if __name__ == '__main__':
+    # python -m data_processing.clientside [--write]: check the Python engine against the shared fixture (or
+    # rewrite it), then run the same fixture through assets/scenarios.js with node
+    from data_processing.data import load_ledgers
+    from data_processing.scenarios import ScenarioEngine
+
+    fixture = parity_fixture(ScenarioEngine(load_ledgers(SCENARIO_SHEETS)))
+    if '--write' in sys.argv:
+        os.makedirs(os.path.dirname(PARITY_FIXTURE_PATH), exist_ok=True)
+        with open(PARITY_FIXTURE_PATH, 'w') as f:
+            json.dump(fixture, f, separators=(',', ':'))
+        print(f"Wrote {len(fixture['cases'])} cases to {PARITY_FIXTURE_PATH}")
+    else:
+        with open(PARITY_FIXTURE_PATH, 'r') as f:
+            stored = json.load(f)
+        if json.loads(json.dumps(fixture)) != stored:
+            sys.exit(f"Python results differ from {PARITY_FIXTURE_PATH}")
+        print(f"Python matches {len(stored['cases'])} cases in {PARITY_FIXTURE_PATH}")
+    sys.exit(subprocess.call(['node', PARITY_CHECK_SCRIPT, PARITY_FIXTURE_PATH]))
@@ -1,92 +1,84 @@
 import pandas as pd
-import requests
-import json
-import time
-from datetime import datetime, timedelta
-from dateutil import tz
-
-def load_data():
-    ftx_recovery_model_xlsx = pd.read_excel('FTX Public Overview.xlsx', sheet_name=None, header=0, index_col=0)
+import os
+from data_processing.ledger import Ledger
+from data_processing.price_cache import price_cache
+from data_processing.snapshot import SNAPSHOT_DIR, load_snapshot, write_snapshot, source_fingerprint, \
+    fresh_manifest, load_snapshot_arrays
+
+# Workbook and cached price loading, with no network access; the fetchers that fill the price cache are in
+# pricing.py
+
+# The estate report being served; the dataset registry watches it for new versions
+WORKBOOK_PATH = os.environ.get('WORKBOOK_PATH', 'FTX Public Overview.xlsx')
+PETITION_PRICES_PATH = 'ftx_crypto_prices.csv'
+
+
+def workbook_fingerprint(path=WORKBOOK_PATH):
+    # Content hash of the workbook, used to namespace anything derived from it
+    return source_fingerprint(path)
+
+
+# Workbook sheet behind each DataFrame key
+SHEETS = {
+    "cash_df": 'Cash',
+    "assets_df": 'Assets',
+    "liabilities_df": 'Liabilities',
+    "ftx_intl_crypto_df": 'FTX International Crypto',
+    "ftx_us_crypto_df": 'FTX US Crypto',
+    "ftx_international_related_party_df": 'FTX International Related Party',
+    "ftx_us_related_party_df": 'FTX US Related Party',
+    "alameda_df": 'Alameda Crypto',
+    "venture_df": 'Investments',
+    "securities_df": 'Securities',
+}
+
+
+def load_data(path=WORKBOOK_PATH, snapshot_dir=SNAPSHOT_DIR):
+    # Parsing the xlsx is the slowest part of boot, so it only happens when the compiled snapshot is stale
+    ftx_recovery_model_xlsx = load_snapshot(path, snapshot_dir)
+    if ftx_recovery_model_xlsx is None:
+        ftx_recovery_model_xlsx = pd.read_excel(path, sheet_name=None, header=0, index_col=0)
+        write_snapshot(ftx_recovery_model_xlsx, path, snapshot_dir)
 
     # Read Excel sheets into DataFrames
-    cash_df = ftx_recovery_model_xlsx['Cash']
-    assets_df = ftx_recovery_model_xlsx['Assets']
-    liabilities_df = ftx_recovery_model_xlsx['Liabilities']
-    securities_df = ftx_recovery_model_xlsx['Securities']
-
-    ftx_intl_crypto_df = ftx_recovery_model_xlsx['FTX International Crypto']
-    ftx_us_crypto_df = ftx_recovery_model_xlsx['FTX US Crypto']
-    ftx_international_related_party_df = ftx_recovery_model_xlsx['FTX International Related Party']
-    ftx_us_related_party_df = ftx_recovery_model_xlsx['FTX US Related Party']
-    alameda_df = ftx_recovery_model_xlsx['Alameda Crypto']
-    venture_df = ftx_recovery_model_xlsx['Investments']
-
-    dataframes = {
-        "cash_df": cash_df,
-        "assets_df": assets_df,
-        "liabilities_df": liabilities_df,
-        "ftx_intl_crypto_df": ftx_intl_crypto_df,
-        "ftx_us_crypto_df": ftx_us_crypto_df,
-        "ftx_international_related_party_df": ftx_international_related_party_df,
-        "ftx_us_related_party_df": ftx_us_related_party_df,
-        "alameda_df": alameda_df,
-        "venture_df": venture_df,
-        "securities_df" : securities_df,
-    }
+    dataframes = {key: ftx_recovery_model_xlsx[sheet] for key, sheet in SHEETS.items()}
 
     return dataframes
 
-def get_close_price(symbol, interval):
-    # Append 'USDT' to the symbol
-    symbol += 'USDT'
-
-    # Calculate the date of yesterday
-    yesterday = datetime.now() - timedelta(days=1)
-    yesterday_date = yesterday.strftime("%Y-%m-%d")
-
-    # Try to read from the cache file
-    try:
-        with open('cache.json', 'r') as f:
-            cache = json.load(f)
-
-        # Check if the data for the symbol and date is in the cache
-        if symbol in cache and yesterday_date in cache[symbol]:
-            return cache[symbol][yesterday_date]
-    except (FileNotFoundError, json.JSONDecodeError):
-        # If the file doesn't exist or is not valid JSON, create an empty cache
-        cache = {}
-
-    url = "https://api.binance.com/api/v3/klines"
 
-    # Calculate the timestamp of the start of yesterday
-    yesterday_start = datetime(yesterday.year, yesterday.month, yesterday.day, tzinfo=tz.tzutc())
-    timestamp = int(yesterday_start.timestamp() * 1000)
+def load_ledgers(keys, dataframes=None, path=WORKBOOK_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """Frozen ledgers for the given DataFrame keys.
 
-    params = {
-        'symbol': symbol,
-        'interval': interval,
-        'startTime': timestamp,
-        'limit': 1
-    }
+    When the snapshot is fresh the ledgers wrap its memory-mapped matrices, so every worker reads the same page-cache
+    pages instead of holding a private copy. Otherwise they are built from ``dataframes``.
+    """
+    manifest = fresh_manifest(path, snapshot_dir)
+    arrays = load_snapshot_arrays(manifest, snapshot_dir) if manifest else {}
 
-    response = requests.get(url, params=params)
-    data = response.json()
+    ledgers = {}
+    for key in keys:
+        entry = manifest['sheets'][SHEETS[key]] if manifest else None
+        if entry and entry['numeric'] == entry['columns']:
+            ledgers[key] = Ledger(entry['index'], entry['columns'], arrays[SHEETS[key]]).freeze()
+        else:
+            if dataframes is None:
+                dataframes = load_data(path, snapshot_dir)
+            ledgers[key] = Ledger.from_frame(dataframes[key]).freeze()
+    return ledgers
 
-    # The close price is at index 4
-    close_price = float(data[0][4])
+def load_petition_prices(path=PETITION_PRICES_PATH):
+    """Petition date price per token as a float Series indexed by token."""
+    prices = pd.read_csv(path, dtype=str)
+    values = pd.to_numeric(prices['petition_date_price'].str.replace(r'[$,]', '', regex=True))
+    return pd.Series(values.to_numpy(), index=prices['token'], dtype=float)
 
-    # Add the data to the cache and save it to the file
-    if symbol not in cache:
-        cache[symbol] = {}
-    cache[symbol][yesterday_date] = close_price
 
-    with open('cache.json', 'w') as f:
-        json.dump(cache, f)
+def binance_pair(symbol):
+    return symbol + 'USDT'
 
-    # Binance's X-MBX-USED-WEIGHT-(interval) header tells us how much of our rate limit we've used in the past interval
-    # If we've used more than 80% of our limit, sleep for a bit
-    if int(response.headers.get('X-MBX-USED-WEIGHT-1m', 0)) > 960:
-        print("Approaching rate limit, sleeping for a bit...")
-        time.sleep(10)
 
-    return close_price
\ No newline at end of file
+def load_cached_latest_prices(tokens):
+    """Newest close in the price cache for each token that has one, as a float Series indexed by token."""
+    latest = price_cache.latest([binance_pair(token) for token in tokens])
+    return pd.Series({token: latest[binance_pair(token)][1] for token in tokens if binance_pair(token) in latest},
+                     dtype=float)
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+
+
+def new_stats():
+    return {'sheets_copied': 0, 'rows_added': 0, 'cells_written': 0, 'bytes_copied': 0}
+
+
+class Ledger:
+    """One workbook sheet as a float64 matrix with label to position hash maps.
+
+    Blank cells are NaN and every sum skips them, as pandas does. A frozen ledger is read-only; ``view()`` returns a
+    ledger that shares its matrix and labels and copies them on the first write.
+    """
+
+    def __init__(self, index, columns, values):
+        self.index = list(index)
+        self.columns = list(columns)
+        # Float64 input is wrapped as is, so memory-mapped snapshot matrices stay shared
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.index), len(self.columns))
+        self.row_positions = {label: i for i, label in enumerate(self.index)}
+        self.column_positions = {label: j for j, label in enumerate(self.columns)}
+        self.stats = None
+        self._owns_values = True
+        self._owns_index = True
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df.index, df.columns, df.to_numpy(dtype=np.float64, na_value=np.nan))
+
+    def to_frame(self):
+        return pd.DataFrame(self.values.copy(), index=list(self.index), columns=list(self.columns))
+
+    def freeze(self):
+        if self.values.flags.writeable:
+            self.values.flags.writeable = False
+        self._owns_values = False
+        return self
+
+    def view(self, stats=None):
+        ledger = Ledger.__new__(Ledger)
+        ledger.index = self.index
+        ledger.columns = self.columns
+        ledger.values = self.values
+        ledger.row_positions = self.row_positions
+        ledger.column_positions = self.column_positions
+        ledger.stats = stats
+        ledger._owns_values = False
+        ledger._owns_index = False
+        return ledger
+
+    def __contains__(self, label):
+        return label in self.row_positions
+
+    def _record(self, key, amount):
+        if self.stats is not None:
+            self.stats[key] += amount
+
+    def _writable(self):
+        if not self._owns_values:
+            self.values = np.array(self.values, dtype=np.float64)
+            self._owns_values = True
+            self._record('sheets_copied', 1)
+            self._record('bytes_copied', self.values.nbytes)
+        return self.values
+
+    def row(self, label):
+        return self.row_positions[label]
+
+    def col(self, label):
+        return self.column_positions[label]
+
+    def rows(self, labels):
+        # Positions of the labels present in this sheet, in the order given
+        return [self.row_positions[label] for label in labels if label in self.row_positions]
+
+    def cols(self, labels):
+        if isinstance(labels, str):
+            labels = [labels]
+        return [self.column_positions[label] for label in labels]
+
+    def get(self, row_label, column_label):
+        return self.values[self.row_positions[row_label], self.column_positions[column_label]]
+
+    def set(self, row_label, column_label, value):
+        self._writable()[self.row_positions[row_label], self.column_positions[column_label]] = value
+        self._record('cells_written', 1)
+
+    def add(self, row_label, column_label, value):
+        self._writable()[self.row_positions[row_label], self.column_positions[column_label]] += value
+        self._record('cells_written', 1)
+
+    def set_rows(self, positions, column_label, values):
+        # Vectorised write of one column at the given row positions
+        self._writable()[positions, self.column_positions[column_label]] = values
+        self._record('cells_written', len(positions))
+
+    def column_values(self, column_label, row_labels):
+        return self.values[[self.row_positions[label] for label in row_labels], self.column_positions[column_label]]
+
+    def column_sum(self, column_labels, row_labels=None):
+        # Sum of one or more columns, optionally restricted to the row labels present in the sheet
+        block = self.values[:, self.cols(column_labels)]
+        if row_labels is not None:
+            block = block[self.rows(row_labels)]
+        return float(np.nansum(block))
+
+    def row_sums(self, row_labels, column_labels):
+        # Per-row sum across the given columns, one value per row label
+        block = self.values[np.ix_([self.row_positions[label] for label in row_labels], self.cols(column_labels))]
+        return np.nansum(block, axis=1)
+
+    def zero_rows(self, row_labels):
+        positions = self.rows(row_labels)
+        if positions:
+            self._writable()[positions, :] = 0
+            self._record('cells_written', len(positions) * len(self.columns))
+
+    def zero_columns(self, column_labels):
+        positions = self.cols(column_labels)
+        self._writable()[:, positions] = 0
+        self._record('cells_written', len(positions) * len(self.index))
+
+    def append_row(self, label):
+        if not self._owns_index:
+            self.index = list(self.index)
+            self.row_positions = dict(self.row_positions)
+            self._owns_index = True
+        self.row_positions[label] = len(self.index)
+        self.index.append(label)
+        self.values = np.vstack([self.values, np.zeros((1, len(self.columns)))])
+        self._owns_values = True
+        self._record('rows_added', 1)
+        self._record('bytes_copied', self.values.nbytes)
+        return self.row_positions[label]
+
+    def add_to_rows(self, row_labels, column_label, amounts):
+        # Scaled row addition into one column; labels missing from the sheet are appended as zero rows first
+        for label in row_labels:
+            if label not in self.row_positions:
+                self.append_row(label)
+        positions = [self.row_positions[label] for label in row_labels]
+        np.add.at(self._writable()[:, self.column_positions[column_label]], positions, amounts)
+        self._record('cells_written', len(positions))
@@ -0,0 +1,194 @@
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# METRICS=0 turns every span and counter into a no-op
+METRICS = os.environ.get('METRICS', '1') != '0'
+
+# Histogram buckets in seconds, Prometheus' defaults plus finer ones below 5 ms where cached callbacks land
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Spans of the callback running in this context, flushed to the histograms when it returns, and the spans of the
+# current request for Server-Timing
+_callback_spans = ContextVar('callback_spans', default=None)
+_request_spans = ContextVar('request_spans', default=None)
+
+
+class Metrics:
+    """Process-wide counters and timing histograms, rendered in the Prometheus text format.
+
+    Series are keyed by name plus sorted label pairs. Collectors registered with ``register_collector`` are called at
+    scrape time for values that already live elsewhere, such as cache hit counts.
+    """
+
+    def __init__(self, enabled=METRICS):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self.observe_many([((name, tuple(sorted(labels.items()))), seconds)])
+
+    def observe_many(self, observations):
+        # observe() for a batch of ((name, sorted labels), seconds) pairs under one lock, for the per-span path
+        buckets = [bisect.bisect_left(BUCKETS, seconds) for _, seconds in observations]
+        with self._lock:
+            for (key, seconds), bucket in zip(observations, buckets):
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    # Per-bucket counts plus the +Inf bucket, then count and sum
+                    histogram = self.histograms[key] = [[0] * (len(BUCKETS) + 1), 0, 0.0]
+                histogram[0][bucket] += 1
+                histogram[1] += 1
+                histogram[2] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_collector(self, collector):
+        # ``collector()`` returns [(name, type, value, labels)] with type 'counter' or 'gauge'
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                if name in self.help:
+                    lines.append(f'# HELP {name} {self.help[name]}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in self.histograms.items())
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+        for (name, labels), (buckets, count, total) in histograms:
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, bucket in zip(BUCKETS + ('+Inf',), buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{_labels(labels + (("le", f"{bound:g}" if bound != "+Inf" else bound),))} '
+                             f'{cumulative}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {total:.9g}')
+        for collector in self.collectors:
+            for name, kind, value, labels in collector():
+                header(name, kind)
+                lines.append(f'{name}{_labels(tuple(sorted(labels.items())))} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+metrics = Metrics()
+metrics.describe('ftx_callback_seconds', 'Time spent in each Dash callback.')
+metrics.describe('ftx_span_seconds', 'Time spent in each stage of a callback.')
+metrics.describe('ftx_external_request_seconds', 'Latency of price requests to external services.')
+metrics.describe('ftx_external_request_errors_total', 'Price requests to external services that failed.')
+
+
+class span:
+    """Time a stage of the running callback into ftx_span_seconds, and into the request's Server-Timing spans.
+
+    A class rather than a generator context manager, and buffered until the callback returns so its histograms are
+    updated under one lock: this runs several times per callback and should cost little more than the two clock
+    reads.
+    """
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        spans = _callback_spans.get()
+        if spans is not None:
+            spans.append((self.name, time.perf_counter() - self.start))
+
+
+def instrument_callback(func):
+    """Wrap a callback so its total time goes to ftx_callback_seconds and its spans are labelled with its name."""
+    name = func.__name__
+    key = ('ftx_callback_seconds', (('callback', name),))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not metrics.enabled:
+            return func(*args, **kwargs)
+        spans = []
+        token = _callback_spans.set(spans)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            spans.append((name, time.perf_counter() - start))
+            _callback_spans.reset(token)
+            metrics.observe_many([(('ftx_span_seconds', (('callback', name), ('span', span_name))), elapsed)
+                                  for span_name, elapsed in spans[:-1]] + [(key, spans[-1][1])])
+            request_spans = _request_spans.get()
+            if request_spans is not None:
+                request_spans.extend(spans)
+
+    return wrapper
+
+
+def start_request_spans():
+    # Collect the spans of the request starting on this thread; returns the list they are appended to
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans):
+    # Server-Timing header value, durations in milliseconds
+    return ', '.join(f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in spans)
+
+
+@contextmanager
+def external_request(service):
+    # Latency of one call to a price source, and a count of the ones that raised
+    if not metrics.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        metrics.inc('ftx_external_request_errors_total', service=service)
+        raise
+    finally:
+        metrics.observe('ftx_external_request_seconds', time.perf_counter() - start, service=service)
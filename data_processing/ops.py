@@ -0,0 +1,212 @@
+import numpy as np
+from data_processing.ledger import Ledger
+
+
+class Add:
+    """``target += scale * sum(sources)``.
+
+    Cells are ``(sheet, row, column)`` labels, and a source row of None stands for every row of that column. A target
+    row the sheet does not have yet is appended as a zero row. ``rounding`` is 'total' to round the amount to a whole
+    dollar million, or 'each' to round every scaled source value before summing.
+    """
+
+    def __init__(self, target, sources, scale=1.0, rounding=None):
+        self.target = target
+        self.sources = sources
+        self.scale = scale
+        self.rounding = rounding
+
+    def source_cells(self, rows_of):
+        cells = []
+        for sheet, row, column in self.sources:
+            rows = rows_of(sheet) if row is None else [row]
+            cells.extend((sheet, r, column) for r in rows)
+        return cells
+
+    def apply(self, data, rounding=True):
+        values = np.array([data[sheet].get(row, column)
+                           for sheet, row, column in self.source_cells(lambda sheet: data[sheet].index)])
+        if rounding and self.rounding == 'each':
+            amount = np.nansum(np.round(values * self.scale))
+        else:
+            amount = np.nansum(values) * self.scale
+        if rounding and self.rounding == 'total':
+            amount = round(amount)
+
+        sheet, row, column = self.target
+        if row not in data[sheet]:
+            data[sheet].append_row(row)
+        data[sheet].add(row, column, amount)
+
+    def to_dict(self):
+        return {'op': 'add', 'target': list(self.target), 'sources': [list(cell) for cell in self.sources],
+                'scale': float(self.scale), 'rounding': self.rounding}
+
+    def __repr__(self):
+        return f'Add({self.target!r}, {self.sources!r}, scale={self.scale!r}, rounding={self.rounding!r})'
+
+
+class Zero:
+    """Zero the given rows and columns of a sheet; None means all of them. Rows the sheet lacks are skipped."""
+
+    def __init__(self, sheet, rows=None, columns=None):
+        self.sheet = sheet
+        self.rows = rows
+        self.columns = columns
+
+    def cells(self, index, columns):
+        present = set(index)
+        rows = index if self.rows is None else [row for row in self.rows if row in present]
+        return [(self.sheet, row, column) for row in rows for column in (columns if self.columns is None else self.columns)]
+
+    def apply(self, data, rounding=True):
+        ledger = data[self.sheet]
+        if self.columns is None:
+            ledger.zero_rows(ledger.index if self.rows is None else self.rows)
+        elif self.rows is None:
+            ledger.zero_columns(self.columns)
+        else:
+            for _, row, column in self.cells(ledger.index, ledger.columns):
+                ledger.set(row, column, 0)
+
+    def to_dict(self):
+        return {'op': 'zero', 'sheet': self.sheet, 'rows': self.rows, 'columns': self.columns}
+
+    def __repr__(self):
+        return f'Zero({self.sheet!r}, rows={self.rows!r}, columns={self.columns!r})'
+
+
+def apply_ops(data, ops, rounding=True):
+    # Run the ops in order against ledgers, writing through whatever copy-on-write views ``data`` holds
+    for op in ops:
+        op.apply(data, rounding)
+    return data
+
+
+class VectorLayout:
+    """Where each sheet cell sits in the flattened vector: the sheets in order, each row-major."""
+
+    def __init__(self, sheets):
+        self.sheets = sheets
+        self.offsets = {}
+        self.size = 0
+        for name, (index, columns) in sheets.items():
+            self.offsets[name] = self.size
+            self.size += len(index) * len(columns)
+        self._rows = {name: {label: i for i, label in enumerate(index)} for name, (index, _) in sheets.items()}
+        self._columns = {name: {label: j for j, label in enumerate(columns)} for name, (_, columns) in sheets.items()}
+
+    @classmethod
+    def of(cls, data):
+        return cls({name: (list(data[name].index), list(data[name].columns)) for name in data})
+
+    def __eq__(self, other):
+        return isinstance(other, VectorLayout) and self.sheets == other.sheets
+
+    def position(self, sheet, row, column):
+        return self.offsets[sheet] + self._rows[sheet][row] * len(self.sheets[sheet][1]) + self._columns[sheet][column]
+
+    def __contains__(self, cell):
+        sheet, row, column = cell
+        return sheet in self.sheets and row in self._rows[sheet] and column in self._columns[sheet]
+
+    def cells(self):
+        return [(name, row, column) for name, (index, columns) in self.sheets.items()
+                for row in index for column in columns]
+
+    def flatten(self, data):
+        return np.concatenate([data[name].values.ravel() for name in self.sheets])
+
+    def ledgers(self, vector):
+        return {name: Ledger(index, columns, vector[self.offsets[name]:self.offsets[name] + len(index) * len(columns)])
+                for name, (index, columns) in self.sheets.items()}
+
+
+class LinearScenario:
+    """A sequence of ops compiled into ``y = matrix @ x`` over flattened sheets.
+
+    ``blanks`` marks, for each output cell, the input cells whose blank (NaN) value it keeps: untouched cells stay
+    blank and so does a blank cell that is only added to, exactly as with the ledgers. Sources are summed skipping
+    blanks. The whole-dollar-million rounding of the ops is not applied, so results can differ from ``apply_ops`` by
+    that rounding.
+    """
+
+    def __init__(self, input_layout, output_layout, matrix, blanks):
+        self.input_layout = input_layout
+        self.output_layout = output_layout
+        self.matrix = matrix
+        self.blanks = blanks
+
+    def apply(self, x):
+        """Apply to one flattened vector, or to the columns of an (inputs, k) matrix at once."""
+        blank = np.isnan(x)
+        y = self.matrix @ np.where(blank, 0.0, x)
+        y[(self.blanks @ blank.astype(np.float64)) > 0] = np.nan
+        return y
+
+    def apply_to(self, data):
+        return self.output_layout.ledgers(self.apply(self.input_layout.flatten(data)))
+
+    def then(self, other):
+        # ``other`` applied after this scenario, as one operator
+        if other.input_layout != self.output_layout:
+            raise ValueError("Scenarios do not chain: the second one expects different sheets")
+        from scipy import sparse
+        blanks = ((other.blanks @ self.blanks) > 0).astype(np.float64)
+        return LinearScenario(self.input_layout, other.output_layout, (other.matrix @ self.matrix).tocsr(),
+                              sparse.csr_matrix(blanks))
+
+
+def compile_ops(ops, data):
+    """Compile ``ops`` for sheets shaped like ``data`` into a LinearScenario."""
+    # Only compiling needs scipy, so apply_ops and the op builders load without it
+    from scipy import sparse
+
+    layout = VectorLayout.of(data)
+    rows = {name: list(index) for name, (index, _) in layout.sheets.items()}
+    columns = {name: columns for name, (_, columns) in layout.sheets.items()}
+
+    # Only cells the ops touch get an entry: {input position: coefficient} and the inputs whose blanks they keep
+    coefficients = {}
+    blanks = {}
+
+    def current(cell):
+        if cell in coefficients:
+            return coefficients[cell]
+        return {layout.position(*cell): 1.0} if cell in layout else {}
+
+    def current_blanks(cell):
+        if cell in blanks:
+            return blanks[cell]
+        return {layout.position(*cell)} if cell in layout else set()
+
+    for op in ops:
+        if isinstance(op, Add):
+            sheet, row, column = op.target
+            if row not in rows[sheet]:
+                rows[sheet].append(row)
+            combined = dict(current(op.target))
+            for cell in op.source_cells(lambda name: rows[name]):
+                for position, coefficient in current(cell).items():
+                    combined[position] = combined.get(position, 0.0) + op.scale * coefficient
+            blanks[op.target] = current_blanks(op.target)
+            coefficients[op.target] = combined
+        elif isinstance(op, Zero):
+            for cell in op.cells(rows[op.sheet], columns[op.sheet]):
+                coefficients[cell] = {}
+                blanks[cell] = set()
+        else:
+            raise TypeError(f"Cannot compile {op!r}")
+
+    output_layout = VectorLayout({name: (rows[name], columns[name]) for name in layout.sheets})
+    entries, blank_entries = [], []
+    for out_position, cell in enumerate(output_layout.cells()):
+        entries.extend((out_position, position, coefficient) for position, coefficient in current(cell).items())
+        blank_entries.extend((out_position, position) for position in current_blanks(cell))
+
+    shape = (output_layout.size, layout.size)
+    out_positions, in_positions, values = zip(*entries) if entries else ((), (), ())
+    matrix = sparse.csr_matrix((values, (out_positions, in_positions)), shape=shape)
+    blank_out, blank_in = zip(*blank_entries) if blank_entries else ((), ())
+    blank_matrix = sparse.csr_matrix((np.ones(len(blank_out)), (blank_out, blank_in)), shape=shape)
+    return LinearScenario(layout, output_layout, matrix, blank_matrix)
@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import threading
+
+PRICE_CACHE_PATH = os.environ.get('PRICE_CACHE_PATH', 'prices.sqlite3')
+LEGACY_CACHE_PATH = 'cache.json'
+
+
+class PriceCache:
+    """Daily close prices keyed by (symbol, date).
+
+    Lookups hit an in-process dict first, so a cached price costs no disk I/O. Misses fall through to a SQLite
+    database in WAL mode that every gunicorn worker shares: SQLite does the file locking, each write is an atomic
+    transaction, and readers never block the writer. Prices from the old cache.json are imported when the database
+    is first created.
+    """
+
+    def __init__(self, path=PRICE_CACHE_PATH, legacy_path=LEGACY_CACHE_PATH):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        # SQLite connections must not be shared across threads or forked processes
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS closes '
+                         '(symbol TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL, PRIMARY KEY (symbol, date))')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._import_legacy(conn)
+        return conn
+
+    def _import_legacy(self, conn):
+        if conn.execute('SELECT 1 FROM closes LIMIT 1').fetchone() is not None:
+            return
+        try:
+            with open(self.legacy_path, 'r') as f:
+                legacy = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        rows = [(symbol, date, float(close)) for symbol, closes in legacy.items() for date, close in closes.items()]
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR IGNORE INTO closes VALUES (?, ?, ?)', rows)
+
+    def get_many(self, symbols, date):
+        """Cached closes for ``date``; symbols with no cached price are left out."""
+        with self._lock:
+            prices = {symbol: self._memory[(symbol, date)] for symbol in symbols if (symbol, date) in self._memory}
+            self.hits += len(prices)
+        missing = [symbol for symbol in symbols if symbol not in prices]
+        if not missing:
+            return prices
+
+        # Another worker may already have fetched these
+        placeholders = ','.join('?' * len(missing))
+        rows = self._connection().execute(
+            f'SELECT symbol, close FROM closes WHERE date = ? AND symbol IN ({placeholders})', [date] + missing
+        ).fetchall()
+        with self._lock:
+            for symbol, close in rows:
+                self._memory[(symbol, date)] = close
+                prices[symbol] = close
+            self.backend_hits += len(rows)
+            self.misses += len(missing) - len(rows)
+        return prices
+
+    def put_many(self, prices, date):
+        rows = [(symbol, date, float(close)) for symbol, close in prices.items()]
+        conn = self._connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT OR REPLACE INTO closes VALUES (?, ?, ?)', rows)
+        with self._lock:
+            for symbol, _, close in rows:
+                self._memory[(symbol, date)] = close
+
+    def latest(self, symbols):
+        """Most recent cached close per symbol as ``{symbol: (date, close)}``, read straight from the database."""
+        placeholders = ','.join('?' * len(symbols))
+        rows = self._connection().execute(
+            f'SELECT symbol, MAX(date), close FROM closes WHERE symbol IN ({placeholders}) GROUP BY symbol', symbols
+        ).fetchall()
+        return {symbol: (date, close) for symbol, date, close in rows}
+
+    def stats(self):
+        return {'hits': self.hits, 'backend_hits': self.backend_hits, 'misses': self.misses}
+
+
+price_cache = PriceCache()
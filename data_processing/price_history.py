@@ -0,0 +1,188 @@
+"""Daily close history per symbol, kept on disk and backfilled from Binance.
+
+    python -m data_processing.price_history [--start 2022-11-11] [--symbols BTC,ETH]
+
+Point BINANCE_API_URL at data_processing.binance_stub to backfill without the network.
+"""
+import argparse
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from data_processing.data import binance_pair
+from data_processing.pricing import fetch_binance_daily_closes, PRICE_FETCH_WORKERS
+from data_processing.snapshot import _write_atomic
+from data_processing.transforms import CATEGORY_A_CRYPTO
+
+PRICE_HISTORY_DIR = os.environ.get('PRICE_HISTORY_DIR', '.price_history')
+# Chapter 11 petition date, where the history starts unless told otherwise
+PETITION_DATE = '2022-11-11'
+DAY_MS = 86_400_000
+
+# Layout of the history directory:
+#   <SYMBOL>.npy      float64 matrix of shape (2, n): row 0 the day (days since 1970-01-01, exact in a float64), row 1
+#                     that day's close. Sorted by day without repeats, memory-mapped on read. Each row is contiguous,
+#                     so searching the days needs no copy.
+
+
+def to_day(date):
+    # '2022-11-11', a date/datetime, a datetime64 or already a day number -> days since 1970-01-01
+    if isinstance(date, (int, np.integer)):
+        return int(date)
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def from_days(days):
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]')
+
+
+def yesterday_utc():
+    # Latest day with a complete daily kline
+    return (datetime.now(timezone.utc) - timedelta(days=1)).date()
+
+
+class PriceHistory:
+    """Columnar daily closes per symbol, one memory-mapped file each.
+
+    Range queries binary-search the mapped day row, so they read O(log n) pages plus the slice they return. Writes
+    merge into a new file that replaces the old one atomically; readers notice by the file's mtime and size and map
+    the new one, and a reader holding the old mapping keeps a consistent view of it.
+    """
+
+    def __init__(self, directory=PRICE_HISTORY_DIR):
+        self.directory = directory
+        self._mapped = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol):
+        return os.path.join(self.directory, f'{symbol}.npy')
+
+    def symbols(self):
+        try:
+            return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith('.npy'))
+        except FileNotFoundError:
+            return []
+
+    def load(self, symbol):
+        """The (2, n) day/close matrix of ``symbol``, read-only, or None if nothing is stored for it."""
+        path = self.path(symbol)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            mapped = self._mapped.get(symbol)
+            if mapped is not None and mapped[0] == version:
+                return mapped[1]
+        series = np.load(path, mmap_mode='r')
+        with self._lock:
+            self._mapped[symbol] = (version, series)
+        return series
+
+    def range(self, symbol, start=None, end=None):
+        """Days and closes of ``symbol`` from ``start`` to ``end`` inclusive, as (datetime64[D] array, float64 array).
+
+        Either bound may be left out. The closes are a read-only view of the mapped file.
+        """
+        series = self.load(symbol)
+        if series is None:
+            return from_days([]), np.empty(0)
+        days = series[0]
+        lo = 0 if start is None else np.searchsorted(days, to_day(start), side='left')
+        hi = len(days) if end is None else np.searchsorted(days, to_day(end), side='right')
+        return from_days(days[lo:hi]), series[1, lo:hi]
+
+    def close_on(self, symbol, date):
+        # Close on ``date``, or None if that day is not stored
+        series = self.load(symbol)
+        if series is None:
+            return None
+        day = to_day(date)
+        i = np.searchsorted(series[0], day)
+        return float(series[1, i]) if i < series.shape[1] and series[0, i] == day else None
+
+    def last_day(self, symbol):
+        series = self.load(symbol)
+        return None if series is None or not series.shape[1] else from_days(series[0, -1:])[0]
+
+    def merge(self, symbol, days, closes):
+        """Store closes for ``days`` (anything to_day accepts, or day numbers), replacing closes already stored for
+        the same days. Returns how many days were new."""
+        days = np.array([to_day(day) for day in days], dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+        existing = self.load(symbol)
+        if existing is None:
+            existing = np.empty((2, 0))
+        # Later entries win in np.unique's reverse pass, so the new closes go last
+        all_days = np.concatenate([existing[0].astype(np.int64), days])
+        all_closes = np.concatenate([existing[1], closes])
+        _, last = np.unique(all_days[::-1], return_index=True)
+        keep = len(all_days) - 1 - last
+        merged = np.vstack([all_days[keep].astype(np.float64), all_closes[keep]])
+
+        os.makedirs(self.directory, exist_ok=True)
+        _write_atomic(self.path(symbol), lambda f: np.save(f, merged))
+        return merged.shape[1] - existing.shape[1]
+
+
+price_history = PriceHistory()
+
+
+def backfill_symbol(symbol, start=PETITION_DATE, end=None, history=price_history, fetch=fetch_binance_daily_closes):
+    """Fetch and store the daily closes of ``symbol`` (a Binance pair) missing between ``start`` and ``end``.
+
+    Only days before the first or after the last stored one are requested, so running it daily costs one request
+    per symbol.
+    """
+    start, end = to_day(start), to_day(end or yesterday_utc())
+    series = history.load(symbol)
+    if series is None or not series.shape[1]:
+        gaps = [(start, end)]
+    else:
+        gaps = [(start, min(end, int(series[0, 0]) - 1)), (max(start, int(series[0, -1]) + 1), end)]
+
+    days, closes = [], []
+    for first, last in gaps:
+        if first <= last:
+            open_times, gap_closes = fetch(symbol, first * DAY_MS, last * DAY_MS + DAY_MS - 1)
+            days.extend(open_time // DAY_MS for open_time in open_times)
+            closes.extend(gap_closes)
+    return history.merge(symbol, days, closes) if days else 0
+
+
+def backfill(symbols=CATEGORY_A_CRYPTO, start=PETITION_DATE, end=None, history=price_history,
+             fetch=fetch_binance_daily_closes):
+    """Backfill every token's USDT pair in parallel. Returns ``({pair: days added}, {pair: error})``."""
+    added, failed = {}, {}
+
+    def run(pair):
+        try:
+            added[pair] = backfill_symbol(pair, start, end, history, fetch)
+        except Exception as e:
+            failed[pair] = e
+
+    pairs = [binance_pair(symbol) for symbol in symbols]
+    with ThreadPoolExecutor(max_workers=max(min(PRICE_FETCH_WORKERS, len(pairs)), 1)) as pool:
+        list(pool.map(run, pairs))
+    return added, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--start', default=PETITION_DATE)
+    parser.add_argument('--end', help='last day to fetch (default yesterday, UTC)')
+    parser.add_argument('--symbols', default=','.join(CATEGORY_A_CRYPTO), help='tokens, comma separated')
+    args = parser.parse_args()
+
+    added, failed = backfill(args.symbols.split(','), args.start, args.end)
+    for pair, count in sorted(added.items()):
+        stored = price_history.load(pair)
+        print(f"{pair}: {count} new days, {0 if stored is None else stored.shape[1]} stored")
+    for pair, error in sorted(failed.items()):
+        print(f"{pair}: failed, {error}")
+
+
+if __name__ == '__main__':
+    main()
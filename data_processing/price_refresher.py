@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from data_processing.data import binance_pair
+from data_processing.pricing import get_close_prices, get_last_close_prices
+from data_processing.price_cache import price_cache
+from data_processing.transforms import CATEGORY_A_CRYPTO, LIQUID_SECURITIES
+
+# '0' leaves prices at whatever is already in the price cache
+PRICE_REFRESHER = os.environ.get('PRICE_REFRESHER', '1')
+PRICE_REFRESH_POLL = int(os.environ.get('PRICE_REFRESH_POLL', 60))
+PRICE_REFRESH_RETRY = int(os.environ.get('PRICE_REFRESH_RETRY', 300))
+
+# Price toggle -> symbols it reprices and how to fetch their latest close. Each fetch goes through the price cache,
+# so whichever worker fetches first publishes the prices for the others.
+PRICE_SOURCES = {
+    'CATEGORY_A_UPDATE': (CATEGORY_A_CRYPTO, lambda symbols: get_close_prices(symbols, '1d')),
+    'LIQUID_SEC_UPDATE': (LIQUID_SECURITIES, get_last_close_prices),
+}
+
+# Symbol each toggle's prices are stored under in the price cache
+CACHE_SYMBOLS = {
+    'CATEGORY_A_UPDATE': binance_pair,
+    'LIQUID_SEC_UPDATE': lambda ticker: ticker,
+}
+
+
+def close_date(now):
+    # Prices are yesterday's close, so a new set is due once the date rolls over
+    return (datetime.fromtimestamp(now) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class PriceRefresher:
+    """Fetches the latest closes for each price toggle on a background thread.
+
+    Callbacks only read ``snapshot()``, the last complete set of prices per toggle, so a slow or rate-limited
+    upstream never holds up a request. Each toggle is refreshed when its close date rolls over, and retried every
+    ``retry`` seconds while fetching fails. ``clock`` and the ``sources`` fetch functions can be replaced, so
+    ``tick()`` can be driven by hand with a fake clock and a stub provider.
+    """
+
+    def __init__(self, sources=PRICE_SOURCES, clock=time.time, poll=PRICE_REFRESH_POLL, retry=PRICE_REFRESH_RETRY):
+        self.sources = sources
+        self.clock = clock
+        self.poll = poll
+        self.retry = retry
+        self._snapshots = {}
+        self._attempted_at = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def snapshot(self):
+        """Latest prices per toggle as ``{toggle: {'prices', 'as_of', 'dates', 'fetched_at'}}``. Never touches the
+        network. ``as_of`` is the oldest close in the set and ``dates`` each symbol's close date."""
+        with self._lock:
+            return dict(self._snapshots)
+
+    def publish(self, toggle, prices, as_of, fetched_at, dates=None):
+        # ``dates`` defaults to every symbol closing on ``as_of``
+        dates = dates or {symbol: as_of for symbol in prices}
+        with self._lock:
+            self._snapshots[toggle] = {'prices': prices, 'as_of': as_of, 'dates': dates, 'fetched_at': fetched_at}
+
+    def load_cached(self, cache=price_cache):
+        # Start from the newest complete set of prices in the shared cache, so there is something to show before
+        # the first refresh finishes. Symbols may have closes of different dates there; the set is as of the oldest,
+        # so it is refreshed on the first tick, and describe_snapshot names the stale symbols meanwhile.
+        for toggle, (symbols, _) in self.sources.items():
+            if toggle in self._snapshots:
+                continue
+            cache_symbols = {symbol: CACHE_SYMBOLS[toggle](symbol) for symbol in symbols}
+            latest = cache.latest(list(cache_symbols.values()))
+            if len(latest) == len(symbols):
+                prices = {symbol: latest[key][1] for symbol, key in cache_symbols.items()}
+                dates = {symbol: latest[key][0] for symbol, key in cache_symbols.items()}
+                self.publish(toggle, prices, min(dates.values()), None, dates)
+
+    def due(self, toggle, now):
+        snapshot = self._snapshots.get(toggle)
+        if snapshot is not None and snapshot['as_of'] == close_date(now):
+            return False
+        return now - self._attempted_at.get(toggle, float('-inf')) >= self.retry
+
+    def tick(self):
+        """Refresh every toggle whose prices are out of date. Returns the toggles that were refreshed."""
+        refreshed = []
+        for toggle, (symbols, fetch) in self.sources.items():
+            now = self.clock()
+            if not self.due(toggle, now):
+                continue
+            self._attempted_at[toggle] = now
+            try:
+                prices = fetch(symbols)
+            except Exception as e:
+                print(f"Price refresh for {toggle} failed, keeping the previous prices: {e!r}")
+                continue
+            self.publish(toggle, {symbol: prices[symbol] for symbol in symbols}, close_date(now), self.clock())
+            refreshed.append(toggle)
+        return refreshed
+
+    def run(self):
+        while True:
+            self.tick()
+            if self._stop.wait(self.poll):
+                return
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if PRICE_REFRESHER == '0' or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='price-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def describe_snapshot(snapshot, toggle):
+    # Short status line for a toggle's prices, shown under the price toggles
+    if toggle not in snapshot:
+        return "latest prices not available yet, showing the workbook values until they are"
+    entry = snapshot[toggle]
+    dates = entry.get('dates') or {}
+    newest = max(dates.values(), default=entry['as_of'])
+    if newest == entry['as_of']:
+        closes = f"close of {entry['as_of']}"
+    else:
+        stale = ', '.join(f"{symbol} {date}" for symbol, date in sorted(dates.items()) if date != newest)
+        closes = f"closes of {entry['as_of']} to {newest} (older: {stale})"
+    if entry['fetched_at'] is None:
+        return f"{closes} (cached)"
+    fetched_at = datetime.fromtimestamp(entry['fetched_at'], tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    return f"{closes}, fetched {fetched_at}"
+
+
+price_refresher = PriceRefresher()
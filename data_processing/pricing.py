@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from data_processing.data import binance_pair
+from data_processing.price_cache import price_cache
+from data_processing.metrics import metrics, external_request
+
+# Price adapters: Binance closes for the crypto toggles and yfinance closes for the securities, both through the price
+# cache. requests and yfinance are imported on first fetch, so nothing that only reads the cache pays for them.
+
+BINANCE_KLINES_URL = os.environ.get('BINANCE_API_URL', 'https://api.binance.com') + '/api/v3/klines'
+PRICE_FETCH_WORKERS = int(os.environ.get('PRICE_FETCH_WORKERS', 16))
+# Most klines Binance returns per request
+BINANCE_KLINES_LIMIT = 1000
+
+# One pooled session for every Binance request, sized for the fetch pool; see binance_session
+_session = None
+_session_lock = threading.Lock()
+
+
+def binance_session():
+    # Created on first use, so importing this module does not load requests
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=PRICE_FETCH_WORKERS))
+                session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=PRICE_FETCH_WORKERS))
+                _session = session
+    return _session
+
+
+class RateLimitBackoff:
+    """Shared back-off window driven by Binance's X-MBX-USED-WEIGHT-1m header.
+
+    Only requests that have not been sent yet wait for the window to pass; requests already in flight finish and
+    their results are kept.
+    """
+
+    def __init__(self, weight_limit=960, pause=10):
+        self.weight_limit = weight_limit
+        self.pause = pause
+        self.resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def observe(self, response):
+        # If we've used more than 80% of our limit, hold back new requests for a bit
+        if int(response.headers.get('X-MBX-USED-WEIGHT-1m', 0)) > self.weight_limit:
+            with self._lock:
+                if self.resume_at <= time.monotonic():
+                    print("Approaching rate limit, sleeping for a bit...")
+                self.resume_at = max(self.resume_at, time.monotonic() + self.pause)
+
+
+binance_backoff = RateLimitBackoff()
+
+
+def _yesterday():
+    # Calculate the date of yesterday
+    yesterday = datetime.now() - timedelta(days=1)
+    return yesterday, yesterday.strftime("%Y-%m-%d")
+
+
+def fetch_binance_close(symbol, interval, start_time):
+    binance_backoff.wait()
+
+    params = {
+        'symbol': symbol,
+        'interval': interval,
+        'startTime': start_time,
+        'limit': 1
+    }
+    with external_request('binance'):
+        response = binance_session().get(BINANCE_KLINES_URL, params=params, timeout=10)
+        binance_backoff.observe(response)
+        data = response.json()
+    # Unknown symbols and bad parameters come back as {'code': ..., 'msg': ...}
+    if isinstance(data, dict):
+        raise ValueError(f"Binance close for {symbol}: {data.get('msg', data)}")
+
+    # The close price is at index 4
+    return float(data[0][4])
+
+
+def fetch_binance_klines(symbol, interval, start_time, end_time=None, limit=BINANCE_KLINES_LIMIT):
+    """One page of klines for ``symbol`` opening at or after ``start_time`` (ms), oldest first, at most ``limit``."""
+    binance_backoff.wait()
+
+    params = {'symbol': symbol, 'interval': interval, 'startTime': start_time, 'limit': limit}
+    if end_time is not None:
+        params['endTime'] = end_time
+    with external_request('binance'):
+        response = binance_session().get(BINANCE_KLINES_URL, params=params, timeout=30)
+        binance_backoff.observe(response)
+        data = response.json()
+    # Unknown symbols and bad parameters come back as {'code': ..., 'msg': ...}
+    if isinstance(data, dict):
+        raise ValueError(f"Binance klines for {symbol}: {data.get('msg', data)}")
+    return data
+
+
+def fetch_binance_daily_closes(symbol, start_time, end_time):
+    """Daily closes of ``symbol`` between two ms timestamps as (open times in ms, closes), paging BINANCE_KLINES_LIMIT
+    days per request."""
+    open_times, closes = [], []
+    while start_time <= end_time:
+        page = fetch_binance_klines(symbol, '1d', start_time, end_time)
+        open_times.extend(int(kline[0]) for kline in page)
+        closes.extend(float(kline[4]) for kline in page)
+        if len(page) < BINANCE_KLINES_LIMIT:
+            break
+        start_time = int(page[-1][0]) + 1
+    return open_times, closes
+
+
+def get_close_prices(symbols, interval):
+    """Yesterday's close for each symbol against USDT, fetching everything missing from the cache in parallel.
+
+    Closes that were fetched are cached even when others fail, and a RuntimeError naming the failed symbols is raised
+    after that, so a retry only asks Binance for those.
+    """
+    yesterday, yesterday_date = _yesterday()
+
+    # Append 'USDT' to each symbol
+    pairs = {symbol: binance_pair(symbol) for symbol in symbols}
+    cached = price_cache.get_many(list(pairs.values()), yesterday_date)
+    prices = {symbol: cached[pair] for symbol, pair in pairs.items() if pair in cached}
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if not missing:
+        return prices
+
+    # Calculate the timestamp of the start of yesterday
+    yesterday_start = datetime(yesterday.year, yesterday.month, yesterday.day, tzinfo=timezone.utc)
+    timestamp = int(yesterday_start.timestamp() * 1000)
+
+    # Each future is collected on its own, so one failed symbol does not lose the rest of the batch
+    fetched, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=min(PRICE_FETCH_WORKERS, len(missing))) as pool:
+        futures = {symbol: pool.submit(fetch_binance_close, pairs[symbol], interval, timestamp) for symbol in missing}
+        for symbol, future in futures.items():
+            try:
+                fetched[symbol] = future.result()
+            except Exception as e:
+                failed[symbol] = e
+
+    price_cache.put_many({pairs[symbol]: price for symbol, price in fetched.items()}, yesterday_date)
+    prices.update(fetched)
+    if failed:
+        for symbol, e in failed.items():
+            print(f"Fetching the {yesterday_date} close of {pairs[symbol]} failed: {e!r}")
+        raise RuntimeError(f"No {yesterday_date} close for {', '.join(failed)}") from next(iter(failed.values()))
+    return prices
+
+
+def get_close_price(symbol, interval):
+    return get_close_prices([symbol], interval)[symbol]
+
+
+def get_last_close_prices(tickers):
+    """Fetch the last closing price for each ticker with one multi-ticker yfinance download."""
+    _, yesterday_date = _yesterday()
+
+    prices = price_cache.get_many(tickers, yesterday_date)
+    missing = [ticker for ticker in tickers if ticker not in prices]
+    if not missing:
+        return prices
+
+    # Imported here so that loading workbooks and cached prices does not pull in yfinance and its dependencies
+    import yfinance as yf
+
+    # Requesting 2 days to ensure we get 'yesterday' in case there's any data delay.
+    with external_request('yfinance'):
+        hist = yf.download(missing, period="2d", auto_adjust=True, progress=False, threads=True)
+    closes = hist['Close']
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(missing[0])
+    fetched = {ticker: float(closes[ticker].dropna().iloc[-1]) for ticker in missing}
+
+    price_cache.put_many(fetched, yesterday_date)
+    prices.update(fetched)
+    return prices
+
+
+def get_last_close_price(ticker):
+    """Fetch the last closing price for a given ticker using yfinance."""
+    return get_last_close_prices([ticker])[ticker]
+
+
+def price_cache_metrics():
+    return [('ftx_price_cache_lookups_total', 'counter', count, {'result': result})
+            for result, count in price_cache.stats().items()]
+
+
+metrics.describe('ftx_price_cache_lookups_total',
+                 'Price cache lookups: hits in memory, hits in the backing store and misses.')
+metrics.register_collector(price_cache_metrics)
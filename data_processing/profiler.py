@@ -0,0 +1,107 @@
+import atexit
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# PROFILER=1 samples every thread's stack and dumps the counts in the collapsed format flamegraph.pl and speedscope
+# read. The output path may contain {pid} so each gunicorn worker writes its own file; the default directory is
+# git-ignored.
+PROFILER = os.environ.get('PROFILER', '0') == '1'
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.01))
+PROFILER_OUTPUT = os.environ.get('PROFILER_OUTPUT', os.path.join('.profiles', 'profile-{pid}.folded'))
+# Seconds between dumps, so a worker that is killed rather than stopped still leaves a recent profile
+PROFILER_DUMP_INTERVAL = float(os.environ.get('PROFILER_DUMP_INTERVAL', 60))
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Counts the stack of every thread each ``interval`` seconds from a daemon thread.
+
+    Sampling rather than tracing keeps the cost flat whatever the code does: one walk of each thread's frames per
+    tick, about 1% of a core at the default 10 ms interval with a handful of threads.
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL, output=PROFILER_OUTPUT, dump_interval=PROFILER_DUMP_INTERVAL):
+        self.interval = interval
+        self.output = output
+        self.dump_interval = dump_interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        # Idempotent per process, so a forked worker starts its own sampler rather than inheriting a dead one
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.stacks = collections.Counter()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        atexit.register(self.dump)
+        print(f"Profiler: sampling every {self.interval * 1000:g} ms into {self.path()}")
+
+    def stop(self):
+        self._stop.set()
+
+    def path(self):
+        return self.output.format(pid=os.getpid())
+
+    def sample(self):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stacks.append(';'.join(reversed(stack)))
+        with self._lock:
+            self.stacks.update(stacks)
+            self.samples += 1
+
+    def _run(self):
+        last_dump = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if time.monotonic() - last_dump >= self.dump_interval:
+                self.dump()
+                last_dump = time.monotonic()
+
+    def dump(self):
+        # Rewrite the whole profile atomically: one "thread;outer;...;inner count" line per distinct stack
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        if not stacks:
+            return
+        path = self.path()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            for stack, count in stacks:
+                f.write(f'{stack} {count}\n')
+        os.replace(tmp_path, path)
+
+
+profiler = SamplingProfiler()
+
+
+def start_profiler():
+    if PROFILER:
+        profiler.start()
@@ -0,0 +1,42 @@
+import pandas as pd
+
+# Recovery arithmetic shared by the dashboard, the simulations and the batch runner. Kept free of dash and plotly so
+# the computation core imports without the UI.
+
+CATEGORY_B_ASSETS = ["FTT", "MAPS", "SRM", "FIDA", "MEDIA", "OXY", "All Other - Category B"]
+ASSET_VALUE_COL = "Located Assets"
+
+def create_exchange_dict(crypto_df: pd.DataFrame, related_party_df: pd.DataFrame) -> dict:
+    relevant_cols = ["Cash / Stablecoin", "Crypto - Category A", "Crypto - Category B", "Venture Investments", "Liquid Securities", "Clawbacks"]
+    assets_dict = {
+        asset: crypto_df.loc[asset, ASSET_VALUE_COL]
+        for asset in relevant_cols
+        if asset in crypto_df.index
+    }
+    assets_dict["Receivables"] = related_party_df["Estimated Receivables"].sum()
+
+    # Create the dictionary for liabilities
+    liabilities_dict = {
+        liability: crypto_df.loc[liability, "Customer Payables"]
+        for liability in relevant_cols
+        if liability in crypto_df.index
+    }
+    liabilities_dict["Related Party Payables"] = related_party_df["Estimated Payables"].sum()
+
+    # Create the final exchange dictionary
+    exchange = {
+        "assets": assets_dict,
+        "liabilities": liabilities_dict,
+    }
+
+    return exchange
+
+
+def calculate_recovery_rate(asset_df, related_party_df):
+    # Calculate the recovery rate
+    exchange = create_exchange_dict(asset_df, related_party_df)
+    total_assets = sum(exchange['assets'].values())
+    total_liabilities = sum(exchange['liabilities'].values())
+    recovery_rate = total_assets / total_liabilities * 100  # the recovery rate as a percentage
+
+    return recovery_rate
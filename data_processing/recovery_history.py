@@ -0,0 +1,162 @@
+"""Recovery rate per day since the petition date, for every recovery toggle combination.
+
+    python -m data_processing.recovery_history [--no-backfill]
+
+Backfills the Category A closes into the price history, then extends the stored series by the days it does not
+cover yet.
+"""
+import argparse
+import os
+import time
+import numpy as np
+from data_processing.data import binance_pair, workbook_fingerprint, load_ledgers, load_petition_prices
+from data_processing.price_history import price_history, backfill, to_day, from_days, PETITION_DATE, \
+    PRICE_HISTORY_DIR
+from data_processing.scenarios import all_scenarios, ScenarioEngine, SCENARIO_SHEETS
+from data_processing.simulation import exchange_totals, held_rows, LinearRecovery, EXCHANGES
+from data_processing.snapshot import _write_atomic
+from data_processing.transforms import CATEGORY_A_CRYPTO
+
+RECOVERY_HISTORY_DIR = os.environ.get('RECOVERY_HISTORY_DIR', PRICE_HISTORY_DIR)
+
+
+def scenario_name(selected_items):
+    # Same key as the clientside bundle's distributions: the recovery toggles, sorted and '|'-joined
+    return '|'.join(sorted(selected_items or []))
+
+
+def recovery_history_path(fingerprint, directory=RECOVERY_HISTORY_DIR):
+    # One file per workbook version, so switching between versions does not recompute either
+    return os.path.join(directory, f'recovery-{fingerprint[:16]}.npz')
+
+
+def complete_through(history, tokens):
+    # Last day every token has a close for, or None while some token has no history at all
+    days = [history.last_day(binance_pair(token)) for token in tokens]
+    return None if any(day is None for day in days) else min(to_day(day) for day in days)
+
+
+def close_matrix(history, tokens, first_day, last_day, fallback):
+    """Closes as a (days, tokens) matrix from ``first_day`` to ``last_day``.
+
+    Days a token has no close for carry its previous close forward; before its first close the ``fallback`` price
+    stands in (the petition price for tokens listed after the petition date).
+    """
+    grid = np.arange(first_day, last_day + 1)
+    closes = np.empty((len(grid), len(tokens)))
+    for j, token in enumerate(tokens):
+        days, values = history.range(binance_pair(token), end=last_day)
+        # Position of the last close on or before each day, -1 before the first
+        latest = np.searchsorted(days.astype(np.int64), grid, side='right') - 1
+        closes[:, j] = np.where(latest >= 0, values[np.maximum(latest, 0)] if len(values) else np.nan,
+                                fallback.get(token, np.nan))
+    return closes
+
+
+class RecoveryHistory:
+    """Recovery rates as a (scenarios, days, exchanges) float32 array over consecutive days from ``first_day``.
+
+    Stored with the workbook fingerprint, since every rate depends on the workbook; a different workbook starts the
+    series over.
+    """
+
+    def __init__(self, fingerprint, first_day, scenarios, rates):
+        self.fingerprint = fingerprint
+        self.first_day = first_day
+        self.scenarios = list(scenarios)
+        self.rates = rates
+
+    @classmethod
+    def empty(cls, fingerprint, first_day, scenarios):
+        return cls(fingerprint, first_day, scenarios, np.empty((len(scenarios), 0, len(EXCHANGES)), dtype=np.float32))
+
+    @property
+    def days(self):
+        return from_days(self.first_day + np.arange(self.rates.shape[1]))
+
+    def series(self, selected_items):
+        """Days and recovery rates (days, exchanges) of one toggle combination."""
+        return self.days, self.rates[self.scenarios.index(scenario_name(selected_items))]
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with np.load(path) as stored:
+                return cls(str(stored['fingerprint']), int(stored['first_day']), stored['scenarios'].tolist(),
+                           stored['rates'])
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            return None
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _write_atomic(path, lambda f: np.savez(f, fingerprint=self.fingerprint, first_day=self.first_day,
+                                               scenarios=np.array(self.scenarios), rates=self.rates))
+
+
+def recovery_rates(engine, selected_items, closes, rows):
+    """Recovery rate (days, exchanges) of one toggle combination with the Category A tokens at ``closes``.
+
+    The repricing inject_last_close_crypto_prices does, replayed for every day at once: each of ``rows`` (from
+    held_rows) is worth its close times its quantity, rounded to whole dollar millions as reprice rounds it, and
+    the recovery toggles are linear in those values. Their slopes come from the compiled scenario, so every day is
+    a row of a (days, rows) by (rows, exchanges) product.
+    """
+    prices = {'CATEGORY_A_UPDATE': dict(zip(CATEGORY_A_CRYPTO, closes[0]))}
+    totals = exchange_totals(engine.run(selected_items, ['CATEGORY_A_UPDATE'], prices))
+    base_assets = np.array([totals[name][0] for name in EXCHANGES])
+    liabilities = np.array([totals[name][1] for name in EXCHANGES])
+    linear = LinearRecovery(engine, selected_items, engine.priced(['CATEGORY_A_UPDATE'], prices))
+    exposure = linear.value_exposure([(key, token) for key, token, _ in rows])
+
+    token_columns = [CATEGORY_A_CRYPTO.index(token) for _, token, _ in rows]
+    quantity = np.array([q for _, _, q in rows])
+    values = np.round(closes[:, token_columns] * quantity / 1000000.0)
+    return (base_assets + (values - values[0]) @ exposure) / liabilities * 100
+
+
+def update_recovery_history(engine, fingerprint, reference_prices, history=price_history, path=None,
+                            start=PETITION_DATE):
+    """Stored recovery history extended through the last day with a close for every Category A token.
+
+    Only days after the stored ones are computed; nothing is written if there are none.
+    """
+    path = path or recovery_history_path(fingerprint)
+    scenarios = [scenario_name(selected) for selected, _ in all_scenarios()]
+    stored = RecoveryHistory.load(path)
+    if stored is None or (stored.fingerprint, stored.first_day, stored.scenarios) != (fingerprint, to_day(start),
+                                                                                     scenarios):
+        stored = RecoveryHistory.empty(fingerprint, to_day(start), scenarios)
+
+    first_new = stored.first_day + stored.rates.shape[1]
+    last = complete_through(history, CATEGORY_A_CRYPTO)
+    if last is None or last < first_new:
+        return stored
+
+    started = time.perf_counter()
+    closes = close_matrix(history, CATEGORY_A_CRYPTO, first_new, last, dict(reference_prices))
+    rows = held_rows(engine, CATEGORY_A_CRYPTO)
+    rates = np.stack([recovery_rates(engine, selected, closes, rows) for selected, _ in all_scenarios()])
+    stored.rates = np.concatenate([stored.rates, rates.astype(np.float32)], axis=1)
+    stored.save(path)
+    print(f"Recovery history: {len(closes)} new days x {len(scenarios)} scenarios "
+          f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+    return stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--no-backfill', action='store_true', help='only use closes already in the price history')
+    args = parser.parse_args()
+
+    if not args.no_backfill:
+        _, failed = backfill(CATEGORY_A_CRYPTO)
+        for pair, error in sorted(failed.items()):
+            print(f"{pair}: backfill failed, {error}")
+    engine = ScenarioEngine(load_ledgers(SCENARIO_SHEETS))
+    recovery = update_recovery_history(engine, workbook_fingerprint(), load_petition_prices())
+    if recovery.rates.shape[1]:
+        print(f"Recovery history: {recovery.days[0]} to {recovery.days[-1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from data_processing.data import WORKBOOK_PATH, load_data, load_ledgers
+from data_processing.snapshot import SNAPSHOT_DIR, _write_atomic
+
+DATASET_DIR = os.environ.get('DATASET_DIR', os.path.join(SNAPSHOT_DIR, 'versions'))
+# Versions whose derived state (figures, scenario engine and cache) stays in memory, the current one included
+DATASET_VERSIONS = int(os.environ.get('DATASET_VERSIONS', 2))
+# Versions kept on disk; older ones are deleted when a new one is registered, unless it is the one being served
+DATASET_KEEP = int(os.environ.get('DATASET_KEEP', 10))
+# Seconds between checks of the workbook for changes; '0' turns hot reload off
+DATASET_POLL = float(os.environ.get('DATASET_POLL', 5))
+
+# Layout of the dataset directory, one subdirectory per workbook version named by its content hash:
+#   <hash>/workbook.xlsx     the workbook as registered, never modified afterwards
+#   <hash>/snapshot/         its compiled snapshot (see snapshot.py), so it is only parsed once
+#   <hash>/version.json      fingerprint, source path and registration time
+#   .tmp-*/                  a version being registered, renamed to <hash>/ once complete
+#   .lock                    held while a process registers or deletes versions
+# Gunicorn workers share the directory, so a <hash>/ directory only ever appears whole, by one rename.
+
+
+class DatasetVersion:
+    """One registered workbook: an immutable copy of the file plus its compiled snapshot.
+
+    ``state`` is whatever the registry's ``build`` made from it, or None while it is not loaded.
+    """
+
+    def __init__(self, fingerprint, directory, source, registered_at):
+        self.fingerprint = fingerprint
+        self.directory = directory
+        self.source = source
+        self.registered_at = registered_at
+        self.path = os.path.join(directory, 'workbook.xlsx')
+        self.snapshot_dir = os.path.join(directory, 'snapshot')
+        self.state = None
+        self.last_used = 0.0
+
+    @property
+    def label(self):
+        registered = time.strftime('%Y-%m-%d %H:%M', time.localtime(self.registered_at))
+        return f"{os.path.basename(self.source)}, {registered} ({self.fingerprint[:8]})"
+
+    def dataframes(self):
+        return load_data(self.path, self.snapshot_dir)
+
+    def ledgers(self, keys):
+        return load_ledgers(keys, path=self.path, snapshot_dir=self.snapshot_dir)
+
+
+class DatasetRegistry:
+    """Every workbook version seen, each compiled once, with one of them current.
+
+    Callbacks read ``current_state()`` once per request. A version is swapped in by replacing the ``current``
+    reference after its state is fully built, so a request sees either the old workbook or the new one and never a
+    mix. The watcher thread (``ensure_started``) polls the workbook path and registers and activates a new version
+    when its contents change and then stay put for one poll, so a half-copied file is never read. At most
+    ``max_loaded`` versions keep their state in memory, least recently used evicted first; evicted versions reload
+    from their snapshot on demand.
+    """
+
+    def __init__(self, build, path=WORKBOOK_PATH, directory=DATASET_DIR, max_loaded=DATASET_VERSIONS,
+                 keep=DATASET_KEEP, poll=DATASET_POLL):
+        self.build = build
+        self.path = path
+        self.directory = directory
+        self.max_loaded = max(max_loaded, 1)
+        self.keep = max(keep, 1)
+        self.poll = poll
+        self.current = None
+        self.listeners = []
+        self._versions = {}
+        self._seen_stat = None
+        self._pending_stat = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._scan()
+
+    def _scan(self):
+        # Versions registered by earlier runs or other workers; their state loads on first use
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name, 'version.json'), 'r') as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+                continue
+            if meta['fingerprint'] not in self._versions:
+                self._versions[meta['fingerprint']] = DatasetVersion(meta['fingerprint'],
+                                                                     os.path.join(self.directory, name),
+                                                                     meta['source'], meta['registered_at'])
+        # Forget versions another process deleted, unless their state is still in use here
+        for fingerprint, version in list(self._versions.items()):
+            if (version is not self.current and version.state is None and
+                    not os.path.exists(os.path.join(version.directory, 'version.json'))):
+                del self._versions[fingerprint]
+
+    @contextmanager
+    def _disk_lock(self):
+        # Serialises registering and deleting versions across processes sharing the directory
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def versions(self):
+        # Newest first
+        with self._lock:
+            self._scan()
+            return sorted(self._versions.values(), key=lambda version: version.registered_at, reverse=True)
+
+    def get(self, fingerprint):
+        """The version whose fingerprint starts with ``fingerprint``; KeyError if there is none or several."""
+        with self._lock:
+            self._scan()
+            matches = [version for key, version in self._versions.items() if key.startswith(fingerprint)]
+        if len(matches) != 1:
+            raise KeyError(f"No single dataset version {fingerprint!r}")
+        return matches[0]
+
+    def register(self, path):
+        """Copy the workbook at ``path`` into the registry and compile it, unless its contents are registered."""
+        with open(path, 'rb') as f:
+            contents = f.read()
+        fingerprint = hashlib.sha256(contents).hexdigest()
+        with self._lock, self._disk_lock():
+            # Another worker may have registered it since this one last looked
+            self._scan()
+            if fingerprint in self._versions:
+                return self._versions[fingerprint]
+            directory = os.path.join(self.directory, fingerprint[:16])
+            staging = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+            version = DatasetVersion(fingerprint, staging, os.path.abspath(path), time.time())
+            try:
+                os.makedirs(version.snapshot_dir)
+                _write_atomic(version.path, lambda f: f.write(contents))
+                # Parses the copy and writes its snapshot; a workbook that does not parse is not registered
+                version.dataframes()
+                meta = json.dumps({'fingerprint': fingerprint, 'source': version.source,
+                                   'registered_at': version.registered_at}).encode()
+                _write_atomic(os.path.join(staging, 'version.json'), lambda f: f.write(meta))
+                # Left over from a registration that died before writing version.json
+                shutil.rmtree(directory, ignore_errors=True)
+                os.replace(staging, directory)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            version = DatasetVersion(fingerprint, directory, version.source, version.registered_at)
+            self._versions[fingerprint] = version
+            print(f"Dataset: registered {version.label}")
+            self._prune()
+            return version
+
+    def _prune(self):
+        # Delete all but the newest ``keep`` versions from disk; called with the disk lock held. A version this process
+        # serves is kept, and one another worker still has in memory keeps working from its loaded state.
+        stored = sorted(self._versions.values(), key=lambda version: version.registered_at, reverse=True)
+        for version in stored[self.keep:]:
+            if version is not self.current and version.state is None:
+                shutil.rmtree(version.directory, ignore_errors=True)
+                del self._versions[version.fingerprint]
+
+    def state(self, version):
+        """``version``'s state, built if it is not in memory."""
+        with self._lock:
+            if version.state is None:
+                started = time.perf_counter()
+                version.state = self.build(version)
+                print(f"Dataset: loaded {version.label} ({(time.perf_counter() - started) * 1000:.0f} ms)")
+            version.last_used = time.monotonic()
+            self._evict(version)
+            return version.state
+
+    def current_state(self):
+        # State of the version being served; read once per request
+        version = self.current
+        state = version.state
+        return state if state is not None else self.state(version)
+
+    def activate(self, version):
+        # Build first, swap the reference second, so requests never see a half-built version
+        with self._lock:
+            self.state(version)
+            previous, self.current = self.current, version
+            self._evict()
+        if previous is not version:
+            print(f"Dataset: now serving {version.label}")
+            for listener in self.listeners:
+                listener(version)
+        return version
+
+    def on_activate(self, listener):
+        # ``listener(version)`` runs after each swap, for state outside the versions such as the served layout
+        self.listeners.append(listener)
+        return listener
+
+    def _evict(self, using=None):
+        # Only drops state from memory; the version stays on disk and reloads from its snapshot. ``using``, the
+        # version just asked for, is kept like the current one.
+        loaded = sorted((version for version in self._versions.values()
+                         if version.state is not None and version is not self.current and version is not using),
+                        key=lambda version: version.last_used)
+        room = max(self.max_loaded - 1 - (using is not None and using is not self.current), 0)
+        for version in loaded[:max(len(loaded) - room, 0)]:
+            version.state = None
+
+    def load(self):
+        """Register the workbook at ``path`` and make it current; used once at startup."""
+        stat = os.stat(self.path)
+        self._seen_stat = (stat.st_mtime_ns, stat.st_size)
+        return self.activate(self.register(self.path))
+
+    def check(self):
+        """Swap in the workbook at ``path`` if it changed and has stayed unchanged since the last check.
+
+        Returns the new current version, or None. A workbook that fails to load is reported and the current version
+        kept; it is retried once the file changes again.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stat = (stat.st_mtime_ns, stat.st_size)
+        if stat == self._seen_stat:
+            self._pending_stat = None
+            return None
+        if stat != self._pending_stat:
+            # Changed since the last look: wait a poll in case it is still being written
+            self._pending_stat = stat
+            return None
+        self._seen_stat, self._pending_stat = stat, None
+        try:
+            version = self.register(self.path)
+        except Exception as e:
+            print(f"Dataset: could not load {self.path}, keeping {self.current.label}: {e!r}")
+            return None
+        if version is self.current:
+            return None
+        return self.activate(version)
+
+    def run(self):
+        while not self._stop.wait(self.poll):
+            try:
+                self.check()
+            except Exception as e:
+                # A version that fails to build is skipped; the watcher keeps serving and watching
+                print(f"Dataset: reload of {self.path} failed, keeping {self.current.label}: {e!r}")
+
+    def ensure_started(self):
+        # Threads do not survive a fork, so each gunicorn worker watches the workbook itself
+        if not self.poll or (self._pid == os.getpid() and self._thread.is_alive()):
+            return
+        self._pid = os.getpid()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='dataset-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
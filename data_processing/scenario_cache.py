@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+SCENARIO_CACHE_DIR = os.environ.get('SCENARIO_CACHE_DIR', '.scenario_cache')
+SCENARIO_CACHE_SIZE = int(os.environ.get('SCENARIO_CACHE_SIZE', 128))
+# Format of the cached results. Bump it with any change to what a key computes (transforms, figures, the simulation,
+# the clientside bundle), since the files outlive restarts and a key only names the toggles and price dates.
+SCENARIO_CACHE_VERSION = 2
+
+
+def price_snapshot_date(pricing_items, price_dates=None):
+    # Price toggles use the latest close, so those results are only reusable for the same set of closes
+    if not pricing_items:
+        return 'petition'
+    if price_dates is not None:
+        return '|'.join(f'{item}:{price_dates[item]}' for item in pricing_items)
+    yesterday = datetime.now() - timedelta(days=1)
+    return yesterday.strftime("%Y-%m-%d")
+
+
+def scenario_key(selected_items, pricing_items, price_dates=None):
+    # Transforms are applied in a fixed order, so the order of the checkbox values does not matter
+    selected = tuple(sorted(set(selected_items or [])))
+    pricing = tuple(sorted(set(pricing_items or [])))
+    return selected, pricing, price_snapshot_date(pricing, price_dates)
+
+
+def cache_namespace(fingerprint, *parameters):
+    # Cache directory of one workbook version: its fingerprint salted with SCENARIO_CACHE_VERSION and whatever
+    # else the results depend on (the simulation assumptions), so a deploy that changes them starts afresh
+    salt = json.dumps([SCENARIO_CACHE_VERSION] + list(parameters), sort_keys=True, default=str)
+    return f'{fingerprint}-{hashlib.sha1(salt.encode()).hexdigest()[:12]}'
+
+
+class ScenarioCache:
+    """Bounded LRU of scenario results, backed by a directory of JSON files.
+
+    Each process keeps its own in-memory LRU. The files are shared, so a result computed by one gunicorn worker
+    is a file read for the others. Files are written to a temporary name and moved into place, so readers never
+    see a partial entry.
+    """
+
+    def __init__(self, namespace, cache_dir=SCENARIO_CACHE_DIR, max_entries=SCENARIO_CACHE_SIZE, encoder=None):
+        self.directory = os.path.join(cache_dir, namespace)
+        self.max_entries = max_entries
+        self.encoder = encoder
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+            os.utime(path)  # Mark as recently used for the file eviction below
+        except (FileNotFoundError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        # Round-trip through JSON so every worker serves exactly what is stored on disk
+        payload = json.dumps(value, cls=self.encoder)
+        value = json.loads(payload)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(payload)
+        os.replace(tmp_path, self._path(key))
+
+        self._remember(key, value)
+        self._evict_files()
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def _evict_files(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except FileNotFoundError:
+                continue  # Evicted by another worker
+        entries.sort()
+        for _, name in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
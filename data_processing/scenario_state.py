@@ -0,0 +1,25 @@
+from data_processing.ledger import new_stats
+
+
+class ScenarioState:
+    """Immutable baseline ledgers plus the copy-on-write views a single scenario has written to.
+
+    A sheet's matrix is copied the first time a transform writes to it; untouched sheets stay shared with the
+    baseline. ``stats`` counts the sheets copied, rows added, cells written and bytes allocated for the scenario.
+    """
+
+    def __init__(self, baseline):
+        self._baseline = baseline
+        self._sheets = {}
+        self.stats = new_stats()
+
+    def __getitem__(self, name):
+        if name not in self._sheets:
+            self._sheets[name] = self._baseline[name].view(self.stats)
+        return self._sheets[name]
+
+    def __iter__(self):
+        return iter(self._baseline)
+
+    def __contains__(self, name):
+        return name in self._baseline
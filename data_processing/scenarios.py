@@ -0,0 +1,103 @@
+import itertools
+from data_processing.ledger import Ledger
+from data_processing.scenario_state import ScenarioState
+from data_processing.ops import apply_ops, compile_ops
+from data_processing.transforms import claim_alameda, zero_out_sam_coins, subcon_alameda_dotcom_ventures, \
+    subcon_wrs, inject_last_close_crypto_prices, inject_last_close_security_prices, reprice
+
+RECOVERY_TOGGLES = ['CLAIM_ALAMEDA', 'SUBCON', 'SUBCON_US', 'ZERO_SAM']
+PRICING_TOGGLES = ['CATEGORY_A_UPDATE', 'LIQUID_SEC_UPDATE']
+
+# Recovery toggles apply in this order whatever order they were ticked in. Each maps to a builder of its ops.
+RECOVERY_ORDER = ['CLAIM_ALAMEDA', 'ZERO_SAM', 'SUBCON', 'SUBCON_US']
+RECOVERY_OPS = {
+    'CLAIM_ALAMEDA': claim_alameda,
+    'ZERO_SAM': zero_out_sam_coins,
+    'SUBCON': subcon_alameda_dotcom_ventures,
+    'SUBCON_US': subcon_wrs,
+}
+
+# Sheets the transforms read or write. The ventures sheet is only used for the static table.
+SCENARIO_SHEETS = [
+    "cash_df",
+    "assets_df",
+    "liabilities_df",
+    "ftx_intl_crypto_df",
+    "ftx_us_crypto_df",
+    "ftx_international_related_party_df",
+    "ftx_us_related_party_df",
+    "alameda_df",
+    "securities_df",
+]
+
+
+class ScenarioEngine:
+    """Keeps the parsed workbook in process and applies recovery and pricing toggles to it.
+
+    Callbacks only send the toggle values, so the workbook never travels to or from the browser.
+    """
+
+    def __init__(self, baseline):
+        self.baseline = baseline
+
+    @classmethod
+    def from_frames(cls, dataframes):
+        return cls({k: Ledger.from_frame(dataframes[k]).freeze() for k in SCENARIO_SHEETS})
+
+    def run(self, selected_items, pricing_items, prices=None, token_prices=None, adjust=None, recovery_params=None,
+            rounding=True):
+        # ``prices`` maps each price toggle to the closes to use; without it the closes are fetched here.
+        # ``token_prices`` reprices every token row before the toggles are applied. ``adjust(data)`` runs after
+        # the price toggles and before the recovery toggles, whose builders get ``recovery_params[toggle]`` as
+        # keyword arguments. ``rounding=False`` skips the whole-dollar-million rounding of repricing and the ops.
+        data_adj = self.priced(pricing_items, prices, token_prices, adjust, rounding)
+        return apply_ops(data_adj, recovery_ops(selected_items, data_adj, recovery_params), rounding)
+
+    def priced(self, pricing_items, prices=None, token_prices=None, adjust=None, rounding=True):
+        """The state the recovery toggles start from: the baseline after ``token_prices``, the price toggles and
+        ``adjust``, as in ``run``."""
+        pricing_items = pricing_items or []
+        prices = prices or {}
+
+        # Transforms write through a copy-on-write overlay, so the shared baseline is never modified
+        data_adj = ScenarioState(self.baseline)
+
+        if token_prices is not None:
+            data_adj = reprice(data_adj, token_prices, rounding=rounding)
+        if 'CATEGORY_A_UPDATE' in pricing_items:
+            data_adj = inject_last_close_crypto_prices(data_adj, prices.get('CATEGORY_A_UPDATE'), rounding)
+        if 'LIQUID_SEC_UPDATE' in pricing_items:
+            data_adj = inject_last_close_security_prices(data_adj, prices.get('LIQUID_SEC_UPDATE'))
+        if adjust is not None:
+            adjust(data_adj)
+        return data_adj
+
+    def compile(self, selected_items, data=None, recovery_params=None):
+        """The recovery toggles as one LinearScenario over ``data`` (default: the baseline).
+
+        Matches ``run`` with ``rounding=False`` on the same state; ``data`` is usually ``priced(...)``.
+        """
+        data = ScenarioState(self.baseline) if data is None else data
+        return compile_ops(recovery_ops(selected_items, data, recovery_params), data)
+
+
+def recovery_ops(selected_items, data, params=None):
+    # Ops of every selected recovery toggle, in RECOVERY_ORDER. Builders all read the state before any op runs,
+    # which is what CLAIM_ALAMEDA needs for the Alameda recovery rate since it comes first.
+    ops = []
+    for toggle in RECOVERY_ORDER:
+        if toggle in (selected_items or []):
+            ops += RECOVERY_OPS[toggle](data, **(params or {}).get(toggle, {}))
+    return ops
+
+
+def all_scenarios(include_pricing=False):
+    # Every combination of the recovery toggles, optionally crossed with every combination of the price toggles
+    pricing_combinations = [[]]
+    if include_pricing:
+        pricing_combinations = [list(c) for n in range(len(PRICING_TOGGLES) + 1)
+                                for c in itertools.combinations(PRICING_TOGGLES, n)]
+    return [(list(selected), pricing)
+            for n in range(len(RECOVERY_TOGGLES) + 1)
+            for selected in itertools.combinations(RECOVERY_TOGGLES, n)
+            for pricing in pricing_combinations]
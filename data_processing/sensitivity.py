@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from data_processing.simulation import EXCHANGES, HAIRCUT_ASSETS, LinearRecovery
+from data_processing.transforms import REPRICED_SHEETS, calc_alameda_recovery
+
+# Sweepable parameters:
+#   'price:<TOKEN>'     token price in USD; the token's rows are revalued pro rata from its reference price
+#   'alameda_recovery'  recovery rate CLAIM_ALAMEDA applies to Alameda's assets (default: its assets / liabilities)
+#   'haircut:<ASSET>'   fraction of an exchange line item written off, one of HAIRCUT_ASSETS
+ALAMEDA_RECOVERY = 'alameda_recovery'
+
+# Grids larger than this are refused by the endpoint
+MAX_GRID_STEPS = 1000
+
+# Tornado ranges, as multiples of the reference price for prices and as absolute values otherwise
+TORNADO_PRICE_RANGE = (0.5, 1.5)
+TORNADO_RANGES = {ALAMEDA_RECOVERY: (0.0, 1.0), **{f'haircut:{asset}': (0.0, 0.5) for asset in HAIRCUT_ASSETS}}
+
+
+def parse_parameter(name):
+    # 'price:FTT' -> ('price', 'FTT'); raises ValueError for anything not listed above
+    kind, _, arg = name.partition(':')
+    if name == ALAMEDA_RECOVERY:
+        return ALAMEDA_RECOVERY, None
+    if kind == 'price' and arg:
+        return kind, arg
+    if kind == 'haircut' and arg in HAIRCUT_ASSETS:
+        return kind, arg
+    raise ValueError(f"Unknown sweep parameter {name!r}")
+
+
+class Sweep:
+    """Recovery rates over a grid of one or two parameters, for one toggle combination.
+
+    Every parameter enters the scenario linearly: a price scales token values, the Alameda rate scales the claim
+    ops and a haircut subtracts part of a line item. Each exchange's assets and liabilities are therefore affine in
+    each parameter with the others held fixed, so four evaluations at the corners of the grid pin them down exactly
+    and the grid itself is a pair of outer products. Evaluations apply the compiled scenario (LinearRecovery) to the
+    priced state, compiled once per Alameda rate since that is the one parameter that changes the ops.
+    """
+
+    def __init__(self, engine, selected_items, pricing_items=None, prices=None, reference_prices=None):
+        self.engine = engine
+        self.selected_items = selected_items or []
+        self.pricing_items = pricing_items or []
+        self.prices = prices or {}
+        # The price toggles move the reference of the tokens they reprice
+        reference_prices = pd.Series(reference_prices, dtype=float)
+        if 'CATEGORY_A_UPDATE' in self.pricing_items:
+            reference_prices = pd.concat([reference_prices, pd.Series(self.prices['CATEGORY_A_UPDATE'], dtype=float)])
+        self.reference_prices = reference_prices[~reference_prices.index.duplicated(keep='last')]
+        self._priced = None
+        self._linear = {}
+
+    def priced(self):
+        # The state the recovery toggles start from, read by every evaluation and never written
+        if self._priced is None:
+            self._priced = self.engine.priced(self.pricing_items, self.prices)
+        return self._priced
+
+    def linear(self, alameda_recovery_rate=None):
+        if alameda_recovery_rate not in self._linear:
+            params = None if alameda_recovery_rate is None else \
+                {'CLAIM_ALAMEDA': {'alameda_recovery_rate': alameda_recovery_rate}}
+            self._linear[alameda_recovery_rate] = LinearRecovery(self.engine, self.selected_items, self.priced(),
+                                                                 params)
+        return self._linear[alameda_recovery_rate]
+
+    def parameters(self):
+        """Every parameter that can move this scenario: held tokens with a reference price, the rest always."""
+        held = set()
+        for key in REPRICED_SHEETS:
+            ledger = self.engine.baseline[key]
+            located = ledger.values[:, ledger.col('Located Assets')]
+            held.update(label for label, value in zip(ledger.index, located) if value > 0)
+        tokens = [token for token in self.reference_prices.index if token in held and self.reference_prices[token] > 0]
+        return [f'price:{token}' for token in tokens] + [ALAMEDA_RECOVERY] + [f'haircut:{a}' for a in HAIRCUT_ASSETS]
+
+    def reference_price(self, token):
+        # Price the token's rows are valued at before any sweep
+        if token not in self.reference_prices or not self.reference_prices[token] > 0:
+            raise ValueError(f"No reference price for {token}")
+        return float(self.reference_prices[token])
+
+    def default(self, name):
+        # Value of a parameter in the scenario as the dashboard shows it
+        kind, arg = parse_parameter(name)
+        if kind == 'price':
+            return self.reference_price(arg)
+        if kind == ALAMEDA_RECOVERY:
+            # CLAIM_ALAMEDA takes the rate from the priced state before any recovery toggle
+            return float(calc_alameda_recovery(self.priced()))
+        return 0.0
+
+    def default_range(self, name):
+        # Range swept when none is given: zero to twice the reference price, or the whole unit interval
+        kind, arg = parse_parameter(name)
+        if kind == 'price':
+            return 0.0, 2 * self.reference_price(arg)
+        return 0.0, 1.0
+
+    def evaluate(self, point):
+        """Assets and liabilities per exchange, arrays in EXCHANGES order, with ``point`` = {parameter: value}."""
+        scales, alameda_recovery_rate, haircuts = {}, None, {}
+        for name, value in point.items():
+            kind, arg = parse_parameter(name)
+            if kind == 'price':
+                scales[arg] = value / self.reference_price(arg)
+            elif kind == ALAMEDA_RECOVERY:
+                alameda_recovery_rate = value
+            else:
+                haircuts[arg] = value
+
+        linear = self.linear(alameda_recovery_rate)
+        x = linear.layout.flatten(linear.data)
+        # A price scales the token's rows pro rata, carried into their category totals as scale_token_value does
+        for token, factor in scales.items():
+            for key in REPRICED_SHEETS:
+                if (key, token, 'Located Assets') in linear.layout:
+                    value = x[linear.layout.position(key, token, 'Located Assets')]
+                    if not np.isnan(value):
+                        x = x + (factor - 1) * value * linear.direction(key, token)
+        totals = linear.totals(x)
+        assets = np.array([totals[name][0] - sum(haircuts.get(asset, 0.0) * base
+                                                 for asset, base in zip(HAIRCUT_ASSETS, totals[name][2]))
+                           for name in EXCHANGES])
+        liabilities = np.array([totals[name][1] for name in EXCHANGES])
+        return assets, liabilities
+
+    def grid(self, x_name, x_values, y_name=None, y_values=None):
+        """Recovery rates in percent, shape (exchanges, len(y_values), len(x_values)); one row without ``y_name``."""
+        x_values = np.asarray(x_values, dtype=float)
+        y_values = np.asarray([0.0] if y_name is None else y_values, dtype=float)
+        x0, x1 = _corners(x_values)
+        y0, y1 = _corners(y_values)
+
+        def at(x, y):
+            point = {x_name: x}
+            if y_name is not None:
+                point[y_name] = y
+            return self.evaluate(point)
+
+        # Bilinear in (u, v), exact for a function affine in each parameter separately
+        corners = [[at(x0, y0), at(x1, y0)], [at(x0, y1), at(x1, y1)]] if y_name is not None else \
+            [[at(x0, None), at(x1, None)]] * 2
+        u = (x_values - x0) / (x1 - x0)
+        v = (y_values - y0) / (y1 - y0)
+        weights = {(0, 0): np.outer(1 - v, 1 - u), (0, 1): np.outer(1 - v, u),
+                   (1, 0): np.outer(v, 1 - u), (1, 1): np.outer(v, u)}
+
+        result = []
+        for k in (0, 1):
+            result.append(sum(weights[i, j][np.newaxis] * corners[i][j][k][:, np.newaxis, np.newaxis]
+                              for i in (0, 1) for j in (0, 1)))
+        assets, liabilities = result
+        return assets / liabilities * 100
+
+    def tornado(self, ranges=None):
+        """Base recovery rates and, per parameter, the rates at the low and high end of its range.
+
+        Returns ``(base, {parameter: (low, high, rate_at_low, rate_at_high)})`` with rates as arrays in EXCHANGES
+        order. ``ranges`` defaults to TORNADO_PRICE_RANGE around each price and TORNADO_RANGES for the rest.
+        """
+        if ranges is None:
+            ranges = {}
+            for name in self.parameters():
+                kind, arg = parse_parameter(name)
+                if kind == 'price':
+                    price = self.reference_price(arg)
+                    ranges[name] = (TORNADO_PRICE_RANGE[0] * price, TORNADO_PRICE_RANGE[1] * price)
+                else:
+                    ranges[name] = TORNADO_RANGES[name]
+
+        assets, liabilities = self.evaluate({})
+        base = assets / liabilities * 100
+        bars = {}
+        for name, (low, high) in ranges.items():
+            rates = self.grid(name, [low, high])[:, 0, :]
+            bars[name] = (low, high, rates[:, 0], rates[:, 1])
+        return base, bars
+
+
+def describe_parameter(name):
+    # Axis label for a parameter
+    kind, arg = parse_parameter(name)
+    if kind == 'price':
+        return f'{arg} Price ($)'
+    if kind == ALAMEDA_RECOVERY:
+        return 'Alameda Recovery Rate'
+    return f'{arg} Haircut'
+
+
+def _corners(values):
+    # Two distinct points spanning the values; a single value gets a unit-wide span
+    low, high = float(values.min()), float(values.max())
+    return (low, high) if high > low else (low, low + 1.0)
@@ -0,0 +1,206 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from data_processing.ops import VectorLayout
+from data_processing.recovery import create_exchange_dict
+from data_processing.transforms import REPRICED_SHEETS, category_total
+
+SIMULATION_DRAWS = int(os.environ.get('SIMULATION_DRAWS', 100000))
+SIMULATION_WORKERS = int(os.environ.get('SIMULATION_WORKERS', 1))
+SIMULATION_SEED = int(os.environ.get('SIMULATION_SEED', 0))
+# Draws evaluated at once, which bounds memory to a few MB per token
+SIMULATION_CHUNK = 50000
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Exchange key -> (crypto sheet, related party sheet), as in calculate_recovery_rate
+EXCHANGES = {
+    'ftx_intl': ('ftx_intl_crypto_df', 'ftx_international_related_party_df'),
+    'ftx_us': ('ftx_us_crypto_df', 'ftx_us_related_party_df'),
+}
+HAIRCUT_ASSETS = ['Venture Investments', 'Crypto - Category B', 'Clawbacks']
+
+# Price moves are lognormal over the horizon with one market factor, so every pair of tokens has the same
+# correlation. Haircuts are the fraction of each line item lost, drawn from Beta(a, b).
+DEFAULT_ASSUMPTIONS = {
+    'volatility': 0.8,
+    'correlation': 0.7,
+    'horizon': 1.0,
+    'haircuts': {
+        'Venture Investments': (2.0, 2.0),
+        'Crypto - Category B': (8.0, 2.0),
+        'Clawbacks': (2.0, 3.0),
+    },
+}
+
+
+def exchange_totals(data):
+    # Total assets, total liabilities and the haircut line items of each exchange
+    totals = {}
+    for name, (crypto_key, related_party_key) in EXCHANGES.items():
+        exchange = create_exchange_dict(data[crypto_key].to_frame(), data[related_party_key].to_frame())
+        totals[name] = (
+            float(sum(exchange['assets'].values())),
+            float(sum(exchange['liabilities'].values())),
+            [float(exchange['assets'].get(asset, 0)) for asset in HAIRCUT_ASSETS],
+        )
+    return totals
+
+
+class LinearRecovery:
+    """One toggle combination compiled (ScenarioEngine.compile) over a priced state.
+
+    The recovery toggles only add, scale or zero cells, so the compiled scenario is a linear map and each exchange's
+    assets are a sum of its output cells. ``value_exposure`` reads the change per unit of a row's Located Assets
+    straight off the matrix, so it is exact and free of the ops' whole-dollar-million rounding, which ``run`` with
+    rounding on would add back.
+    """
+
+    def __init__(self, engine, selected_items, data, recovery_params=None):
+        self.data = data
+        self.layout = VectorLayout.of(data)
+        self.scenario = engine.compile(selected_items, data, recovery_params)
+
+    def totals(self, x=None):
+        # exchange_totals of the scenario applied to the flattened state ``x`` (default: ``data``)
+        x = self.layout.flatten(self.data) if x is None else x
+        return exchange_totals(self.scenario.output_layout.ledgers(self.scenario.apply(x)))
+
+    def direction(self, sheet, row):
+        # Change in the flattened state when a row's Located Assets goes up by one: the row and its category total
+        direction = np.zeros(self.layout.size)
+        direction[self.layout.position(sheet, row, 'Located Assets')] = 1.0
+        total = category_total(row)
+        if (sheet, total, 'Located Assets') in self.layout:
+            direction[self.layout.position(sheet, total, 'Located Assets')] = 1.0
+        return direction
+
+    def value_exposure(self, rows):
+        """Change in each exchange's assets per $1M of Located Assets of each (sheet, row), shape (rows, exchanges)."""
+        outputs = self.scenario.matrix @ np.column_stack([self.direction(sheet, row) for sheet, row in rows] or
+                                                         [np.zeros(self.layout.size)])
+        exposure = np.empty((len(rows), len(EXCHANGES)))
+        for i in range(len(rows)):
+            totals = exchange_totals(self.scenario.output_layout.ledgers(outputs[:, i]))
+            exposure[i] = [totals[name][0] for name in EXCHANGES]
+        return exposure
+
+
+def held_rows(engine, tokens):
+    # (sheet, token, quantity) of every row reprice revalues for one of ``tokens``
+    rows = []
+    for key in REPRICED_SHEETS:
+        ledger = engine.baseline[key]
+        quantity = ledger.values[:, ledger.col('Quantity')]
+        rows += [(key, label, float(q)) for label, q in zip(ledger.index, quantity) if label in tokens and q > 0]
+    return rows
+
+
+class RecoveryModel:
+    """Exchange assets as an affine function of token prices, for one toggle combination.
+
+    Repricing and the recovery transforms only ever add, scale or zero sheet values, so each exchange's assets move
+    linearly with every token price. ``build`` reads the slopes off the compiled scenario (LinearRecovery): a token's
+    exposure is its held quantity times the exposure of each row holding it. After that a draw is a matrix product
+    rather than a pass through the transforms.
+    """
+
+    def __init__(self, tokens, reference_prices, base_assets, exposure, haircut_bases, liabilities):
+        self.tokens = tokens
+        self.reference_prices = reference_prices
+        self.base_assets = base_assets
+        self.exposure = exposure
+        self.haircut_bases = haircut_bases
+        self.liabilities = liabilities
+
+    @classmethod
+    def build(cls, engine, selected_items, pricing_items, prices, token_prices, rounding=True):
+        prices = prices or {}
+        token_prices = pd.Series(token_prices, dtype=float)
+        # The Category A closes become the reference prices, so the price toggle must not overwrite the draws
+        if 'CATEGORY_A_UPDATE' in (pricing_items or []):
+            token_prices = pd.concat([token_prices, pd.Series(prices['CATEGORY_A_UPDATE'], dtype=float)])
+        token_prices = token_prices[~token_prices.index.duplicated(keep='last')]
+        pricing_items = [item for item in pricing_items or [] if item != 'CATEGORY_A_UPDATE']
+
+        # Only tokens held in some sheet move the recovery
+        rows = held_rows(engine, set(token_prices.dropna().index))
+        tokens = [token for token in token_prices.index if any(label == token for _, label, _ in rows)]
+
+        # ``rounding`` only applies to the base run; the slopes are exact
+        totals = exchange_totals(engine.run(selected_items, pricing_items, prices, token_prices=token_prices,
+                                            rounding=rounding))
+        base_assets = np.array([totals[name][0] for name in EXCHANGES])
+        linear = LinearRecovery(engine, selected_items, engine.priced(pricing_items, prices, token_prices))
+        row_exposure = linear.value_exposure([(key, label) for key, label, _ in rows])
+        exposure = np.zeros((len(EXCHANGES), len(tokens)))
+        for (_, label, quantity), row in zip(rows, row_exposure):
+            exposure[:, tokens.index(label)] += quantity / 1000000.0 * row
+
+        return cls(
+            tokens,
+            token_prices[tokens].to_numpy(),
+            base_assets,
+            exposure,
+            np.array([totals[name][2] for name in EXCHANGES]),
+            np.array([totals[name][1] for name in EXCHANGES]),
+        )
+
+    def recovery(self, price_draws, haircut_draws):
+        """Recovery rate in percent per draw and exchange, shape (draws, exchanges)."""
+        assets = (self.base_assets
+                  + (price_draws - self.reference_prices) @ self.exposure.T
+                  - haircut_draws @ self.haircut_bases.T)
+        return assets / self.liabilities * 100
+
+
+def draw_prices(rng, reference_prices, n, volatility, correlation, horizon):
+    # Correlated lognormal prices: a shared market shock plus one idiosyncratic shock per token
+    market = rng.standard_normal((n, 1))
+    shocks = np.sqrt(correlation) * market + np.sqrt(1 - correlation) * rng.standard_normal((n, len(reference_prices)))
+    sigma = np.asarray(volatility) * np.sqrt(horizon)
+    return reference_prices * np.exp(sigma * shocks - sigma ** 2 / 2)
+
+
+def draw_haircuts(rng, n, haircuts):
+    return np.column_stack([rng.beta(*haircuts[asset], size=n) for asset in HAIRCUT_ASSETS])
+
+
+def simulate_shard(model, draws, seed, assumptions=DEFAULT_ASSUMPTIONS):
+    """Recovery rates for ``draws`` draws from one random stream, evaluated in chunks."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for start in range(0, draws, SIMULATION_CHUNK):
+        n = min(SIMULATION_CHUNK, draws - start)
+        price_draws = draw_prices(rng, model.reference_prices, n, assumptions['volatility'],
+                                  assumptions['correlation'], assumptions['horizon'])
+        results.append(model.recovery(price_draws, draw_haircuts(rng, n, assumptions['haircuts'])))
+    return np.concatenate(results) if results else np.empty((0, len(EXCHANGES)))
+
+
+def simulate(model, draws=SIMULATION_DRAWS, workers=SIMULATION_WORKERS, seed=SIMULATION_SEED,
+             assumptions=DEFAULT_ASSUMPTIONS):
+    """Recovery rate draws, shape (draws, exchanges), sharded across ``workers`` processes.
+
+    Each shard gets its own child of ``seed``, so a given seed and worker count always gives the same draws.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    shard_draws = [draws // workers + (i < draws % workers) for i in range(workers)]
+    if workers == 1:
+        return simulate_shard(model, draws, seeds[0], assumptions)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = pool.map(simulate_shard, [model] * workers, shard_draws, seeds, [assumptions] * workers)
+        return np.concatenate(list(shards))
+
+
+def summarise(recovery_draws):
+    # Mean and percentiles per exchange, in the shape the dashboard stores
+    return {
+        name: {
+            'mean': float(recovery_draws[:, i].mean()),
+            'percentiles': dict(zip(map(str, PERCENTILES), np.percentile(recovery_draws[:, i], PERCENTILES).tolist())),
+            'draws': int(len(recovery_draws)),
+        }
+        for i, name in enumerate(EXCHANGES)
+    }
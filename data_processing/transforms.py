@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+from data_processing.ops import Add, Zero
+from data_processing.recovery import CATEGORY_B_ASSETS
+
+CATEGORY_A_ROWS = ['BTC', 'ETH', 'SOL', 'XRP', 'BNB', 'MATIC', 'TRX', 'All Other - Category A',
+                   'DOGE', 'LINK', 'SHIB', 'UNI', 'ALGO', 'PAXG', 'ETHW', 'WETH', 'APT']
+
+# Assets the price toggles reprice at the latest close
+CATEGORY_A_CRYPTO = ['BTC', 'ETH', 'SOL', 'XRP', 'BNB', 'MATIC', 'TRX', 'DOGE', 'APT']
+LIQUID_SECURITIES = ["BITW", "ETHE", "GBTC", "HOOD"]
+
+# Sheets holding a Quantity per token
+REPRICED_SHEETS = ['ftx_intl_crypto_df', 'ftx_us_crypto_df', 'alameda_df']
+
+
+# The recovery toggles are declared as ops (see ops.py) rather than applied directly, so the same definition can be
+# run against ledgers with apply_ops or compiled into a linear map with compile_ops. Each builder returns a list of
+# ops; ``data`` is only read, to find the sheets and the Alameda recovery rate.
+
+def zero_out_sam_coins(data):
+    sam_coins = ["Crypto - Category B"] + CATEGORY_B_ASSETS
+
+    # Zero every Category B row in every sheet that has one
+    return [Zero(key, rows=sam_coins) for key in data]
+
+def add_cash_to_stablecoin(exchange, columns, target_column='Located Assets', recovery_rate=1.0):
+    # Add the total of the specified cash columns to Cash / Stablecoin in the exchange
+    return [Add((exchange, 'Cash / Stablecoin', target_column), [('cash_df', None, column) for column in columns],
+                recovery_rate, rounding='total')]
+
+def add_alameda_crypto_assets(recovery_rate=1.0):
+    # 'Located Assets' values for 'Stablecoin', 'BTC', 'SOL & APT', 'All Other - Category A' in alameda_df
+    indices_alameda = ['Stablecoin', 'BTC', 'SOL', 'APT', 'All Other - Category A']
+    alameda = [('alameda_df', index, 'Located Assets') for index in indices_alameda]
+
+    return [
+        # Add 'Stablecoin' value from alameda_df to 'Cash / Stablecoin' in ftx_international_crypto_df
+        Add(('ftx_intl_crypto_df', 'Cash / Stablecoin', 'Located Assets'), alameda[:1], recovery_rate, rounding='total'),
+        # Add crypto assets value from alameda_df to 'Crypto - Category A' in ftx_international_crypto_df
+        Add(('ftx_intl_crypto_df', 'Crypto - Category A', 'Located Assets'), alameda[1:], recovery_rate, rounding='each'),
+    ] + [
+        # Add the selected indices and values to ftx_international_crypto_df, adding rows that do not exist yet
+        Add(('ftx_intl_crypto_df', index, 'Located Assets'), [source]) for index, source in zip(indices_alameda, alameda)
+    ]
+
+def subcon_non_crypto(silos, exchange, indices, recovery_rate=1.0):
+    # For each index, add the sum across the silos (e.g. 'Alameda' and 'Ventures') in assets_df to the exchange,
+    # creating a new entry for indices it does not have yet
+    return [Add((exchange, index, 'Located Assets'), [('assets_df', index, silo) for silo in silos], recovery_rate,
+                rounding='total') for index in indices]
+
+def zero_related_party_estimates():
+    # Zero 'Estimated Receivables' and 'Estimated Payables' in ftx_international_related_party_df
+    return [Zero('ftx_international_related_party_df', columns=['Estimated Receivables', 'Estimated Payables'])]
+
+def subcon_alameda_dotcom_ventures(data):
+    indices = ['Venture Investments', 'Liquid Securities', 'Clawbacks']
+    return (
+        # Add Cash to FTX International Cash / Stablecoin column
+        add_cash_to_stablecoin('ftx_intl_crypto_df', ["Alameda", "Ventures"])
+        # Add Alameda assets to FTX International crypto DF
+        + add_alameda_crypto_assets()
+        # Add Venture investments
+        + subcon_non_crypto(['Alameda', 'Ventures'], "ftx_intl_crypto_df", indices)
+        + zero_related_party_estimates()
+    )
+
+def calc_alameda_recovery(data):
+    total_alameda_assets = data["assets_df"].column_sum('Alameda')
+    total_alameda_liabs = data["liabilities_df"].column_sum('Alameda')
+    alameda_recovery = total_alameda_assets / total_alameda_liabs
+    return alameda_recovery
+
+def claim_alameda(data, alameda_recovery_rate=None):
+    # The rate defaults to Alameda's own assets over liabilities
+    if alameda_recovery_rate is None:
+        alameda_recovery_rate = calc_alameda_recovery(data)
+    indices = ['Venture Investments', 'Liquid Securities', 'Clawbacks']
+    alameda_llc = ('ftx_us_related_party_df', 'Alameda Research LLC')
+    return (
+        # Add Cash to FTX International Cash / Stablecoin column
+        add_cash_to_stablecoin('ftx_intl_crypto_df', ["Alameda"], recovery_rate=alameda_recovery_rate)
+        # Add Alameda assets to FTX International crypto DF
+        + add_alameda_crypto_assets(alameda_recovery_rate)
+        # Add Venture investments
+        + subcon_non_crypto(["Alameda"], "ftx_intl_crypto_df", indices, alameda_recovery_rate)
+        + zero_related_party_estimates()
+        # Net 'Estimated Payables' in ftx_us_related_party_df
+        + [Add(alameda_llc + ('Estimated Payables',), [alameda_llc + ('Estimated Receivables',)], -1.0),
+           Zero(alameda_llc[0], rows=[alameda_llc[1]], columns=['Estimated Receivables'])]
+    )
+
+def subcon_wrs(data):
+    # data['ftx_us_related_party_df'].zero_columns(['Estimated Payables'])
+    return (
+        # Add Cash to FTX US Cash / Stablecoin column
+        add_cash_to_stablecoin("ftx_us_crypto_df", ["WRS"])
+        # Add Assets
+        + subcon_non_crypto(["WRS"], "ftx_us_crypto_df", ['Related Party Receivables', 'Subsidiary Sales'])
+    )
+
+
+def adjust_category_a(df):
+    if 'Crypto - Category A' not in df:
+        print("Index 'Crypto - Category A' not found!")
+        return
+
+    # Update the 'Located Assets' value for 'Crypto - Category A' to the sum of the rows present in the sheet
+    df.set('Crypto - Category A', 'Located Assets', df.column_sum('Located Assets', CATEGORY_A_ROWS))
+
+def adjust_category_b(df):
+    # The 'Crypto - Category B' total is the sum of the Category B rows present in the sheet
+    df.set('Crypto - Category B', 'Located Assets', df.column_sum('Located Assets', CATEGORY_B_ASSETS))
+
+def category_total(row):
+    # Total row adjust_category_totals sums ``row`` into, or None
+    if row in CATEGORY_A_ROWS:
+        return 'Crypto - Category A'
+    if row in CATEGORY_B_ASSETS:
+        return 'Crypto - Category B'
+    return None
+
+def adjust_category_totals(ledger):
+    # Recompute whichever of the Category A and Category B totals the sheet has
+    if 'Crypto - Category A' in ledger:
+        adjust_category_a(ledger)
+    if 'Crypto - Category B' in ledger:
+        adjust_category_b(ledger)
+
+def reprice(data, prices, sheets=REPRICED_SHEETS, rounding=True):
+    """Revalue every token row that has a price and a positive Quantity, then recompute the category totals.
+
+    ``prices`` maps token to price: the petition date prices from ``load_petition_prices``, the newest cached
+    closes from ``load_cached_latest_prices``, or any user-supplied dict or Series. Rows are matched by label with
+    one hash join per sheet, so the cost does not grow with a Python loop over the tokens. Values are rounded to
+    whole dollar millions, as in the workbook, unless ``rounding`` is False.
+    """
+    prices = pd.Series(prices, dtype=float)
+    prices = prices[~prices.index.duplicated(keep='last')]
+    price_values = np.append(prices.to_numpy(), np.nan)
+
+    for key in sheets:
+        ledger = data[key]
+        # get_indexer returns -1 for unpriced labels, which picks the trailing NaN
+        price = price_values[prices.index.get_indexer(ledger.index)]
+        quantity = ledger.values[:, ledger.col('Quantity')]
+        positions = np.flatnonzero(~np.isnan(price) & (quantity > 0))
+        if positions.size:
+            value = price[positions] * quantity[positions] / 1000000.0
+            ledger.set_rows(positions, 'Located Assets', np.round(value) if rounding else value)
+            ledger.set_rows(positions, 'Price', price[positions])
+
+        adjust_category_totals(ledger)
+    return data
+
+def scale_token_value(data, token, factor, sheets=REPRICED_SHEETS):
+    # Multiply a token's 'Located Assets' wherever it is held, quantity or not, and recompute the category totals
+    for key in sheets:
+        ledger = data[key]
+        if token in ledger:
+            ledger.set(token, 'Located Assets', ledger.get(token, 'Located Assets') * factor)
+            adjust_category_totals(ledger)
+    return data
+
+def inject_last_close_crypto_prices(data, close_prices=None, rounding=True):
+    # Get the close prices for all tickers in one batch, unless a price snapshot was passed in. The pricing layer is
+    # only imported when it is needed, so the transforms run without requests or yfinance installed.
+    if close_prices is None:
+        from data_processing.pricing import get_close_prices
+        close_prices = get_close_prices(CATEGORY_A_CRYPTO, '1d')
+    return reprice(data, {ticker: close_prices[ticker] for ticker in CATEGORY_A_CRYPTO}, rounding=rounding)
+
+
+def inject_last_close_security_prices(data, close_prices=None):
+    securities_df = data["securities_df"]
+    if close_prices is None:
+        from data_processing.pricing import get_last_close_prices
+        close_prices = get_last_close_prices([ticker for ticker in securities_df.index if ticker in LIQUID_SECURITIES])
+    for ticker_name in securities_df.index:
+        if ticker_name in LIQUID_SECURITIES:
+            close_price = close_prices[ticker_name]
+            quantity = securities_df.get(ticker_name, 'Quantity')
+            if quantity > 0:  # Blank (NaN) and zero quantities keep their estimated value
+                estimated_value = round(close_price * quantity)/1000000.0
+                securities_df.set(ticker_name, 'Estimated Value', estimated_value)
+            securities_df.set(ticker_name, 'Current Price', close_price)
+
+    # The total of the 'Estimated Value' column becomes Alameda's 'Liquid Securities'
+    total_estimated_value = securities_df.column_sum('Estimated Value')
+    data["assets_df"].set('Liquid Securities', 'Alameda', total_estimated_value)
+    return data
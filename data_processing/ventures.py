@@ -0,0 +1,112 @@
+import math
+import os
+from operator import eq, ne, lt, le, gt, ge
+import numpy as np
+import pandas as pd
+
+# Rows per page of the ventures table
+VENTURES_PAGE_SIZE = int(os.environ.get('VENTURES_PAGE_SIZE', 25))
+
+# DataTable filter_query operators, longest spelling first so '>=' is not read as '>'
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'], ['ne ', '!='], ['eq ', '='],
+                    ['contains '], ['datestartswith ']]
+# The array operators rather than np.greater etc., whose ufuncs have no string loops before NumPy 2.0; the text
+# index is a '<U' array
+COMPARISONS = {'ge': ge, 'le': le, 'lt': lt, 'gt': gt, 'ne': ne, 'eq': eq}
+
+
+def split_filter_part(filter_part):
+    # '{Structure} contains "SA"' -> ('Structure', 'contains', 'SA'); (None, None, None) if it does not parse
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+                value_part = value_part.strip()
+                if value_part and value_part[0] == value_part[-1] and value_part[0] in ("'", '"', '`'):
+                    value = value_part[1:-1].replace('\\' + value_part[0], value_part[0])
+                else:
+                    value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def to_number(value):
+    # 1.5, '1.5' and '$1,500' are numbers; anything else is NaN
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', ''))
+    except ValueError:
+        return math.nan
+
+
+class VenturesStore:
+    """The ventures table kept server-side, so the browser only ever receives the page it shows.
+
+    Built once per workbook. Per column it keeps a numeric key (NaN where a cell is not a number, '$1,000' counts),
+    a lowercase text index for 'contains' filters and a rank for sorting, so a request is a few vectorised passes
+    over those arrays plus a slice of the records.
+    """
+
+    def __init__(self, columns, records):
+        self.columns = columns
+        self.records = records
+        self.numbers = {}
+        self.text = {}
+        self.ranks = {}
+        for col in columns:
+            values = [record[col] for record in records]
+            blank = np.array([value is None or (isinstance(value, float) and math.isnan(value)) for value in values],
+                             dtype=bool)
+            numbers = np.array([to_number(value) for value in values], dtype=np.float64)
+            text = np.array(['' if b else str(value).lower() for value, b in zip(values, blank)], dtype=str)
+            # Columns that are numbers wherever filled sort numerically, the rest alphabetically
+            if np.all(np.isnan(numbers) == blank):
+                key = numbers
+            else:
+                key = text
+            ranks = pd.Series(key).rank(method='dense').to_numpy(dtype=np.float64, copy=True)
+            # Blanks rank after everything, in both sort directions
+            ranks[blank] = np.inf
+            self.numbers[col] = numbers
+            self.text[col] = text
+            self.ranks[col] = ranks
+
+    @classmethod
+    def from_table_data(cls, table_data):
+        # From ventures_table_data's output, which the static figure artifact stores
+        return cls(table_data['columns'], table_data['records'])
+
+    def filter_mask(self, filter_query):
+        mask = np.ones(len(self.records), dtype=bool)
+        for filter_part in (filter_query or '').split(' && '):
+            name, operator, value = split_filter_part(filter_part)
+            if name not in self.ranks:
+                continue
+            if operator == 'contains':
+                mask &= np.char.find(self.text[name], str(value).lower()) >= 0
+            elif operator == 'datestartswith':
+                mask &= np.char.startswith(self.text[name], str(value).lower())
+            elif not math.isnan(to_number(value)):
+                with np.errstate(invalid='ignore'):
+                    mask &= COMPARISONS[operator](self.numbers[name], to_number(value))
+            else:
+                mask &= COMPARISONS[operator](self.text[name], str(value).lower())
+        return mask
+
+    def page(self, filter_query, sort_by, page_current, page_size=VENTURES_PAGE_SIZE):
+        """Records on page ``page_current`` after filtering and sorting, plus the number of pages."""
+        positions = np.flatnonzero(self.filter_mask(filter_query))
+        if sort_by:
+            keys = []
+            for sort in sort_by:
+                ranks = self.ranks[sort['column_id']][positions]
+                keys.append(np.where(np.isinf(ranks), np.inf, -ranks) if sort['direction'] == 'desc' else ranks)
+            # np.lexsort sorts by the last key first
+            positions = positions[np.lexsort(keys[::-1])]
+
+        page_size = page_size or VENTURES_PAGE_SIZE
+        start = (page_current or 0) * page_size
+        page_count = max(math.ceil(len(positions) / page_size), 1)
+        return [self.records[i] for i in positions[start:start + page_size]], page_count
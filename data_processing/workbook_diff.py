@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Numeric cells closer than this count as unchanged, so float noise from Excel is not reported
+DIFF_TOLERANCE = 1e-9
+
+DIFF_COLUMNS = ['sheet', 'row', 'column', 'old', 'new', 'change']
+
+
+def occurrence_index(df):
+    # (label, n) for the n-th row with that label, so sheets with repeated labels align row by row
+    labels = pd.Series(df.index.to_numpy(dtype=object)).fillna('')
+    return pd.MultiIndex.from_arrays([labels, labels.groupby(labels).cumcount()])
+
+
+def diff_sheet(old, new, tolerance=DIFF_TOLERANCE):
+    """Cells of one sheet that differ between two versions, as a DataFrame with DIFF_COLUMNS less 'sheet'.
+
+    Both sheets are aligned on row label and column, and compared as whole matrices: numeric columns with a
+    tolerance, the rest by value, blanks equal to blanks. Rows or columns only in one version show up as cells
+    'added' or 'removed'.
+    """
+    old, new = old.copy(), new.copy()
+    old.index, new.index = occurrence_index(old), occurrence_index(new)
+    rows = old.index.union(new.index, sort=False)
+    columns = old.columns.union(new.columns, sort=False)
+    old_aligned = old.reindex(index=rows, columns=columns)
+    new_aligned = new.reindex(index=rows, columns=columns)
+
+    old_values = old_aligned.to_numpy(dtype=object)
+    new_values = new_aligned.to_numpy(dtype=object)
+    old_blank = pd.isna(old_aligned).to_numpy()
+    new_blank = pd.isna(new_aligned).to_numpy()
+
+    changed = np.zeros(old_values.shape, dtype=bool)
+    numeric = np.array([pd.api.types.is_numeric_dtype(old_aligned[col]) and pd.api.types.is_numeric_dtype(new_aligned[col])
+                        for col in columns], dtype=bool)
+    if numeric.any():
+        a = old_aligned.loc[:, numeric].to_numpy(dtype=np.float64)
+        b = new_aligned.loc[:, numeric].to_numpy(dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            changed[:, numeric] = ~(np.isclose(a, b, rtol=0, atol=tolerance) | (np.isnan(a) & np.isnan(b)))
+    if (~numeric).any():
+        a, b = old_values[:, ~numeric], new_values[:, ~numeric]
+        same = (a == b) | (old_blank[:, ~numeric] & new_blank[:, ~numeric])
+        changed[:, ~numeric] = ~same.astype(bool)
+
+    row_positions, col_positions = np.nonzero(changed)
+    in_old = rows.isin(old.index)[row_positions] & columns.isin(old.columns)[col_positions]
+    in_new = rows.isin(new.index)[row_positions] & columns.isin(new.columns)[col_positions]
+    change = np.where(~in_old, 'added', np.where(~in_new, 'removed', 'changed'))
+    return pd.DataFrame({
+        'row': rows.get_level_values(0)[row_positions],
+        'column': columns[col_positions],
+        'old': np.where(in_old, old_values[row_positions, col_positions], None),
+        'new': np.where(in_new, new_values[row_positions, col_positions], None),
+        'change': change,
+    })
+
+
+def diff_workbooks(old_frames, new_frames, tolerance=DIFF_TOLERANCE):
+    """Cell-level differences between two versions' DataFrames (as load_data returns them), one row per cell."""
+    diffs = []
+    for key in list(old_frames) + [key for key in new_frames if key not in old_frames]:
+        old = old_frames.get(key, pd.DataFrame())
+        new = new_frames.get(key, pd.DataFrame())
+        sheet = diff_sheet(old, new, tolerance)
+        sheet.insert(0, 'sheet', key)
+        diffs.append(sheet)
+    return pd.concat(diffs, ignore_index=True) if diffs else pd.DataFrame(columns=DIFF_COLUMNS)
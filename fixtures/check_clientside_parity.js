@@ -0,0 +1,50 @@
+// Runs every case of the shared parity fixture through assets/scenarios.js and compares with the Python results.
+// Usage: node fixtures/check_clientside_parity.js fixtures/clientside_parity.json
+// (python -m data_processing.clientside checks the Python side first and then runs this.)
+var fs = require('fs');
+var path = require('path');
+var scenarios = require(path.join(__dirname, '..', 'assets', 'scenarios.js'));
+
+var fixture = JSON.parse(fs.readFileSync(process.argv[2] || path.join(__dirname, 'clientside_parity.json'), 'utf8'));
+var failures = [];
+
+function same(a, b) {
+    return (isNaN(a) && isNaN(b)) || a === b;
+}
+
+function compare(label, actual, expected) {
+    if (!same(actual, expected)) failures.push(label + ': ' + actual + ' != ' + expected);
+}
+
+fixture.cases.forEach(function (testCase) {
+    var name = testCase.bundle + ' [' + testCase.selected.join(', ') + ']';
+    var outputs = scenarios.exchangeOutputs(scenarios.evaluate(fixture.bundles[testCase.bundle], testCase.selected));
+    var expected = testCase.expected;
+
+    Object.keys(expected.recovery_rates).forEach(function (exchange) {
+        compare(name + ' ' + exchange + ' recovery rate', outputs.recovery_rates[exchange], expected.recovery_rates[exchange]);
+
+        ['assets', 'liabilities'].forEach(function (category) {
+            var items = outputs.exchanges[exchange][category];
+            var expectedItems = Object.keys(expected.exchanges[exchange][category]);
+            compare(name + ' ' + exchange + ' ' + category,
+                    items.map(function (item) { return item[0]; }).join(', '), expectedItems.join(', '));
+            items.forEach(function (item) {
+                compare(name + ' ' + exchange + ' ' + item[0], item[1], expected.exchanges[exchange][category][item[0]]);
+            });
+        });
+
+        var pie = outputs.pies[exchange];
+        compare(name + ' ' + exchange + ' pie labels', pie.labels.join(', '), expected.pies[exchange].labels.join(', '));
+        pie.values.forEach(function (value, i) {
+            compare(name + ' ' + exchange + ' pie ' + pie.labels[i], value, expected.pies[exchange].values[i]);
+        });
+    });
+});
+
+if (failures.length) {
+    console.log(failures.slice(0, 20).join('\n'));
+    console.log(failures.length + ' mismatches');
+    process.exit(1);
+}
+console.log('JS matches ' + fixture.cases.length + ' cases');
@@ -0,0 +1,72 @@
+import gc
+import os
+import resource
+
+# Production entry point: `gunicorn -c gunicorn.conf.py main:server`
+#
+# main.py is imported once in the master. The dataset, the baseline figures and (with SCENARIO_WARMUP) the scenario
+# cache are built there and the workers are forked afterwards, so they share those pages copy-on-write instead of
+# each re-importing main.py. The scenario ledgers wrap the memory-mapped workbook snapshot, so their matrices stay
+# in the shared page cache regardless.
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+# Precompute every recovery toggle combination in the master unless told otherwise
+os.environ.setdefault('SCENARIO_WARMUP', '1')
+
+
+def memory_usage():
+    """Resident, proportional and private memory of this process in MB.
+
+    PSS splits shared pages between the processes mapping them, so summing it over the master and workers gives the
+    real footprint. Private memory is what each extra worker costs.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                    usage[key] = int(value.split()[0]) / 1024
+    except FileNotFoundError:
+        # Not Linux: fall back to peak RSS (KB on Linux, bytes on macOS)
+        usage['Rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    usage['Private'] = usage.pop('Private_Clean', 0) + usage.pop('Private_Dirty', 0)
+    return usage
+
+
+def format_memory(usage):
+    return ' '.join(f'{key.lower()}={value:.1f}MB' for key, value in usage.items())
+
+
+def when_ready(server):
+    server.log.info('master %s memory: %s', os.getpid(), format_memory(memory_usage()))
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's reach, so GC passes in the workers do not touch
+    # (and therefore copy) the preloaded objects
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    worker.log.info('worker %s memory: %s', worker.pid, format_memory(memory_usage()))
+
+    # Price fetching runs on a thread in each worker, never inside a request
+    from data_processing.price_refresher import price_refresher
+    price_refresher.ensure_started()
+
+    # Likewise the workbook watcher, so a worker picks up a new workbook before its first request
+    import main
+    main.registry.ensure_started()
+
+    # The sampler thread started in the master does not survive the fork; PROFILER=1 gives each worker its own
+    from data_processing.profiler import start_profiler
+    start_profiler()
+
+
+def worker_exit(server, worker):
+    server.log.info('worker %s memory at exit: %s', worker.pid, format_memory(memory_usage()))
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Response, request
+from plotly.io.json import to_json_plotly
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Preferred first. brotli is in requirements.txt; without it installed only gzip is offered
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/css', 'text/plain', 'application/javascript',
+                          'text/javascript', 'image/svg+xml'}
+
+
+def negotiate(accept_encodings):
+    # Best encoding the client accepts, or 'identity'
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+def encode(body, encoding, gzip_level=6, brotli_quality=5):
+    if encoding == 'br':
+        return brotli.compress(body, quality=brotli_quality)
+    if encoding == 'gzip':
+        return gzip.compress(body, gzip_level)
+    return body
+
+
+def content_etag(body, encoding='identity'):
+    # Strong ETag per representation: the gzip and brotli bodies of the same content are different bytes
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return digest if encoding == 'identity' else f'{digest}-{encoding}'
+
+
+def not_modified(etag, weak=False):
+    response = Response(status=304)
+    response.set_etag(etag, weak)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+class PrecompressedResponse:
+    """A fixed body encoded once per content encoding at the highest levels, served with content-hash ETags."""
+
+    def __init__(self, body, mimetype='application/json'):
+        self.mimetype = mimetype
+        self.encoded = {encoding: encode(body, encoding, gzip_level=9, brotli_quality=11)
+                        for encoding in ['identity'] + ENCODINGS}
+        self.etags = {encoding: content_etag(body, encoding) for encoding in self.encoded}
+
+    def respond(self):
+        encoding = negotiate(request.accept_encodings)
+        if self.etags[encoding] in request.if_none_match:
+            return not_modified(self.etags[encoding])
+        response = Response(self.encoded[encoding], mimetype=self.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(self.etags[encoding])
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'no-cache'  # Revalidate with the ETag rather than trust a stale copy
+        return response
+
+
+class PrecompressedLayout:
+    """Serves ``app``'s layout from bytes serialised and compressed once, instead of on every page load.
+
+    Only for a fixed layout, not a layout function. ``refresh`` re-serialises it after ``app.layout`` is replaced;
+    requests already being served keep the response they picked up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.response = None
+        path = app.config.routes_pathname_prefix + '_dash-layout'
+
+        @app.server.before_request
+        def serve_precompressed_layout():
+            if request.path == path and request.method == 'GET':
+                return self.response.respond()
+
+    def refresh(self):
+        # _layout_value is what Dash's own _dash-layout route serialises; the public get_layout is not in the pinned
+        # dash==2.11.1
+        self.response = PrecompressedResponse(to_json_plotly(self.app._layout_value()).encode())
+        return self.response
+
+
+def precompress_layout(app):
+    layout = PrecompressedLayout(app)
+    layout.refresh()
+    return layout
+
+
+class ResponseCompressor:
+    """Compress Flask responses on the way out and tag GET responses with content-hash ETags.
+
+    Callback outputs here are deterministic: the same toggles give byte-identical JSON. Encoded bodies are kept in a
+    small LRU keyed by a hash of the body, so an identical scenario response is compressed only once. Revalidation
+    only applies to GET and HEAD (the layout, static files and /api): those get the hash as their ETag and a 304 when
+    If-None-Match has it. Dash sends callbacks as POSTs to /_dash-update-component, which HTTP caches never
+    revalidate, so they get no ETag, and a 412 if they come with a matching If-None-Match. Responses under
+    ``min_size`` bytes, non-text types and responses that are already encoded go out untouched.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, cache_size=256):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, server):
+        server.after_request(self.process)
+        return self
+
+    def _encoded(self, body, encoding):
+        key = (content_etag(body), encoding)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        encoded = encode(body, encoding, self.gzip_level, self.brotli_quality)
+        with self._lock:
+            self._cache[key] = encoded
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return encoded
+
+    def process(self, response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or (response.is_streamed and not response.direct_passthrough):
+            return response
+        # Static files come as file wrappers; read them so they can be compressed too
+        response.direct_passthrough = False
+        body = response.get_data()
+        response.vary.add('Accept-Encoding')
+
+        encoding = negotiate(request.accept_encodings) if len(body) >= self.min_size else 'identity'
+        if request.method in ('GET', 'HEAD'):
+            # Files Flask sends already carry an ETag for their identity body; an encoded body gets that ETag
+            # suffixed with the encoding, as content_etag does, so caches never mix the two representations
+            etag, weak = response.get_etag()
+            if etag is None:
+                etag, weak = content_etag(body, encoding), False
+            elif encoding != 'identity':
+                etag = f'{etag}-{encoding}'
+            if etag in request.if_none_match:
+                return not_modified(etag, weak)
+            response.set_etag(etag, weak)
+        elif content_etag(body, encoding) in request.if_none_match:
+            # A failed If-None-Match on a method other than GET or HEAD is 412, not 304 (RFC 9110, 13.1.2)
+            return Response(status=412)
+        if encoding != 'identity':
+            response.set_data(self._encoded(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def compress_responses(server, **kwargs):
+    """Attach a ResponseCompressor to ``server``; keyword arguments go to its constructor."""
+    return ResponseCompressor(**kwargs).init_app(server)
@@ -1,8 +1,13 @@
 from dash import html, dcc
 import dash_bootstrap_components as dbc
+from components.visualizations import create_diff_table
+from data_processing.workbook_diff import DIFF_COLUMNS
 
 
-def create_layout(visualizations):
+def create_layout(visualizations, sweep_parameters=(), versions=(), sweep_refresh=False):
+    # ``sweep_parameters`` is [(parameter, label)] for the sensitivity dropdowns, ``versions`` [(fingerprint, label)]
+    # of the workbook versions to compare against, the one being served first. ``sweep_refresh`` adds a button that
+    # recomputes the sensitivity panel for the toggles on screen, for when the toggles themselves do not.
     silo_cols = [dbc.Col(graph) for graph in visualizations.get("silo_graphs")]
     exchange_cols = [dbc.Col(graph) for graph in visualizations.get("exchange_graphs")]
     exchange_pie_chart_cols = [dbc.Col(graph) for graph in visualizations.get("exchange_pie_charts")]
@@ -99,9 +104,47 @@ def create_layout(visualizations):
                             value=[],
                             className="my-checklist",  # Add this
                         ),
+                        html.Small(id='price-snapshot-status', style={'color': 'gray'}),
                     ], style={'marginTop': '45px', 'marginLeft': '30px'}),
                 ], style={'display': 'flex', 'overflow': 'auto'}),  # use flex display and allow horizontal scrolling
-                dbc.Row(html.Div([exchange_pie_chart_cols[0], exchange_pie_chart_cols[1]], style={'width': '1100px', 'marginTop': '10px'}),)
+                dbc.Row(html.Div([exchange_pie_chart_cols[0], exchange_pie_chart_cols[1]], style={'width': '1100px', 'marginTop': '10px'}),),
+                html.Br(),
+                html.H3([html.P("Recovery Sensitivity")]),
+                html.P("Sweep one or two inputs across a range to see how the recovery rate responds, under the "
+                       "toggles selected above. Prices revalue every holding of the token, the Alameda recovery "
+                       "rate is what FTX receives on its claim against Alameda, and a haircut writes off that share "
+                       "of the exchange's line item. The chart on the right ranks the inputs by how far they move "
+                       "the recovery rate."),
+                html.Div([
+                    dcc.Dropdown(id='sweep-x', options=[{'label': label, 'value': name} for name, label in sweep_parameters],
+                                 value='price:FTT', clearable=False, style={'width': '300px', 'color': 'black'}),
+                    dcc.Dropdown(id='sweep-y', options=[{'label': label, 'value': name} for name, label in sweep_parameters],
+                                 value='haircut:Venture Investments', placeholder="Second input (optional)",
+                                 style={'width': '300px', 'color': 'black', 'marginLeft': '20px'}),
+                    dcc.RadioItems(id='sweep-exchange', options=[{'label': 'FTX.COM', 'value': 'ftx_intl'},
+                                                                 {'label': 'FTX.US', 'value': 'ftx_us'}],
+                                   value='ftx_intl', inline=True, style={'marginLeft': '20px'}),
+                ] + ([html.Button("Update for selected toggles", id='sweep-refresh', n_clicks=0,
+                                  style={'marginLeft': '20px'})] if sweep_refresh else []),
+                    style={'display': 'flex', 'alignItems': 'center'}),
+                html.Div([
+                    dcc.Graph(id='sweep-graph'),
+                    dcc.Graph(id='tornado-graph'),
+                ], style={'display': 'flex', 'overflow': 'auto', 'marginTop': '10px'}),
+                html.Br(),
+                html.H3([html.P("Recovery Over Time")]),
+                html.P("Recovery rate on every day since the petition date with the Category A tokens at that day's "
+                       "close, under the recovery toggles selected above. Every other holding stays at its petition "
+                       "date value."),
+                dcc.Graph(id='recovery-history-graph'),
+                html.Br(),
+                html.H3([html.P("Compare Reports")]),
+                html.P("Every cell that differs between the report shown above and an earlier version of it."),
+                dcc.Dropdown(id='compare-version',
+                             options=[{'label': label, 'value': fingerprint} for fingerprint, label in versions[1:]],
+                             placeholder="Earlier version", style={'width': '500px', 'color': 'black'}),
+                html.Small(id='version-diff-summary', style={'color': 'gray'}),
+                html.Div(create_diff_table(DIFF_COLUMNS), style={'marginTop': '10px'}),
             ], style={'padding': '10px'}),
         ]),
     ], style={'fontFamily': 'Inter', 'padding': '0px'})
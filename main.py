@@ -1,332 +1,130 @@
-from dash import dash, Output, Input, exceptions, dcc, html, State
-from data_processing.data import load_data, get_close_price
-from components.visualizations import create_visualizations, create_exchange_graph, calculate_recovery_rate, \
-    create_exchange_crypto_pie_chart, CATEGORY_B_ASSETS
+from dash import dash, Output, Input, exceptions, dcc, html, State, ClientsideFunction
+from data_processing.data import load_petition_prices
+from data_processing.scenarios import ScenarioEngine, SCENARIO_SHEETS, RECOVERY_TOGGLES, all_scenarios
+from data_processing.scenario_cache import ScenarioCache, scenario_key, cache_namespace
+from data_processing.price_refresher import price_refresher, describe_snapshot
+from data_processing.simulation import RecoveryModel, simulate, summarise, SIMULATION_DRAWS, SIMULATION_SEED, \
+    DEFAULT_ASSUMPTIONS
+from data_processing.clientside import CLIENTSIDE_SCENARIOS, scenario_bundle
+from data_processing.sensitivity import Sweep, MAX_GRID_STEPS, describe_parameter
+from data_processing.ventures import VenturesStore
+from data_processing.recovery_history import update_recovery_history
+from data_processing.registry import DatasetRegistry
+from data_processing.workbook_diff import diff_workbooks
+from data_processing.metrics import metrics, span, instrument_callback, start_request_spans, server_timing
+from data_processing.profiler import start_profiler
+from data_processing.recovery import calculate_recovery_rate
+from components.visualizations import create_exchange_graph, \
+    create_exchange_crypto_pie_chart, patch_figure, create_sweep_graph, create_tornado_chart, \
+    create_recovery_history_graph
+from components.visualizations import visualizations_from_figures
+from components.static_figures import load_static_figures
 from layouts.layout import create_layout
-import pandas as pd
-import yfinance as yf
+from layouts.compression import precompress_layout, compress_responses
+from flask import jsonify, request, Response, g
 import json
-from datetime import datetime, timedelta
+import numpy as np
+import os
+from plotly.utils import PlotlyJSONEncoder
+
+# '1' precomputes every recovery toggle combination at boot, 'all' also covers the price toggles
+SCENARIO_WARMUP = os.environ.get('SCENARIO_WARMUP', '')
+# Response compression: COMPRESSION=0 turns it off (the layout stays precompressed); bodies under
+# COMPRESSION_MIN_SIZE bytes go out as they are
+COMPRESSION = os.environ.get('COMPRESSION', '1') != '0'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# Points per axis of the sensitivity panel
+SWEEP_STEPS = 100
+EXCHANGE_NAMES = {'ftx_intl': 'FTX.COM', 'ftx_us': 'FTX.US'}
+# SERVER_TIMING=1 adds the callback spans of each request as a Server-Timing header, for the browser's dev tools
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+start_profiler()
+
+petition_prices = load_petition_prices()
+# Latest closes already in the price cache; the refresher thread keeps them current once the server is up
+price_refresher.load_cached()
+
+
+class Dataset:
+    """Everything the callbacks derive from one workbook version, built once per version by the registry."""
+
+    def __init__(self, version):
+        self.version = version
+        # Startup figures come pre-rendered from the snapshot directory; the workbook is only read to render them
+        static_figures = load_static_figures(version.fingerprint, version.dataframes,
+                                             keep=[other.fingerprint for other in registry.versions()])
+        self.visualizations = visualizations_from_figures(static_figures)
+        self.ventures_store = VenturesStore.from_table_data(static_figures['ventures_table'])
+        # Workbook stays server-side; callbacks only receive toggles
+        self.engine = ScenarioEngine(version.ledgers(SCENARIO_SHEETS))
+        self.cache = ScenarioCache(cache_namespace(version.fingerprint, DEFAULT_ASSUMPTIONS, SWEEP_STEPS),
+                                   encoder=PlotlyJSONEncoder)
+        # Extended by any days the price history gained since the last boot; fetching those is the batch job's
+        # work (python -m data_processing.recovery_history), never the server's
+        self.recovery_history = update_recovery_history(self.engine, version.fingerprint, petition_prices)
+        self.sweep_parameters = [(name, describe_parameter(name))
+                                 for name in Sweep(self.engine, [], reference_prices=petition_prices).parameters()]
+
+
+# Every version of the workbook seen so far. The watcher thread swaps in a new one when the file changes, without
+# a restart; callbacks take the current one once per request with current().
+registry = DatasetRegistry(Dataset)
+registry.load()
+
+
+def current():
+    return registry.current_state()
 
-dataframes = load_data()
-dataframes_json = {k: v.to_dict(orient='split') for k, v in dataframes.items()}  # Convert to JSON serializable format
-visualizations = create_visualizations(dataframes)
 
 app = dash.Dash(__name__, external_stylesheets=['https://fonts.googleapis.com/css2?family=Inter&display=swap', 'https://codepen.io/chriddyp/pen/bWLwgP.css'])
 server = app.server
-app.layout = html.Div([
-    dcc.Store(id='data-store', data=dataframes_json), # Store data in dcc.Store
-    dcc.Store(id='recovery-rate-store', data={}),
-    dcc.Store(id='hidden-div-checkboxes', storage_type='session'),
-    create_layout(visualizations)  # Call your create_visualizations function here
-])
-# app.config.suppress_callback_exceptions = True
-
-def zero_out_sam_coins(data):
-    sam_coins = ["Crypto - Category B"] + CATEGORY_B_ASSETS
-
-    for key in data:
-        if 'index' in data[key] and 'data' in data[key]:
-            indices = data[key]['index']
-            for coin in sam_coins:
-                if coin in indices:
-                    index = indices.index(coin)
-                    data[key]['data'][index] = [0]*len(data[key]['data'][index])
-    return data
-
-def add_cash_to_stablecoin(data, exchange, columns, target_column='Located Assets', recovery_rate=1.0):
-    cash_df = data["cash_df"]
-
-    # Get the indices of the columns
-    column_indices = [cash_df['columns'].index(column) for column in columns]
-
-    # Sum up all values in the specified columns
-    total_cash = sum(sum(row[i] for i in column_indices) for row in cash_df['data'])
-
-    # Get the index of Cash / Stablecoin in ftx_intl_crypto_df
-    cash_stablecoin_index = data[exchange]['index'].index('Cash / Stablecoin')
-
-    # Get the column index of 'Located Assets'
-    target_column_index = data[exchange]['columns'].index(target_column)
-
-    # Add total_cash to Cash / Stablecoin values in the 'Located Assets' column in ftx_intl_crypto_df
-    data[exchange]['data'][cash_stablecoin_index][target_column_index] += round(total_cash*recovery_rate)
-
-    return data
-
-def add_alameda_crypto_assets(data, recovery_rate=1.0):
-    # Get the indices of 'Stablecoin', 'BTC', 'SOL & APT', 'All Other - Category A' in alameda_df
-    indices_alameda = ['Stablecoin', 'BTC', 'SOL', 'APT', 'All Other - Category A']
-    indices_alameda = [data['alameda_df']['index'].index(x) for x in indices_alameda]
-
-    # Get the index of 'Located Assets' in alameda_df
-    located_assets_index = data['alameda_df']['columns'].index('Located Assets')
-
-    # Get 'Located Assets' values for the selected indices
-    values_alameda = [data['alameda_df']['data'][i][located_assets_index] for i in indices_alameda]
-
-    # Add 'Stablecoin' value from alameda_df to 'Cash / Stablecoin' in ftx_international_crypto_df
-    cash_stablecoin_index = data['ftx_intl_crypto_df']['index'].index('Cash / Stablecoin')
-    cash_stablecoin_data_index = data['ftx_intl_crypto_df']['columns'].index('Located Assets')
-    data['ftx_intl_crypto_df']['data'][cash_stablecoin_index][cash_stablecoin_data_index] += round(values_alameda[0]*recovery_rate)
-
-    # Add crypto assets value from alameda_df to 'Crypto - Category A' in ftx_international_crypto_df
-    cash_stablecoin_index = data['ftx_intl_crypto_df']['index'].index('Crypto - Category A')
-    cash_stablecoin_data_index = data['ftx_intl_crypto_df']['columns'].index('Located Assets')
-    for value in values_alameda[1:]:
-        data['ftx_intl_crypto_df']['data'][cash_stablecoin_index][cash_stablecoin_data_index] += round(value*recovery_rate)
-
-    # Add the selected indices and values to ftx_international_crypto_df
-    for i in range(len(indices_alameda)):
-        index_alameda = data['alameda_df']['index'][indices_alameda[i]]
-        if index_alameda in data['ftx_intl_crypto_df']['index']:
-            # If index exists, add the value to the corresponding row
-            index_ftx = data['ftx_intl_crypto_df']['index'].index(index_alameda)
-            data['ftx_intl_crypto_df']['data'][index_ftx][cash_stablecoin_data_index] += values_alameda[i]
-        else:
-            # If index does not exist, add a new row with the value
-            data['ftx_intl_crypto_df']['index'].append(index_alameda)
-            data['ftx_intl_crypto_df']['data'].append([0, values_alameda[i], 0, 0, 0])
-    return data
-
-def subcon_non_crypto(data, silos, exchange, indices, recovery_rate=1.0):
-    # Get the indices of 'Alameda' and 'Ventures' in assets_df
-    column_indices_assets = [data['assets_df']['columns'].index(x) for x in silos]
-
-    # For each index, get the values for 'Alameda' and 'Ventures', sum them up,
-    # and add to ftx_intl_crypto_df
-    for index in indices:
-        # Get the index of the current index in assets_df
-        index_assets = data['assets_df']['index'].index(index)
-
-        # Get the values for 'Alameda' and 'Ventures'
-        index_values = [data['assets_df']['data'][index_assets][i] for i in column_indices_assets]
-
-        # Sum up the values
-        index_values_sum = round(sum(index_values)*recovery_rate)
-
-        # If the current index exists in ftx_intl_crypto_df, add the sum to it
-        # Else, create a new entry for the current index
-        if index in data[exchange]['index']:
-            index_ftx = data[exchange]['index'].index(index)
-            data[exchange]['data'][index_ftx][1] += index_values_sum
-        else:
-            data[exchange]['index'].append(index)
-            data[exchange]['data'].append([0, index_values_sum, 0, 0, 0])
-
-    return data
-
-def  subcon_alameda_dotcom_ventures(data):
-
-    # Add Cash to FTX International Cash / Stablecoin column
-    data = add_cash_to_stablecoin(data, 'ftx_intl_crypto_df', ["Alameda", "Ventures"])
-
-    # Add Alameda assets to FTX International crypto DF
-    data = add_alameda_crypto_assets(data)
-
-    # Add Venture investments
-    indices = ['Venture Investments', 'Liquid Securities', 'Clawbacks']
-    data = subcon_non_crypto(data, ['Alameda', 'Ventures'], "ftx_intl_crypto_df", indices)
-
-    # Zero 'Estimated Receivables' in ftx_international_related_party_df
-    est_receivables_index_in_related_party_df = data['ftx_international_related_party_df']['columns'].index('Estimated Receivables')
-    for row in data['ftx_international_related_party_df']['data']:
-        row[est_receivables_index_in_related_party_df] = 0
-
-    # Zero 'Estimated Payables' in ftx_international_related_party_df
-    est_payables_index_in_related_party_df = data['ftx_international_related_party_df']['columns'].index(
-        'Estimated Payables')
-    for row in data['ftx_international_related_party_df']['data']:
-        row[est_payables_index_in_related_party_df] = 0
-
-    return data
-
-def calc_alameda_recovery(data):
-    alameda_asset_index = data["assets_df"]['columns'].index('Alameda')
-    alameda_liabs_index = data["liabilities_df"]['columns'].index('Alameda')
-    total_alameda_assets = sum(row[alameda_asset_index] for row in data["assets_df"]['data'])
-    total_alameda_liabs = sum(row[alameda_liabs_index] for row in data["liabilities_df"]['data'])
-    alameda_recovery = total_alameda_assets / total_alameda_liabs
-    return alameda_recovery
-
-def claim_alameda(data):
-    alameda_recovery_rate = calc_alameda_recovery(data)
-
-    # Add Cash to FTX International Cash / Stablecoin column
-    data = add_cash_to_stablecoin(data, 'ftx_intl_crypto_df', ["Alameda"], recovery_rate=alameda_recovery_rate)
-
-    # Add Alameda assets to FTX International crypto DF
-    data = add_alameda_crypto_assets(data, alameda_recovery_rate)
-
-    # Add Venture investments
-    indices = ['Venture Investments', 'Liquid Securities', 'Clawbacks']
-    data = subcon_non_crypto(data, ["Alameda"], "ftx_intl_crypto_df", indices, alameda_recovery_rate)
-
-    # Zero 'Estimated Receivables' in ftx_international_related_party_df
-    est_receivables_index_in_related_party_df = data['ftx_international_related_party_df']['columns'].index('Estimated Receivables')
-    for row in data['ftx_international_related_party_df']['data']:
-        row[est_receivables_index_in_related_party_df] = 0
-
-    # Zero 'Estimated Payables' in ftx_international_related_party_df
-    est_payables_index_in_related_party_df = data['ftx_international_related_party_df']['columns'].index(
-        'Estimated Payables')
-    for row in data['ftx_international_related_party_df']['data']:
-        row[est_payables_index_in_related_party_df] = 0
-
-    # Net 'Estimated Payables' in ftx_us_related_party_df
-    est_payables_col_index_us = data['ftx_us_related_party_df']['columns'].index(
-        'Estimated Payables')
-    est_receivables_col_index_us = data['ftx_us_related_party_df']['columns'].index(
-        'Estimated Receivables')
-    est_payables_alameda_index_us = data['ftx_us_related_party_df']['index'].index(
-        'Alameda Research LLC')
-    data['ftx_us_related_party_df']['data'][est_payables_alameda_index_us][est_payables_col_index_us] = data['ftx_us_related_party_df']['data'][est_payables_alameda_index_us][est_payables_col_index_us] - \
-                                                                                                            data['ftx_us_related_party_df']['data'][est_payables_alameda_index_us][est_receivables_col_index_us]
-    data['ftx_us_related_party_df']['data'][est_payables_alameda_index_us][est_receivables_col_index_us] = 0
-
-    return data
-
-def subcon_wrs(data):
-
-    # Add Cash to FTX International Cash / Stablecoin column
-    data = add_cash_to_stablecoin(data, "ftx_us_crypto_df", ["WRS"])
-
-    # Add Assets
-    indices = ['Related Party Receivables', 'Subsidiary Sales']
-    data = subcon_non_crypto(data, ["WRS"], "ftx_us_crypto_df", indices)
-
-    # est_payables_index_in_related_party_df = data['ftx_us_related_party_df']['columns'].index(
-    #     'Estimated Payables')
-    # for row in data['ftx_us_related_party_df']['data']:
-    #     row[est_payables_index_in_related_party_df] = 0
-
-    return data
-
-
-def adjust_category_a(df):
-    sum_indices = ['BTC', 'ETH', 'SOL', 'XRP', 'BNB', 'MATIC', 'TRX', 'All Other - Category A',
-               'DOGE', 'LINK', 'SHIB', 'UNI', 'ALGO', 'PAXG', 'ETHW', 'WETH', 'APT']
-    total_assets = 0
-    for idx in sum_indices:
-        try:
-            index_pos = df['index'].index(idx)
-            total_assets += df['data'][index_pos][1]  # Add the 'Located Assets' value
-        except ValueError:
-            continue  # Skip if the index doesn't exist in the dataframe
 
-    try:
-        category_a_idx = df['index'].index('Crypto - Category A')
-        df['data'][category_a_idx][1] = total_assets  # Update the 'Located Assets' value for 'Crypto - Category A'
-    except ValueError:
-        print("Index 'Crypto - Category A' not found!")
 
-def update_prices(df_as_dict, ticker, close_price):
-    # Find the index of the current ticker in the dataframe's 'index' list
-    try:
-        ticker_idx = df_as_dict['index'].index(ticker)
-    except ValueError:
-        print(f"Ticker {ticker} not found!")
-        return
+def build_layout(dataset):
+    return html.Div([
+        dcc.Store(id='recovery-rate-store', data={}),
+        dcc.Store(id='hidden-div-checkboxes', storage_type='session'),
+        # Scenario key of the figures on screen, so the next scenario can be sent as a patch against them. The
+        # page load callback sends full figures.
+        dcc.Store(id='displayed-scenario'),
+        # Priced sheets and recovery toggle ops for the clientside callbacks (CLIENTSIDE_SCENARIOS=1)
+        dcc.Store(id='scenario-bundle'),
+        create_layout(dataset.visualizations, dataset.sweep_parameters,
+                      [(version.fingerprint, version.label) for version in registry.versions()],
+                      sweep_refresh=CLIENTSIDE_SCENARIOS),
+    ])
 
-    # Calculate the "Located Assets" value
-    quantity = df_as_dict['data'][ticker_idx][6]  # The "Quantity" column is at index 6
-    located_assets = round((close_price * quantity)/1000000.0)
 
-    # Update the "Located Assets" column in the dictionary for the current ticker
-    df_as_dict['data'][ticker_idx][1] = located_assets
+app.layout = build_layout(current())
+# The layout only changes when a new workbook version is swapped in, so it is serialised and compressed once per
+# version rather than on every page load. Everything else (callback outputs, the API, Dash's scripts) is compressed
+# as it goes out.
+layout_response = precompress_layout(app)
 
-def inject_last_close_crypto_prices(data):
-    category_a_crypto = ['BTC', 'ETH', 'SOL', 'XRP', 'BNB', 'MATIC', 'TRX', 'DOGE', 'APT']
-    for ticker in category_a_crypto:
-        # Get the close price for the current ticker
-        close_price = get_close_price(ticker, '1d')
 
-        # Update prices in both dataframes
-        update_prices(data["ftx_intl_crypto_df"], ticker, close_price)
-        update_prices(data["ftx_us_crypto_df"], ticker, close_price)
-        update_prices(data["alameda_df"], ticker, close_price)
-    adjust_category_a(data["ftx_intl_crypto_df"])
-    adjust_category_a(data["ftx_us_crypto_df"])
-    return data
+@registry.on_activate
+def refresh_layout(version):
+    app.layout = build_layout(version.state)
+    layout_response.refresh()
 
 
-def get_last_close_price(ticker):
-    """Fetch the last closing price for a given ticker using yfinance."""
-
-    # Calculate the date of yesterday
-    yesterday = datetime.now() - timedelta(days=1)
-    yesterday_date = yesterday.strftime("%Y-%m-%d")
-
-    # Try to read from the cache file
-    try:
-        with open('cache.json', 'r') as f:
-            cache = json.load(f)
-
-        # Check if the data for the ticker and date is in the cache
-        if ticker in cache and yesterday_date in cache[ticker]:
-            return cache[ticker][yesterday_date]
-    except (FileNotFoundError, json.JSONDecodeError):
-        # If the file doesn't exist or is not valid JSON, create an empty cache
-        cache = {}
-
-    # If data is not in cache, fetch from yfinance
-    stock = yf.Ticker(ticker)
-    hist = stock.history(period="2d")  # Requesting 2 days to ensure we get 'yesterday' in case there's any data delay.
-    close_price = hist['Close'].iloc[-1]
-
-    # Add the data to the cache and save it to the file
-    if ticker not in cache:
-        cache[ticker] = {}
-    cache[ticker][yesterday_date] = close_price
-
-    with open('cache.json', 'w') as f:
-        json.dump(cache, f)
-
-    return close_price
-
-def inject_last_close_security_prices(data):
-    tickers = ["BITW", "ETHE", "GBTC", "HOOD"]
-    securities_df = data["securities_df"]
-    for row_idx, ticker_name in enumerate(securities_df['index']):
-        if ticker_name in tickers:
-            close_price = get_last_close_price(ticker_name)
-            quantity = securities_df['data'][row_idx][2]  # 'Quantity' column value for the current row
-            if quantity:  # Check if quantity is not None
-                estimated_value = round(close_price * quantity)/1000000.0
-                # Update 'Estimated Value' column for the current row
-                securities_df['data'][row_idx][6] = estimated_value
-            # Update 'Current Price' column for the current row
-            securities_df['data'][row_idx][3] = close_price
-
-    # Calculate the total of the 'Estimated Value' column
-    total_estimated_value = sum(row[6] for row in securities_df['data'])
-    assets_df = data["assets_df"]
-    liquid_securities_idx = assets_df['index'].index('Liquid Securities')
-    # Extracting the index of 'Alameda' in assets_df columns
-    alameda_col_idx = assets_df['columns'].index('Alameda')
-    assets_df['data'][liquid_securities_idx][alameda_col_idx] = total_estimated_value
-    return data
-
+if COMPRESSION:
+    compress_responses(server, min_size=COMPRESSION_MIN_SIZE)
+# app.config.suppress_callback_exceptions = True
 
 def create_exchange_figs(new_data):
-    dotcom_crypto_df = pd.DataFrame(data=new_data["ftx_intl_crypto_df"]["data"],
-                                    index=new_data["ftx_intl_crypto_df"]["index"],
-                                    columns=new_data["ftx_intl_crypto_df"]["columns"])
-    dotcom_related_party_df = pd.DataFrame(data=new_data["ftx_international_related_party_df"]["data"],
-                                           index=new_data["ftx_international_related_party_df"]["index"],
-                                           columns=new_data["ftx_international_related_party_df"]["columns"])
-    ftx_dotcom_exchange_fig = create_exchange_graph(dotcom_crypto_df, dotcom_related_party_df)
-
-    us_crypto_df = pd.DataFrame(data=new_data["ftx_us_crypto_df"]["data"],
-                                index=new_data["ftx_us_crypto_df"]["index"],
-                                columns=new_data["ftx_us_crypto_df"]["columns"])
-    us_related_party_df = pd.DataFrame(data=new_data["ftx_us_related_party_df"]["data"],
-                                       index=new_data["ftx_us_related_party_df"]["index"],
-                                       columns=new_data["ftx_us_related_party_df"]["columns"])
-    ftx_us_exchange_fig = create_exchange_graph(us_crypto_df, us_related_party_df, "US")
-
-    ftx_intl_crypto_pie_chart = create_exchange_crypto_pie_chart(dotcom_crypto_df, "FTX.COM - Cash & Crypto")
-    ftx_us_crypto_pie_chart = create_exchange_crypto_pie_chart(us_crypto_df, "FTX.US - Cash & Crypto")
+    with span('frames'):
+        dotcom_crypto_df = new_data["ftx_intl_crypto_df"].to_frame()
+        dotcom_related_party_df = new_data["ftx_international_related_party_df"].to_frame()
+        us_crypto_df = new_data["ftx_us_crypto_df"].to_frame()
+        us_related_party_df = new_data["ftx_us_related_party_df"].to_frame()
+
+    with span('figures'):
+        ftx_dotcom_exchange_fig = create_exchange_graph(dotcom_crypto_df, dotcom_related_party_df)
+        ftx_us_exchange_fig = create_exchange_graph(us_crypto_df, us_related_party_df, "US")
+        ftx_intl_crypto_pie_chart = create_exchange_crypto_pie_chart(dotcom_crypto_df, "FTX.COM - Cash & Crypto")
+        ftx_us_crypto_pie_chart = create_exchange_crypto_pie_chart(us_crypto_df, "FTX.US - Cash & Crypto")
 
     ftx_intl_recovery_rate = calculate_recovery_rate(dotcom_crypto_df, dotcom_related_party_df)
     ftx_us_recovery_rate = calculate_recovery_rate(us_crypto_df, us_related_party_df)
@@ -337,15 +135,131 @@ def create_exchange_figs(new_data):
     return ftx_dotcom_exchange_fig, ftx_us_exchange_fig, ftx_intl_crypto_pie_chart, ftx_us_crypto_pie_chart, recovery_rates
 
 
+def snapshot_prices(pricing_items):
+    # Price toggles use the refresher's latest snapshot and are skipped until it has prices for them
+    snapshot = price_refresher.snapshot()
+    pricing_items = [item for item in pricing_items or [] if item in snapshot]
+    prices = {item: snapshot[item]['prices'] for item in pricing_items}
+    price_dates = {item: snapshot[item]['as_of'] for item in pricing_items}
+    return pricing_items, prices, price_dates
+
+
+def get_scenario(dataset, selected_items, pricing_items):
+    # Cache key plus the figures and recovery rates for a toggle combination, computed once and then served from
+    # the cache
+    with span('prices'):
+        pricing_items, prices, price_dates = snapshot_prices(pricing_items)
+    key = scenario_key(selected_items, pricing_items, price_dates)
+
+    def compute():
+        with span('transforms'):
+            data = dataset.engine.run(selected_items, pricing_items, prices)
+        return list(create_exchange_figs(data))
+
+    with span('scenario'):
+        return key, dataset.cache.get_or_compute(key, compute)
+
+
+def key_from_json(key):
+    # The key comes back from the browser with its tuples turned into lists
+    return tuple(tuple(part) if isinstance(part, list) else part for part in key)
+
+
+def get_recovery_distribution(dataset, selected_items, pricing_items):
+    # Monte Carlo recovery percentiles around petition prices (or the latest closes), cached like the figures
+    pricing_items, prices, price_dates = snapshot_prices(pricing_items)
+
+    def compute():
+        model = RecoveryModel.build(dataset.engine, selected_items, pricing_items, prices, petition_prices)
+        return summarise(simulate(model))
+
+    key = ('simulation', SIMULATION_DRAWS, SIMULATION_SEED) + scenario_key(selected_items, pricing_items, price_dates)
+    return dataset.cache.get_or_compute(key, compute)
+
+
+def get_scenario_bundle(dataset, pricing_items):
+    # Clientside mode: everything the browser needs to apply the recovery toggles for one price snapshot, including
+    # the simulated percentiles of every combination
+    snapshot_items, prices, price_dates = snapshot_prices(pricing_items)
+
+    def compute():
+        bundle = scenario_bundle(dataset.engine.run([], snapshot_items, prices))
+        bundle['distributions'] = {'|'.join(sorted(selected)): get_recovery_distribution(dataset, selected,
+                                                                                         pricing_items)
+                                   for selected, _ in all_scenarios()}
+        bundle['history'] = recovery_history_bundle(dataset.recovery_history)
+        return bundle
+
+    return dataset.cache.get_or_compute(('bundle',) + scenario_key([], snapshot_items, price_dates), compute)
+
+
+def recovery_history_bundle(recovery_history):
+    # The recovery history graph for the clientside callback: the baseline figure plus every combination's series
+    # per exchange, keyed like the distributions
+    days, rates = recovery_history.series([])
+    return {
+        'figure': create_recovery_history_graph(days, rates, EXCHANGE_NAMES.values()),
+        'series': {scenario: [[round(float(rate), 2) for rate in rates[:, i]] for i in range(len(EXCHANGE_NAMES))]
+                   for scenario, rates in zip(recovery_history.scenarios, recovery_history.rates)},
+    }
+
+
+def get_sweep(dataset, selected_items, pricing_items):
+    # Sensitivity sweeps around the scenario on screen, priced on the same snapshot
+    pricing_items, prices, _ = snapshot_prices(pricing_items)
+    return Sweep(dataset.engine, selected_items, pricing_items, prices, petition_prices)
+
+
+def get_tornado(dataset, selected_items, pricing_items):
+    # Base rate and low/high rates per parameter, {exchange: (base, [(parameter, low rate, high rate)])}; cached
+    # like the figures since it runs the scenario twice per parameter
+    pricing_items_used, _, price_dates = snapshot_prices(pricing_items)
+
+    def compute():
+        base, bars = get_sweep(dataset, selected_items, pricing_items).tornado()
+        return {name: (float(base[i]), [(parameter, float(low_rates[i]), float(high_rates[i]))
+                                        for parameter, (_, _, low_rates, high_rates) in bars.items()])
+                for i, name in enumerate(EXCHANGE_NAMES)}
+
+    return dataset.cache.get_or_compute(('tornado',) + scenario_key(selected_items, pricing_items_used, price_dates),
+                                         compute)
+
+
+def warm_up(dataset):
+    for warmup_selected, warmup_pricing in all_scenarios(include_pricing=SCENARIO_WARMUP == 'all'):
+        get_scenario(dataset, warmup_selected, warmup_pricing)
+    if CLIENTSIDE_SCENARIOS:
+        get_scenario_bundle(dataset, [])
+
+
+if SCENARIO_WARMUP:
+    warm_up(current())
+    # New versions are warmed up by the watcher thread once they are being served
+    registry.on_activate(lambda version: warm_up(version.state))
+
+
+def toggle_callback(*args, clientside=None, **kwargs):
+    # app.callback for callbacks that fire on every toggle. In clientside mode the server version is left out and
+    # the ``clientside`` port in assets/scenarios.js, if it has one with the same signature, is registered instead.
+    def register(func):
+        if not CLIENTSIDE_SCENARIOS:
+            return app.callback(*args, **kwargs)(instrument_callback(func))
+        if clientside:
+            app.clientside_callback(ClientsideFunction('scenarios', clientside), *args, **kwargs)
+        return func
+    return register
+
+
 # Callback to manage checkbox selections
-@app.callback(
+@toggle_callback(
     Output('exchange-overview-checkbox', 'value'),
     Output('hidden-div-checkboxes', 'data'),
     [
         Input('exchange-overview-checkbox', 'value'),
         Input('exchange-overview-checkbox-pricing', 'value')
     ],
-    [State('hidden-div-checkboxes', 'data')]
+    [State('hidden-div-checkboxes', 'data')],
+    clientside='update_checkboxes'
 )
 def update_checkboxes(new_values, pricing_checkbox_value, old_values):
     # Detect whether a value has just been added
@@ -362,43 +276,68 @@ def update_checkboxes(new_values, pricing_checkbox_value, old_values):
     return new_values, new_values
 
 
-@app.callback(
+@toggle_callback(
     Output('ftx_dotcom_exchange_overview_graph', 'figure'),
     Output('ftx_us_exchange_overview_graph', 'figure'),
     Output('ftx_intl_pie_chart', 'figure'),
     Output('ftx_us_pie_chart', 'figure'),
     Output('recovery-rate-store', 'data'),
+    Output('displayed-scenario', 'data'),
     [
         Input('exchange-overview-checkbox', 'value'),
         Input('exchange-overview-checkbox-pricing', 'value')
     ],
-    [Input('data-store', 'data')]
+    State('displayed-scenario', 'data')
 )
-def update_exchange_graphs(selected_items, pricing_items, data):
-    data_adj = data.copy()
-
-    if 'CATEGORY_A_UPDATE' in pricing_items:
-        # Adjust the 'data_adj' dictionary as needed
-        data_adj = inject_last_close_crypto_prices(data_adj)
-    if 'LIQUID_SEC_UPDATE' in pricing_items:
-        data_adj = inject_last_close_security_prices(data_adj)
-
-    if 'CLAIM_ALAMEDA' in selected_items:
-        data_adj = claim_alameda(data_adj)
-    if 'ZERO_SAM' in selected_items:
-        data_adj = zero_out_sam_coins(data_adj)
-    if 'SUBCON' in selected_items:
-        data_adj = subcon_alameda_dotcom_ventures(data_adj)
-    if 'SUBCON_US' in selected_items:
-        data_adj = subcon_wrs(data_adj)
+def update_exchange_graphs(selected_items, pricing_items, displayed_key):
+    price_refresher.ensure_started()
+    registry.ensure_started()
+    dataset = current()
+    key, scenario = get_scenario(dataset, selected_items, pricing_items)
+
+    # Figures on screen are still in the cache unless they were evicted or priced on an older snapshot; without
+    # them the full figures are sent
+    with span('patch'):
+        displayed = dataset.cache.get(key_from_json(displayed_key)) if displayed_key else None
+        figures = [patch_figure(displayed[i] if displayed else None, figure) for i, figure in enumerate(scenario[:4])]
+    return figures + [scenario[4], key]
+
+
+def describe_distribution(summary):
+    percentiles = summary['percentiles']
+    return (f"Simulated ({summary['draws']:,} draws): 5th {percentiles['5']:.0f}% | median {percentiles['50']:.0f}% "
+            f"| 95th {percentiles['95']:.0f}%")
+
+
+@toggle_callback(
+    Output('ftx_dotcom_recovery_distribution', 'children'),
+    Output('ftx_us_recovery_distribution', 'children'),
+    [
+        Input('exchange-overview-checkbox', 'value'),
+        Input('exchange-overview-checkbox-pricing', 'value')
+    ]
+)
+def update_recovery_distribution(selected_items, pricing_items):
+    distribution = get_recovery_distribution(current(), selected_items, pricing_items)
+    return describe_distribution(distribution['ftx_intl']), describe_distribution(distribution['ftx_us'])
 
-    return create_exchange_figs(data_adj)
 
 @app.callback(
+    Output('price-snapshot-status', 'children'),
+    Input('exchange-overview-checkbox-pricing', 'value')
+)
+@instrument_callback
+def update_price_status(pricing_items):
+    snapshot = price_refresher.snapshot()
+    labels = {'CATEGORY_A_UPDATE': 'Crypto', 'LIQUID_SEC_UPDATE': 'Securities'}
+    return [html.Div(f"{labels[item]}: {describe_snapshot(snapshot, item)}") for item in pricing_items or []]
+
+@toggle_callback(
     Output('ftx_dotcom_recovery_rate', 'children'),
     Output('ftx_us_recovery_rate', 'children'),
     Input('recovery-rate-store', 'data'),
-    State('exchange-overview-checkbox', 'value')  # Get the current state of checkbox
+    State('exchange-overview-checkbox', 'value'),  # Get the current state of checkbox
+    clientside='update_recovery_rates'
 )
 def update_recovery_rates(data, selected_items):
     if not data or data is None or (all(item not in selected_items for item in ['CLAIM_ALAMEDA', 'SUBCON', 'SUBCON_US']) and len(selected_items) <= 1):  # Add condition
@@ -420,5 +359,243 @@ def update_recovery_rates(data, selected_items):
     return f"Recovery Rate: {ftx_intl_recovery_rate}%", f"Recovery Rate: {ftx_us_recovery_rate}%"
 
 
+
+@app.callback(
+    Output('ventures-table', 'data'),
+    Output('ventures-table', 'page_count'),
+    Input('ventures-table', 'page_current'),
+    Input('ventures-table', 'page_size'),
+    Input('ventures-table', 'sort_by'),
+    Input('ventures-table', 'filter_query')
+)
+@instrument_callback
+def update_ventures_table(page_current, page_size, sort_by, filter_query):
+    return current().ventures_store.page(filter_query, sort_by, page_current, page_size)
+
+
+# The sweep and tornado need the server. In clientside mode they read the toggles as State and are recomputed from
+# the panel's button, so ticking a toggle stays in the browser.
+if CLIENTSIDE_SCENARIOS:
+    SENSITIVITY_TOGGLES = [Input('sweep-refresh', 'n_clicks'), State('exchange-overview-checkbox', 'value'),
+                           State('exchange-overview-checkbox-pricing', 'value')]
+else:
+    SENSITIVITY_TOGGLES = [Input('exchange-overview-checkbox', 'value'),
+                           Input('exchange-overview-checkbox-pricing', 'value')]
+
+
+@app.callback(
+    Output('sweep-graph', 'figure'),
+    Output('tornado-graph', 'figure'),
+    [
+        Input('sweep-x', 'value'),
+        Input('sweep-y', 'value'),
+        Input('sweep-exchange', 'value'),
+    ] + SENSITIVITY_TOGGLES
+)
+@instrument_callback
+def update_sensitivity(x_parameter, y_parameter, exchange, *toggles):
+    # The toggles come last; in clientside mode the button's click count comes before them
+    selected_items, pricing_items = toggles[-2:]
+    dataset = current()
+    sweep = get_sweep(dataset, selected_items, pricing_items)
+    if y_parameter == x_parameter:
+        y_parameter = None
+    x_values = np.linspace(*sweep.default_range(x_parameter), SWEEP_STEPS)
+    y_values = np.linspace(*sweep.default_range(y_parameter), SWEEP_STEPS) if y_parameter else None
+    i = list(EXCHANGE_NAMES).index(exchange)
+    rates = sweep.grid(x_parameter, x_values, y_parameter, y_values)[i]
+    sweep_fig = create_sweep_graph(rates, describe_parameter(x_parameter), x_values,
+                                   describe_parameter(y_parameter) if y_parameter else None, y_values,
+                                   EXCHANGE_NAMES[exchange])
+
+    base, bars = get_tornado(dataset, selected_items, pricing_items)[exchange]
+    tornado_fig = create_tornado_chart(base, [(describe_parameter(name), low, high) for name, low, high in bars],
+                                       EXCHANGE_NAMES[exchange])
+    return sweep_fig, tornado_fig
+
+
+@toggle_callback(
+    Output('recovery-history-graph', 'figure'),
+    Input('exchange-overview-checkbox', 'value')
+)
+def update_recovery_history_graph(selected_items):
+    days, rates = current().recovery_history.series([item for item in selected_items or [] if item in RECOVERY_TOGGLES])
+    return create_recovery_history_graph(days, rates, EXCHANGE_NAMES.values(), ', '.join(sorted(selected_items or [])))
+
+
+def sweep_axis(axis, sweep):
+    # (parameter, values) for one axis of /api/sweep, or (None, None) when the axis is not given
+    parameter = request.args.get(axis)
+    if not parameter:
+        return None, None
+    low, high = sweep.default_range(parameter)
+    steps = int(request.args.get(f'{axis}_steps', SWEEP_STEPS))
+    if not 1 <= steps <= MAX_GRID_STEPS:
+        raise ValueError(f"{axis}_steps must be between 1 and {MAX_GRID_STEPS}")
+    return parameter, np.linspace(float(request.args.get(f'{axis}_min', low)),
+                                  float(request.args.get(f'{axis}_max', high)), steps)
+
+
+def request_toggles():
+    # ?toggles=SUBCON,ZERO_SAM&pricing=CATEGORY_A_UPDATE
+    return ([item for item in request.args.get('toggles', '').split(',') if item],
+            [item for item in request.args.get('pricing', '').split(',') if item])
+
+
+@server.route('/api/sweep')
+def sweep_api():
+    """Recovery rates over a grid: ?x=price:FTT&x_min=0&x_max=10&x_steps=100&y=haircut:Venture Investments&...
+
+    Ranges default to the panel's, steps to SWEEP_STEPS; ``recovery`` is indexed [y][x], with one row without ``y``.
+    """
+    try:
+        sweep = get_sweep(current(), *request_toggles())
+        x_parameter, x_values = sweep_axis('x', sweep)
+        if x_parameter is None:
+            raise ValueError("x is required")
+        y_parameter, y_values = sweep_axis('y', sweep)
+        rates = sweep.grid(x_parameter, x_values, y_parameter, y_values)
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'x': {'parameter': x_parameter, 'values': x_values.tolist()},
+        'y': {'parameter': y_parameter, 'values': y_values.tolist()} if y_parameter else None,
+        'recovery': {name: rates[i].tolist() for i, name in enumerate(EXCHANGE_NAMES)},
+    })
+
+
+@server.route('/api/tornado')
+def tornado_api():
+    """Base recovery rate per exchange and the rates at the low and high end of every parameter's default range."""
+    try:
+        tornado = get_tornado(current(), *request_toggles())
+    except (ValueError, KeyError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({name: {'base': base, 'parameters': {parameter: {'at_low': low, 'at_high': high}
+                                                        for parameter, low, high in bars}}
+                    for name, (base, bars) in tornado.items()})
+
+
+def get_version_diff(dataset, fingerprint):
+    # Cells that differ from version ``fingerprint`` to the one being served, as records; cached with the scenarios
+    other = registry.get(fingerprint)
+
+    def compute():
+        diff = diff_workbooks(other.dataframes(), dataset.version.dataframes())
+        return json.loads(diff.to_json(orient='records'))
+
+    return dataset.cache.get_or_compute(('diff', other.fingerprint), compute)
+
+
+@app.callback(
+    Output('version-diff-table', 'data'),
+    Output('version-diff-summary', 'children'),
+    Input('compare-version', 'value')
+)
+@instrument_callback
+def update_version_diff(fingerprint):
+    if not fingerprint:
+        return [], ""
+    dataset = current()
+    try:
+        records = get_version_diff(dataset, fingerprint)
+    except KeyError:
+        return [], "That version is no longer available."
+    counts = {change: sum(record['change'] == change for record in records) for change in ['changed', 'added', 'removed']}
+    return records, (f"{dataset.version.label} against {registry.get(fingerprint).label}: "
+                     f"{counts['changed']} changed, {counts['added']} added and {counts['removed']} removed cells")
+
+
+@server.route('/api/versions')
+def versions_api():
+    """Registered workbook versions, newest first, flagging the one being served."""
+    return jsonify([{'fingerprint': version.fingerprint, 'label': version.label, 'source': version.source,
+                     'registered_at': version.registered_at, 'current': version is registry.current,
+                     'loaded': version.state is not None}
+                    for version in registry.versions()])
+
+
+@server.route('/api/diff')
+def diff_api():
+    """Cell-level differences: ?from=<fingerprint prefix>&to=<fingerprint prefix>, ``to`` defaulting to the served one."""
+    try:
+        new = registry.get(request.args['to']) if request.args.get('to') else registry.current
+        records = get_version_diff(registry.state(new), request.args['from'])
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'from': registry.get(request.args['from']).fingerprint, 'to': new.fingerprint,
+                    'cells': records})
+
+
+def scenario_cache_metrics():
+    cache = current().cache
+    return [('ftx_scenario_cache_lookups_total', 'counter', cache.hits, {'result': 'hits'}),
+            ('ftx_scenario_cache_lookups_total', 'counter', cache.misses, {'result': 'misses'})]
+
+
+metrics.describe('ftx_scenario_cache_lookups_total', 'Scenario cache lookups, in memory or on disk.')
+metrics.register_collector(scenario_cache_metrics)
+
+
+@server.route('/metrics')
+def metrics_endpoint():
+    # Prometheus scrape target: callback and span histograms, external request latency and cache hit counts
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+if SERVER_TIMING:
+    @server.before_request
+    def collect_spans():
+        g.spans = start_request_spans()
+
+    @server.after_request
+    def add_server_timing(response):
+        spans = g.get('spans')
+        if spans:
+            response.headers['Server-Timing'] = server_timing(spans)
+        return response
+
+
+if CLIENTSIDE_SCENARIOS:
+    # Price toggles still go to the server, for the bundle priced on the latest snapshot. Recovery toggles are
+    # evaluated in the browser.
+    @app.callback(
+        Output('scenario-bundle', 'data'),
+        Input('exchange-overview-checkbox-pricing', 'value')
+    )
+    def update_scenario_bundle(pricing_items):
+        price_refresher.ensure_started()
+        registry.ensure_started()
+        return get_scenario_bundle(current(), pricing_items)
+
+    app.clientside_callback(
+        ClientsideFunction('scenarios', 'update_exchange_graphs'),
+        Output('ftx_dotcom_exchange_overview_graph', 'figure'),
+        Output('ftx_us_exchange_overview_graph', 'figure'),
+        Output('ftx_intl_pie_chart', 'figure'),
+        Output('ftx_us_pie_chart', 'figure'),
+        Output('recovery-rate-store', 'data'),
+        Input('exchange-overview-checkbox', 'value'),
+        Input('scenario-bundle', 'data'),
+        State('ftx_dotcom_exchange_overview_graph', 'figure'),
+        State('ftx_us_exchange_overview_graph', 'figure'),
+        State('ftx_intl_pie_chart', 'figure'),
+        State('ftx_us_pie_chart', 'figure'),
+    )
+    app.clientside_callback(
+        ClientsideFunction('scenarios', 'update_recovery_distribution'),
+        Output('ftx_dotcom_recovery_distribution', 'children'),
+        Output('ftx_us_recovery_distribution', 'children'),
+        Input('exchange-overview-checkbox', 'value'),
+        Input('scenario-bundle', 'data'),
+    )
+    app.clientside_callback(
+        ClientsideFunction('scenarios', 'update_recovery_history_graph'),
+        Output('recovery-history-graph', 'figure'),
+        Input('exchange-overview-checkbox', 'value'),
+        Input('scenario-bundle', 'data'),
+    )
+
+
 if __name__ == '__main__':
     app.run_server(debug=True)
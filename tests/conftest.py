@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+from data_processing import binance_stub
+
+# Keep the tests off the network and out of the app's own caches; these are read when the modules load
+BINANCE = binance_stub.serve()
+TEST_DIR = tempfile.mkdtemp(prefix='ftx-tests-')
+os.environ['WORKBOOK_SNAPSHOT_DIR'] = os.path.join(TEST_DIR, 'snapshot')
+os.environ['SCENARIO_CACHE_DIR'] = os.path.join(TEST_DIR, 'scenario_cache')
+os.environ['PRICE_CACHE_PATH'] = os.path.join(TEST_DIR, 'prices.sqlite3')
+os.environ['PRICE_HISTORY_DIR'] = os.path.join(TEST_DIR, 'price_history')
+os.environ['DATASET_DIR'] = os.path.join(TEST_DIR, 'versions')
+os.environ['BINANCE_API_URL'] = BINANCE.url
+os.environ['PRICE_REFRESHER'] = '0'
+os.environ['DATASET_POLL'] = '0'
+
+import pytest
+from data_processing.data import WORKBOOK_PATH, load_ledgers, load_petition_prices
+from data_processing.scenarios import ScenarioEngine, SCENARIO_SHEETS
+
+WORKBOOK = os.path.abspath(WORKBOOK_PATH)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def engine(tmp_path_factory):
+    # The real workbook, compiled once into a snapshot of the test run's own
+    return ScenarioEngine(load_ledgers(SCENARIO_SHEETS, path=WORKBOOK,
+                                       snapshot_dir=str(tmp_path_factory.mktemp('engine_snapshot'))))
+
+
+@pytest.fixture(scope='session')
+def petition_prices():
+    return load_petition_prices(os.path.join(os.path.dirname(WORKBOOK), 'ftx_crypto_prices.csv'))
+
+
+@pytest.fixture
+def binance():
+    # The stub every Binance request goes to; ``requests`` counts the kline requests it has answered
+    return BINANCE
+
+
+@pytest.fixture(scope='session')
+def workbook():
+    return WORKBOOK
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+from data_processing.scenarios import all_scenarios
+
+
+@pytest.fixture(scope='module')
+def client():
+    import main
+    return main.app.server.test_client()
+
+
+def test_index_and_layout_are_served(client):
+    index = client.get('/')
+    assert index.status_code == 200
+    assert b'_dash-renderer' in index.data or b'dash-renderer' in index.data
+
+    layout = client.get('/_dash-layout')
+    assert layout.status_code == 200
+    assert layout.headers['Cache-Control'] == 'no-cache'
+    assert json.loads(layout.data)['type'] == 'Div'
+
+
+CALLBACK_INPUTS_SCRIPT = """
+import json, main
+print(json.dumps([[i['id'] + '.' + i['property'] for i in callback['inputs']]
+                  for callback in main.app.callback_map.values() if 'callback' in callback]))
+"""
+
+
+def test_clientside_mode_serves_no_callback_on_the_recovery_toggles(tmp_path):
+    env = dict(os.environ, CLIENTSIDE_SCENARIOS='1', SCENARIO_CACHE_DIR=str(tmp_path / 'cache'),
+               DATASET_DIR=str(tmp_path / 'versions'))
+    result = subprocess.run([sys.executable, '-c', CALLBACK_INPUTS_SCRIPT], env=env, capture_output=True, text=True,
+                            check=True)
+    server_inputs = json.loads(result.stdout.strip().splitlines()[-1])
+    assert server_inputs
+    assert all('exchange-overview-checkbox.value' not in inputs for inputs in server_inputs)
+    assert ['sweep-x.value', 'sweep-y.value', 'sweep-exchange.value', 'sweep-refresh.n_clicks'] in server_inputs
+
+
+def test_history_bundle_has_every_combination(client):
+    import main
+    history = main.current().recovery_history
+    bundle = main.recovery_history_bundle(history)
+    assert set(bundle['series']) == {'|'.join(sorted(selected)) for selected, _ in all_scenarios()}
+    days, rates = history.series(['SUBCON', 'ZERO_SAM'])
+    assert bundle['series']['SUBCON|ZERO_SAM'] == [[round(float(r), 2) for r in rates[:, i]] for i in range(2)]
+    assert len(bundle['figure']['data']) == 2
+
+
+def test_toggles_without_a_snapshot_are_left_out(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main.price_refresher, 'snapshot', lambda: {})
+    assert main.snapshot_prices(['CATEGORY_A_UPDATE']) == ([], {}, {})
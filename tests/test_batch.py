@@ -0,0 +1,24 @@
+import os
+import shutil
+import numpy as np
+from data_processing.batch import batch_snapshot_dir, run_batch, resolve_scenarios, PriceSources
+from data_processing.scenarios import all_scenarios
+from data_processing.simulation import EXCHANGES, exchange_totals
+from data_processing.snapshot import SNAPSHOT_DIR
+
+
+def test_batch_matches_the_engine_and_keeps_its_own_snapshot(engine, workbook, tmp_path):
+    other = str(tmp_path / 'other.xlsx')
+    shutil.copy(workbook, other)
+    app_manifest = os.path.join(SNAPSHOT_DIR, 'manifest.json')
+    app_snapshot = os.stat(app_manifest).st_mtime_ns if os.path.exists(app_manifest) else None
+
+    scenarios = resolve_scenarios([{'toggles': selected} for selected, _ in all_scenarios()], PriceSources())
+    results = run_batch(scenarios, other, workers=2)
+
+    assert os.path.isdir(batch_snapshot_dir(other))
+    assert (os.stat(app_manifest).st_mtime_ns if os.path.exists(app_manifest) else None) == app_snapshot
+    assert len(results) == len(scenarios) * len(EXCHANGES)
+    for scenario, rows in zip(scenarios, np.split(results.to_numpy(), len(scenarios))):
+        totals = exchange_totals(engine.run(scenario['toggles'], []))
+        np.testing.assert_allclose(rows[:, 4].astype(float), [totals[name][0] for name in EXCHANGES])
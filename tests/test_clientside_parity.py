@@ -0,0 +1,28 @@
+import json
+import os
+import shutil
+import subprocess
+import pytest
+from data_processing.clientside import PARITY_CHECK_SCRIPT, PARITY_FIXTURE_PATH, parity_fixture
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def fixture_path(engine, tmp_path_factory):
+    # The fixture regenerated from this checkout, as python -m data_processing.clientside --write would
+    path = tmp_path_factory.mktemp('parity') / 'clientside_parity.json'
+    path.write_text(json.dumps(parity_fixture(engine), separators=(',', ':')))
+    return path
+
+
+def test_python_matches_the_stored_fixture(fixture_path):
+    with open(os.path.join(ROOT, PARITY_FIXTURE_PATH), 'r') as f:
+        stored = json.load(f)
+    assert json.loads(fixture_path.read_text()) == stored
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_scenarios_js_matches_the_python_engine(fixture_path):
+    result = subprocess.run(['node', PARITY_CHECK_SCRIPT, str(fixture_path)], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
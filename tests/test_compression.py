@@ -0,0 +1,66 @@
+import gzip
+import json
+import pytest
+from flask import Flask, jsonify
+from layouts.compression import compress_responses
+
+PAYLOAD = {'values': list(range(1000))}
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'app.js').write_text('var x = 1;\n' * 500)
+    app = Flask(__name__, static_folder=str(tmp_path), static_url_path='/static')
+
+    @app.route('/data', methods=['GET', 'POST'])
+    def data():
+        return jsonify(PAYLOAD)
+
+    compress_responses(app)
+    return app.test_client()
+
+
+def test_get_is_compressed_and_revalidated(client):
+    response = client.get('/data', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+    etag = response.headers['ETag']
+    assert etag.endswith('-gzip"')
+
+    revalidated = client.get('/data', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    # The identity body is a different representation with its own tag
+    assert client.get('/data', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_post_gets_no_etag_and_412_when_conditional(client):
+    response = client.post('/data', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'ETag' not in response.headers
+
+    etag = client.get('/data', headers={'Accept-Encoding': 'gzip'}).headers['ETag']
+    assert client.post('/data', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 412
+    assert client.post('/data', headers={'If-None-Match': '*'}).status_code == 412
+    assert client.post('/data', headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_static_files_get_an_etag_per_encoding(client):
+    identity = client.get('/static/app.js')
+    encoded = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    identity.close()
+    encoded.close()
+    assert encoded.headers['Content-Encoding'] == 'gzip'
+    assert identity.headers['ETag'] != encoded.headers['ETag']
+    assert encoded.headers['ETag'] == identity.headers['ETag'][:-1] + '-gzip"'
+    revalidated = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip',
+                                                        'If-None-Match': encoded.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_brotli_is_preferred_when_installed(client):
+    brotli = pytest.importorskip('brotli')
+    response = client.get('/data', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert json.loads(brotli.decompress(response.data)) == PAYLOAD
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from data_processing.ledger import Ledger
+from data_processing.ops import Add, Zero, apply_ops, compile_ops
+from data_processing.scenario_state import ScenarioState
+from data_processing.scenarios import all_scenarios
+
+
+def assert_same_sheets(actual, expected):
+    for key in expected:
+        assert list(actual[key].index) == list(expected[key].index), key
+        np.testing.assert_allclose(actual[key].values, expected[key].values, rtol=0, atol=1e-9, err_msg=key)
+
+
+@pytest.mark.parametrize('selected', [selected for selected, _ in all_scenarios()], ids='|'.join)
+def test_compiled_scenario_matches_unrounded_run(engine, petition_prices, selected):
+    data = engine.priced([], token_prices=petition_prices, rounding=False)
+    compiled = engine.compile(selected, data).apply_to(data)
+    assert_same_sheets(compiled, engine.run(selected, [], token_prices=petition_prices, rounding=False))
+
+
+def test_compiled_scenario_matches_unrounded_run_with_recovery_params(engine):
+    params = {'CLAIM_ALAMEDA': {'alameda_recovery_rate': 0.25}}
+    data = engine.priced([])
+    compiled = engine.compile(['CLAIM_ALAMEDA', 'SUBCON'], data, params).apply_to(data)
+    assert_same_sheets(compiled, engine.run(['CLAIM_ALAMEDA', 'SUBCON'], [], recovery_params=params, rounding=False))
+
+
+def small_state():
+    nan = np.nan
+    return ScenarioState({
+        'a': Ledger(['x', 'y'], ['v', 'w'], [[1.0, 2.0], [nan, 4.0]]).freeze(),
+        'b': Ledger(['z'], ['v', 'w'], [[10.0, nan]]).freeze(),
+    })
+
+
+FIRST = [Add(('a', 'x', 'v'), [('b', 'z', 'v')], 2.0), Add(('a', 'new', 'w'), [('a', None, 'w')])]
+SECOND = [Zero('b', rows=['z']), Add(('b', 'z', 'w'), [('a', 'x', 'v'), ('a', 'y', 'v')], -1.0)]
+
+
+def test_compiled_ops_keep_blanks_and_new_rows():
+    data = small_state()
+    compiled = compile_ops(FIRST, data).apply_to(data)
+    assert_same_sheets(compiled, apply_ops(small_state(), FIRST, rounding=False))
+    assert np.isnan(compiled['a'].get('y', 'v'))
+    assert compiled['a'].index == ['x', 'y', 'new']
+
+
+@pytest.mark.parametrize('order', [(FIRST, SECOND), (SECOND, FIRST)], ids=['first_then_second', 'second_then_first'])
+def test_then_applies_the_second_scenario_after_the_first(order):
+    first_ops, second_ops = order
+    data = small_state()
+    first = compile_ops(first_ops, data)
+    middle = first.apply_to(data)
+    chained = first.then(compile_ops(second_ops, middle))
+    assert_same_sheets(chained.apply_to(small_state()), apply_ops(small_state(), first_ops + second_ops, rounding=False))
+
+
+def test_then_order_matters():
+    data = small_state()
+    forward = compile_ops(FIRST, data)
+    forward = forward.then(compile_ops(SECOND, forward.apply_to(data))).apply_to(small_state())
+    backward = compile_ops(SECOND, data)
+    backward = backward.then(compile_ops(FIRST, backward.apply_to(data))).apply_to(small_state())
+    assert forward['b'].get('z', 'w') != backward['b'].get('z', 'w')
+
+
+def test_then_rejects_scenarios_over_different_sheets():
+    data = small_state()
+    first = compile_ops(FIRST, data)
+    with pytest.raises(ValueError):
+        first.then(compile_ops(SECOND, data))
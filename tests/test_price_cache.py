@@ -0,0 +1,54 @@
+import json
+import threading
+from data_processing.price_cache import PriceCache
+
+
+def cache_at(tmp_path, legacy=None):
+    legacy_path = tmp_path / 'cache.json'
+    if legacy is not None:
+        legacy_path.write_text(json.dumps(legacy))
+    return PriceCache(str(tmp_path / 'prices.sqlite3'), legacy_path=str(legacy_path))
+
+
+def test_hits_come_from_memory_then_the_shared_database(tmp_path):
+    cache = cache_at(tmp_path)
+    assert cache.get_many(['BTCUSDT'], '2024-03-09') == {}
+    cache.put_many({'BTCUSDT': 60000.0, 'ETHUSDT': 3000.0}, '2024-03-09')
+    assert cache.get_many(['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], '2024-03-09') == {'BTCUSDT': 60000.0, 'ETHUSDT': 3000.0}
+    assert cache.stats() == {'hits': 2, 'backend_hits': 0, 'misses': 2}
+
+    # Another worker on the same file reads what this one wrote
+    other = cache_at(tmp_path)
+    assert other.get_many(['BTCUSDT'], '2024-03-09') == {'BTCUSDT': 60000.0}
+    assert other.get_many(['BTCUSDT'], '2024-03-09') == {'BTCUSDT': 60000.0}
+    assert other.stats() == {'hits': 1, 'backend_hits': 1, 'misses': 0}
+
+
+def test_latest_is_the_newest_close_per_symbol(tmp_path):
+    cache = cache_at(tmp_path)
+    cache.put_many({'BTCUSDT': 1.0, 'ETHUSDT': 2.0}, '2024-03-08')
+    cache.put_many({'BTCUSDT': 3.0}, '2024-03-09')
+    assert cache.latest(['BTCUSDT', 'ETHUSDT', 'SOLUSDT']) == {'BTCUSDT': ('2024-03-09', 3.0),
+                                                               'ETHUSDT': ('2024-03-08', 2.0)}
+
+
+def test_legacy_cache_json_is_imported_once(tmp_path):
+    cache = cache_at(tmp_path, {'BTCUSDT': {'2023-01-01': 16000}})
+    assert cache.get_many(['BTCUSDT'], '2023-01-01') == {'BTCUSDT': 16000.0}
+    (tmp_path / 'cache.json').write_text(json.dumps({'BTCUSDT': {'2023-01-01': 1}}))
+    assert cache_at(tmp_path).get_many(['BTCUSDT'], '2023-01-01') == {'BTCUSDT': 16000.0}
+
+
+def test_concurrent_writers(tmp_path):
+    cache = cache_at(tmp_path)
+
+    def write(n):
+        cache_at(tmp_path).put_many({f'T{n}{i}USDT': float(i) for i in range(50)}, '2024-03-09')
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    symbols = [f'T{n}{i}USDT' for n in range(8) for i in range(50)]
+    assert len(cache.get_many(symbols, '2024-03-09')) == len(symbols)
@@ -0,0 +1,42 @@
+import numpy as np
+from data_processing.binance_stub import stub_close
+from data_processing.price_history import PriceHistory, backfill, backfill_symbol, to_day
+
+
+def test_backfill_pages_long_ranges_and_stores_every_day(tmp_path, binance):
+    history = PriceHistory(str(tmp_path))
+    before = binance.requests
+    added = backfill_symbol('BTCUSDT', '2020-01-01', '2023-06-30', history)
+    days = to_day('2023-06-30') - to_day('2020-01-01') + 1
+    assert added == days
+    # 1277 days at 1000 per request
+    assert binance.requests - before == 2
+    stored_days, closes = history.range('BTCUSDT')
+    np.testing.assert_array_equal(stored_days.astype(np.int64), np.arange(to_day('2020-01-01'), to_day('2023-06-30') + 1))
+    assert closes[-1] == stub_close('BTCUSDT', to_day('2023-06-30'))
+
+
+def test_backfill_only_requests_missing_days(tmp_path, binance):
+    history = PriceHistory(str(tmp_path))
+    backfill_symbol('ETHUSDT', '2022-11-11', '2022-12-31', history)
+    before = binance.requests
+    assert backfill_symbol('ETHUSDT', '2022-11-11', '2022-12-31', history) == 0
+    assert binance.requests == before
+
+    # One request for each side of the stored days
+    assert backfill_symbol('ETHUSDT', '2022-11-01', '2023-01-10', history) == 10 + 10
+    assert binance.requests - before == 2
+    assert history.range('ETHUSDT')[0].size == to_day('2023-01-10') - to_day('2022-11-01') + 1
+
+
+def test_backfill_reports_failures_per_pair(tmp_path):
+    history = PriceHistory(str(tmp_path))
+
+    def fetch(symbol, start_time, end_time):
+        if symbol == 'SOLUSDT':
+            raise ConnectionError('down')
+        return [start_time], [1.0]
+
+    added, failed = backfill(['BTC', 'SOL'], '2022-11-11', '2022-11-12', history, fetch)
+    assert added == {'BTCUSDT': 1}
+    assert list(failed) == ['SOLUSDT']
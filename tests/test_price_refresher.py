@@ -0,0 +1,100 @@
+from datetime import datetime
+import pytest
+from data_processing.price_cache import PriceCache
+from data_processing.price_refresher import PriceRefresher, close_date, describe_snapshot
+
+DAY = 86400
+START = datetime(2024, 3, 10, 12, 0).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class StubSource:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.calls = 0
+        self.failing = False
+
+    def __call__(self, symbols):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError('rate limited')
+        return {symbol: 100.0 * self.calls + i for i, symbol in enumerate(symbols)}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def source():
+    return StubSource(['BTC', 'ETH'])
+
+
+@pytest.fixture
+def refresher(clock, source):
+    return PriceRefresher({'CATEGORY_A_UPDATE': (source.symbols, source)}, clock=clock, poll=60, retry=300)
+
+
+def test_refreshes_once_per_close_date(refresher, clock, source):
+    assert refresher.tick() == ['CATEGORY_A_UPDATE']
+    snapshot = refresher.snapshot()['CATEGORY_A_UPDATE']
+    assert snapshot['as_of'] == close_date(START) == '2024-03-09'
+    assert snapshot['prices'] == {'BTC': 100.0, 'ETH': 101.0}
+
+    clock.now += 3600
+    assert refresher.tick() == []
+    clock.now += DAY
+    assert refresher.tick() == ['CATEGORY_A_UPDATE']
+    assert refresher.snapshot()['CATEGORY_A_UPDATE']['as_of'] == '2024-03-10'
+    assert source.calls == 2
+
+
+def test_failures_keep_the_previous_prices_and_retry_later(refresher, clock, source):
+    refresher.tick()
+    previous = refresher.snapshot()['CATEGORY_A_UPDATE']
+    clock.now += DAY
+    source.failing = True
+    assert refresher.tick() == []
+    assert refresher.snapshot()['CATEGORY_A_UPDATE'] is previous
+
+    clock.now += 299
+    assert refresher.tick() == []
+    assert source.calls == 2
+    source.failing = False
+    clock.now += 1
+    assert refresher.tick() == ['CATEGORY_A_UPDATE']
+    assert 'fetched' in describe_snapshot(refresher.snapshot(), 'CATEGORY_A_UPDATE')
+
+
+def test_cached_prices_of_different_dates_are_reported_and_refreshed(refresher, clock, tmp_path):
+    cache = PriceCache(str(tmp_path / 'prices.sqlite3'), legacy_path=str(tmp_path / 'cache.json'))
+    cache.put_many({'BTCUSDT': 60000.0, 'ETHUSDT': 3000.0}, '2024-03-08')
+    cache.put_many({'ETHUSDT': 3100.0}, '2024-03-09')
+    refresher.load_cached(cache)
+
+    snapshot = refresher.snapshot()['CATEGORY_A_UPDATE']
+    assert snapshot['prices'] == {'BTC': 60000.0, 'ETH': 3100.0}
+    assert snapshot['as_of'] == '2024-03-08'
+    assert snapshot['dates'] == {'BTC': '2024-03-08', 'ETH': '2024-03-09'}
+    assert describe_snapshot(refresher.snapshot(), 'CATEGORY_A_UPDATE') == \
+        "closes of 2024-03-08 to 2024-03-09 (older: BTC 2024-03-08) (cached)"
+    # Not every symbol has the latest close, so the first tick refreshes the set
+    assert refresher.due('CATEGORY_A_UPDATE', clock.now)
+
+
+def test_an_incomplete_cache_publishes_nothing(refresher, tmp_path):
+    cache = PriceCache(str(tmp_path / 'prices.sqlite3'), legacy_path=str(tmp_path / 'cache.json'))
+    cache.put_many({'BTCUSDT': 60000.0}, '2024-03-09')
+    refresher.load_cached(cache)
+    assert refresher.snapshot() == {}
+    # Toggles without a snapshot are left out of the scenario, so the workbook's values are what is shown
+    assert describe_snapshot({}, 'CATEGORY_A_UPDATE') == \
+        "latest prices not available yet, showing the workbook values until they are"
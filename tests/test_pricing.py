@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from data_processing import pricing
+from data_processing.binance_stub import stub_close, DAY_MS
+from data_processing.price_cache import PriceCache
+
+TOKENS = ['BTC', 'ETH', 'SOL', 'XRP', 'BNB']
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PriceCache(str(tmp_path / 'prices.sqlite3'), legacy_path=str(tmp_path / 'cache.json'))
+    monkeypatch.setattr(pricing, 'price_cache', cache)
+    return cache
+
+
+def yesterday_day():
+    yesterday, _ = pricing._yesterday()
+    return int(np.datetime64(yesterday.strftime('%Y-%m-%d'), 'D').astype(np.int64))
+
+
+def test_close_prices_are_fetched_once_per_symbol_and_cached(cache, binance):
+    before = binance.requests
+    prices = pricing.get_close_prices(TOKENS, '1d')
+    assert prices == {token: stub_close(token + 'USDT', yesterday_day()) for token in TOKENS}
+    assert binance.requests - before == len(TOKENS)
+
+    # Cached for the day: no more requests, and only the new symbol is fetched
+    assert pricing.get_close_prices(TOKENS, '1d') == prices
+    assert pricing.get_close_prices(TOKENS + ['DOGE'], '1d')['DOGE'] == stub_close('DOGEUSDT', yesterday_day())
+    assert binance.requests - before == len(TOKENS) + 1
+
+
+def test_one_failed_close_does_not_lose_the_others(cache, binance, monkeypatch):
+    fetch = pricing.fetch_binance_close
+
+    def flaky(symbol, interval, start_time):
+        if symbol == 'SOLUSDT':
+            raise ConnectionError('connection reset')
+        return fetch(symbol, interval, start_time)
+
+    before = binance.requests
+    monkeypatch.setattr(pricing, 'fetch_binance_close', flaky)
+    with pytest.raises(RuntimeError, match='SOL'):
+        pricing.get_close_prices(TOKENS, '1d')
+    assert binance.requests - before == len(TOKENS) - 1
+
+    # The others were cached, so the retry only fetches the one that failed
+    monkeypatch.setattr(pricing, 'fetch_binance_close', fetch)
+    prices = pricing.get_close_prices(TOKENS, '1d')
+    assert prices == {token: stub_close(token + 'USDT', yesterday_day()) for token in TOKENS}
+    assert binance.requests - before == len(TOKENS)
+
+
+def test_unknown_symbols_raise(binance):
+    with pytest.raises(ValueError, match='Invalid symbol'):
+        pricing.fetch_binance_close('BTCEUR', '1d', 0)
+
+
+def test_daily_closes_page_through_long_ranges(binance):
+    before = binance.requests
+    start = int(np.datetime64('2020-01-01', 'D').astype(np.int64))
+    open_times, closes = pricing.fetch_binance_daily_closes('ETHUSDT', start * DAY_MS, (start + 2199) * DAY_MS)
+    assert binance.requests - before == 3
+    assert [t // DAY_MS for t in open_times] == list(range(start, start + 2200))
+    assert closes[1234] == stub_close('ETHUSDT', start + 1234)
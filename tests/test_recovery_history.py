@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+from data_processing.data import binance_pair
+from data_processing.price_history import PriceHistory, backfill
+from data_processing.recovery_history import RecoveryHistory, update_recovery_history
+from data_processing.scenarios import all_scenarios
+from data_processing.simulation import EXCHANGES, exchange_totals
+from data_processing.transforms import CATEGORY_A_CRYPTO
+
+
+@pytest.fixture
+def history(tmp_path, binance):
+    history = PriceHistory(str(tmp_path / 'prices'))
+    _, failed = backfill(CATEGORY_A_CRYPTO, '2022-11-11', '2022-11-30', history)
+    assert not failed
+    return history
+
+
+def rates_on(engine, history, selected, day):
+    closes = {token: history.close_on(binance_pair(token), day) for token in CATEGORY_A_CRYPTO}
+    totals = exchange_totals(engine.run(selected, ['CATEGORY_A_UPDATE'], {'CATEGORY_A_UPDATE': closes}))
+    return np.array([totals[name][0] / totals[name][1] * 100 for name in EXCHANGES])
+
+
+def test_history_matches_a_run_at_each_days_closes(engine, petition_prices, history, tmp_path):
+    path = str(tmp_path / 'recovery.npz')
+    recovery = update_recovery_history(engine, 'a' * 64, petition_prices, history, path)
+    assert recovery.rates.shape == (len(all_scenarios()), 20, len(EXCHANGES))
+    assert str(recovery.days[0]) == '2022-11-11' and str(recovery.days[-1]) == '2022-11-30'
+    for selected, _ in all_scenarios():
+        days, rates = recovery.series(selected)
+        np.testing.assert_allclose(rates[0], rates_on(engine, history, selected, days[0]), rtol=1e-6)
+        # Later days replay the toggles linearly, without the ops' rounding of what they move to whole $M
+        for i in (7, 19):
+            np.testing.assert_allclose(rates[i], rates_on(engine, history, selected, days[i]), rtol=1e-5)
+
+
+def test_history_only_computes_new_days(engine, petition_prices, history, tmp_path):
+    path = str(tmp_path / 'recovery.npz')
+    first = update_recovery_history(engine, 'a' * 64, petition_prices, history, path)
+    modified = os.stat(path).st_mtime_ns
+    assert update_recovery_history(engine, 'a' * 64, petition_prices, history, path).rates.shape[1] == 20
+    assert os.stat(path).st_mtime_ns == modified
+
+    backfill(CATEGORY_A_CRYPTO, '2022-11-11', '2022-12-05', history)
+    extended = update_recovery_history(engine, 'a' * 64, petition_prices, history, path)
+    assert extended.rates.shape[1] == 25
+    np.testing.assert_array_equal(extended.rates[:, :20], first.rates)
+    np.testing.assert_allclose(extended.series(['SUBCON'])[1][24],
+                               rates_on(engine, history, ['SUBCON'], extended.days[24]), rtol=1e-5)
+    assert RecoveryHistory.load(path).rates.shape[1] == 25
+
+
+def test_another_workbook_starts_over(engine, petition_prices, history, tmp_path):
+    path = str(tmp_path / 'recovery.npz')
+    update_recovery_history(engine, 'a' * 64, petition_prices, history, path)
+    other = update_recovery_history(engine, 'b' * 64, petition_prices, history, path)
+    assert other.fingerprint == 'b' * 64
+    assert other.rates.shape[1] == 20
@@ -0,0 +1,94 @@
+import os
+import re
+import shutil
+import zipfile
+import pytest
+from data_processing.registry import DatasetRegistry
+from data_processing.scenarios import ScenarioEngine, SCENARIO_SHEETS
+from data_processing.simulation import exchange_totals
+from data_processing.workbook_diff import diff_workbooks
+
+
+def edit_us_stablecoin(path, value):
+    # Rewrite the cached value of FTX US Cash / Stablecoin Located Assets, which pandas reads, in place
+    with zipfile.ZipFile(path) as z:
+        members = {name: z.read(name) for name in z.namelist()}
+    sheet = members['xl/worksheets/sheet6.xml'].decode()
+    members['xl/worksheets/sheet6.xml'] = re.sub(r'(<c r="C2"[^>]*><v>)[^<]*(</v>)', rf'\g<1>{value}\g<2>',
+                                                 sheet).encode()
+    with zipfile.ZipFile(path + '.tmp', 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    os.replace(path + '.tmp', path)
+
+
+def build(version):
+    return ScenarioEngine(version.ledgers(SCENARIO_SHEETS))
+
+
+def us_assets(registry):
+    return exchange_totals(registry.current_state().run([], []))['ftx_us'][0]
+
+
+@pytest.fixture
+def workbook_copy(workbook, tmp_path):
+    path = str(tmp_path / 'workbook.xlsx')
+    shutil.copy(workbook, path)
+    return path
+
+
+def registry_for(path, tmp_path, **kwargs):
+    return DatasetRegistry(build, path, str(tmp_path / 'versions'), poll=0, **kwargs)
+
+
+def test_check_swaps_in_a_changed_workbook_once_it_settles(workbook_copy, tmp_path):
+    registry = registry_for(workbook_copy, tmp_path)
+    first = registry.load()
+    before = us_assets(registry)
+
+    edit_us_stablecoin(workbook_copy, 1088)
+    assert registry.check() is None
+    assert registry.current is first
+    second = registry.check()
+    assert second is registry.current and second is not first
+    assert us_assets(registry) == pytest.approx(before + 1000)
+    assert registry.check() is None
+
+    diff = diff_workbooks(first.dataframes(), second.dataframes())
+    assert len(diff) == 1
+    assert (diff.iloc[0]['row'], diff.iloc[0]['old'], diff.iloc[0]['new']) == ('Cash / Stablecoin', 88, 1088)
+
+
+def test_a_workbook_that_does_not_parse_is_not_registered(workbook_copy, tmp_path):
+    registry = registry_for(workbook_copy, tmp_path)
+    current = registry.load()
+    with open(workbook_copy, 'wb') as f:
+        f.write(b'not a workbook')
+    registry.check()
+    assert registry.check() is None
+    assert registry.current is current
+    assert sorted(os.listdir(registry.directory)) == ['.lock', current.fingerprint[:16]]
+
+
+def test_workers_sharing_the_directory_register_once(workbook_copy, tmp_path):
+    first = registry_for(workbook_copy, tmp_path).load()
+    other = registry_for(workbook_copy, tmp_path)
+    assert other.register(workbook_copy).fingerprint == first.fingerprint
+    assert other.register(workbook_copy).directory == first.directory
+    assert [version.fingerprint for version in other.versions()] == [first.fingerprint]
+
+
+def test_eviction_keeps_versions_on_disk_and_pruning_keeps_the_newest(workbook_copy, tmp_path):
+    registry = registry_for(workbook_copy, tmp_path, max_loaded=1, keep=2)
+    versions = [registry.load()]
+    for value in (1088, 2088):
+        edit_us_stablecoin(workbook_copy, value)
+        versions.append(registry.activate(registry.register(workbook_copy)))
+        # Only the current version stays in memory, but every version stays on disk until pruned
+        assert [version.state is not None for version in versions] == [False] * (len(versions) - 1) + [True]
+
+    assert [version.fingerprint for version in registry.versions()] == [v.fingerprint for v in versions[:0:-1]]
+    assert not os.path.exists(versions[0].directory)
+    older = versions[1]
+    assert os.path.exists(older.path)
+    assert exchange_totals(registry.state(older).run([], []))['ftx_us'][0] != us_assets(registry)
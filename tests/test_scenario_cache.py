@@ -0,0 +1,23 @@
+from data_processing import scenario_cache
+from data_processing.scenario_cache import ScenarioCache, cache_namespace, scenario_key
+from data_processing.simulation import DEFAULT_ASSUMPTIONS
+
+
+def test_results_are_shared_through_the_directory(tmp_path):
+    key = scenario_key(['ZERO_SAM', 'SUBCON'], [])
+    assert key == (('SUBCON', 'ZERO_SAM'), (), 'petition')
+    first = ScenarioCache('abc', cache_dir=str(tmp_path))
+    assert first.get_or_compute(key, lambda: {'rate': 1.5}) == {'rate': 1.5}
+    assert ScenarioCache('abc', cache_dir=str(tmp_path)).get(key) == {'rate': 1.5}
+
+
+def test_namespace_changes_with_the_cache_version_and_the_assumptions(tmp_path, monkeypatch):
+    namespace = cache_namespace('abc', DEFAULT_ASSUMPTIONS)
+    assert namespace.startswith('abc-')
+    assert cache_namespace('abc', DEFAULT_ASSUMPTIONS) == namespace
+    assert cache_namespace('abc', dict(DEFAULT_ASSUMPTIONS, volatility=0.9)) != namespace
+
+    key = scenario_key(['SUBCON'], [])
+    ScenarioCache(namespace, cache_dir=str(tmp_path)).put(key, {'rate': 1.5})
+    monkeypatch.setattr(scenario_cache, 'SCENARIO_CACHE_VERSION', scenario_cache.SCENARIO_CACHE_VERSION + 1)
+    assert ScenarioCache(cache_namespace('abc', DEFAULT_ASSUMPTIONS), cache_dir=str(tmp_path)).get(key) is None
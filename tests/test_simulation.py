@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from data_processing.scenarios import all_scenarios
+from data_processing.simulation import EXCHANGES, LinearRecovery, RecoveryModel, exchange_totals, held_rows
+from data_processing.transforms import adjust_category_totals
+
+
+def assets(data):
+    totals = exchange_totals(data)
+    return np.array([totals[name][0] for name in EXCHANGES])
+
+
+@pytest.mark.parametrize('selected', [selected for selected, _ in all_scenarios()], ids='|'.join)
+def test_model_matches_unrounded_runs_at_other_prices(engine, petition_prices, selected):
+    model = RecoveryModel.build(engine, selected, [], {}, petition_prices, rounding=False)
+    rng = np.random.default_rng(len(selected))
+    for _ in range(3):
+        draw = model.reference_prices * rng.uniform(0.2, 3.0, len(model.tokens))
+        prices = petition_prices.copy()
+        prices[model.tokens] = draw
+        expected = assets(engine.run(selected, [], token_prices=prices, rounding=False))
+        recovery = model.recovery(draw[None, :], np.zeros((1, model.haircut_bases.shape[1])))[0]
+        np.testing.assert_allclose(recovery * model.liabilities / 100, expected, rtol=1e-12)
+
+
+def test_rounded_model_starts_from_the_dashboard_run(engine, petition_prices):
+    model = RecoveryModel.build(engine, ['CLAIM_ALAMEDA'], [], {}, petition_prices)
+    np.testing.assert_array_equal(model.base_assets,
+                                  assets(engine.run(['CLAIM_ALAMEDA'], [], token_prices=petition_prices)))
+
+
+@pytest.mark.parametrize('selected', [[], ['CLAIM_ALAMEDA', 'ZERO_SAM'], ['CLAIM_ALAMEDA', 'SUBCON', 'SUBCON_US']],
+                         ids='|'.join)
+def test_value_exposure_is_a_unit_bump(engine, petition_prices, selected):
+    data = engine.priced([], token_prices=petition_prices, rounding=False)
+    rows = [(key, label) for key, label, _ in held_rows(engine, {'BTC', 'SOL', 'FTT'})]
+    exposure = LinearRecovery(engine, selected, data).value_exposure(rows)
+    base = assets(engine.run(selected, [], token_prices=petition_prices, rounding=False))
+    for (key, label), row in zip(rows, exposure):
+        def bump(state, key=key, label=label):
+            ledger = state[key]
+            ledger.set(label, 'Located Assets', ledger.get(label, 'Located Assets') + 1.0)
+            adjust_category_totals(ledger)
+        bumped = assets(engine.run(selected, [], token_prices=petition_prices, adjust=bump, rounding=False))
+        np.testing.assert_allclose(row, bumped - base, rtol=0, atol=1e-9)
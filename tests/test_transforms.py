@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from data_processing.binance_stub import stub_close
+from data_processing.ops import apply_ops
+from data_processing.scenario_state import ScenarioState
+from data_processing.scenarios import SCENARIO_SHEETS, all_scenarios, recovery_ops
+from data_processing.transforms import CATEGORY_A_CRYPTO, LIQUID_SECURITIES, adjust_category_a, \
+    inject_last_close_security_prices
+
+CLOSES = {'CATEGORY_A_UPDATE': {token: stub_close(token + 'USDT', 19700) for token in CATEGORY_A_CRYPTO},
+          'LIQUID_SEC_UPDATE': {ticker: 10.0 + i for i, ticker in enumerate(LIQUID_SECURITIES)}}
+
+
+def row_by_row(engine, selected, pricing_items):
+    # run() with the Category A closes applied one ticker and one sheet at a time, as before the vectorised reprice
+    data = ScenarioState(engine.baseline)
+    if 'CATEGORY_A_UPDATE' in pricing_items:
+        for ticker, close_price in CLOSES['CATEGORY_A_UPDATE'].items():
+            for key in ['ftx_intl_crypto_df', 'ftx_us_crypto_df', 'alameda_df']:
+                ledger = data[key]
+                if ticker in ledger:
+                    quantity = ledger.get(ticker, 'Quantity')
+                    ledger.set(ticker, 'Located Assets', round((close_price * quantity) / 1000000.0))
+        adjust_category_a(data['ftx_intl_crypto_df'])
+        adjust_category_a(data['ftx_us_crypto_df'])
+    if 'LIQUID_SEC_UPDATE' in pricing_items:
+        inject_last_close_security_prices(data, CLOSES['LIQUID_SEC_UPDATE'])
+    return apply_ops(data, recovery_ops(selected, data))
+
+
+@pytest.mark.parametrize('selected, pricing_items',
+                         [scenario for scenario in all_scenarios(include_pricing=True) if scenario[1]],
+                         ids=lambda items: '|'.join(items) or 'none')
+def test_reprice_matches_the_row_by_row_update(engine, selected, pricing_items):
+    expected = row_by_row(engine, selected, pricing_items)
+    actual = engine.run(selected, pricing_items, CLOSES)
+    for key in SCENARIO_SHEETS:
+        ledger = actual[key]
+        # The row-by-row update never wrote the Price column
+        columns = [j for j, column in enumerate(ledger.columns) if column != 'Price']
+        assert list(ledger.index) == list(expected[key].index), key
+        np.testing.assert_array_equal(ledger.values[:, columns], expected[key].values[:, columns], err_msg=key)
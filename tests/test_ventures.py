@@ -0,0 +1,61 @@
+import math
+import pytest
+from data_processing.ventures import VenturesStore, split_filter_part
+
+COLUMNS = ['Name', 'Structure', 'Amount']
+RECORDS = [
+    {'Name': 'Alpha', 'Structure': 'Equity', 'Amount': '$1,500'},
+    {'Name': 'beta', 'Structure': 'SAFE', 'Amount': 200},
+    {'Name': 'Gamma', 'Structure': None, 'Amount': 50.0},
+    {'Name': 'Delta', 'Structure': 'Equity', 'Amount': math.nan},
+    {'Name': 'epsilon', 'Structure': 'Token', 'Amount': 3000},
+]
+
+
+@pytest.fixture
+def store():
+    return VenturesStore(COLUMNS, RECORDS)
+
+
+def names(records):
+    return [record['Name'] for record in records]
+
+
+def test_split_filter_part():
+    assert split_filter_part('{Structure} contains "SA"') == ('Structure', 'contains', 'SA')
+    assert split_filter_part('{Amount} >= 100') == ('Amount', 'ge', '100')
+    assert split_filter_part('{Name} eq "it\\"s"') == ('Name', 'eq', 'it"s')
+    assert split_filter_part('nonsense') == (None, None, None)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('{Structure} eq "equity"', ['Alpha', 'Delta']),
+    ('{Structure} ne "Equity"', ['beta', 'Gamma', 'epsilon']),
+    ('{Name} lt "c"', ['Alpha', 'beta']),
+    ('{Name} gt "d"', ['Delta', 'epsilon', 'Gamma']),
+    ('{Structure} contains "sa"', ['beta']),
+    ('{Amount} > 100', ['Alpha', 'beta', 'epsilon']),
+    ('{Amount} le 200 && {Structure} eq "SAFE"', ['beta']),
+    ('{Missing} eq "x"', ['Alpha', 'beta', 'Gamma', 'Delta', 'epsilon']),
+])
+def test_filters(store, query, expected):
+    records, _ = store.page(query, None, 0, 10)
+    assert sorted(names(records)) == sorted(expected)
+
+
+def test_sorting_puts_blanks_last_both_ways(store):
+    ascending, _ = store.page(None, [{'column_id': 'Amount', 'direction': 'asc'}], 0, 10)
+    assert names(ascending) == ['Gamma', 'beta', 'Alpha', 'epsilon', 'Delta']
+    descending, _ = store.page(None, [{'column_id': 'Amount', 'direction': 'desc'}], 0, 10)
+    assert names(descending) == ['epsilon', 'Alpha', 'beta', 'Gamma', 'Delta']
+    by_text, _ = store.page(None, [{'column_id': 'Structure', 'direction': 'asc'},
+                                   {'column_id': 'Name', 'direction': 'desc'}], 0, 10)
+    assert names(by_text) == ['Delta', 'Alpha', 'beta', 'epsilon', 'Gamma']
+
+
+def test_paging(store):
+    sort = [{'column_id': 'Name', 'direction': 'asc'}]
+    pages = [store.page(None, sort, page, 2) for page in range(3)]
+    assert [names(records) for records, _ in pages] == [['Alpha', 'beta'], ['Delta', 'epsilon'], ['Gamma']]
+    assert {count for _, count in pages} == {3}
+    assert store.page('{Name} eq "nobody"', sort, 0, 2) == ([], 1)
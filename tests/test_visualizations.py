@@ -0,0 +1,62 @@
+import copy
+import json
+import pytest
+from plotly.utils import PlotlyJSONEncoder
+from components.visualizations import patch_figure
+from data_processing.scenarios import RECOVERY_ORDER
+
+
+def apply_patch(figure, patch):
+    # What dash-renderer does with a Patch output: each operation in order, on the figure the browser holds
+    figure = copy.deepcopy(figure)
+    for operation in patch['operations']:
+        *path, last = operation['location']
+        target = figure
+        for key in path:
+            target = target[key]
+        if operation['operation'] == 'Assign':
+            target[last] = operation['params']['value']
+        elif operation['operation'] == 'Append':
+            target[last].append(operation['params']['value'])
+        elif operation['operation'] == 'Delete':
+            del target[last]
+        else:
+            raise AssertionError(f"unexpected patch operation {operation['operation']}")
+    return figure
+
+
+def as_client(value):
+    # Both sides as the browser sees them, after the JSON round trip
+    return json.loads(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+@pytest.fixture(scope='module')
+def scenario_figures(engine):
+    import main
+    return {name: main.create_exchange_figs(engine.run(selected, [], {}))[:4]
+            for name, selected in [('none', []), ('all', list(RECOVERY_ORDER))]}
+
+
+def test_exchange_figures_are_dicts(scenario_figures):
+    # patch_figure diffs dicts, so the bar charts and the pie charts alike must come back as one
+    assert all(isinstance(figure, dict) for figure in scenario_figures['none'])
+
+
+@pytest.mark.parametrize('old, new', [('none', 'all'), ('all', 'none')])
+def test_patched_figures_match_the_new_ones(scenario_figures, old, new):
+    for displayed, figure in zip(as_client(scenario_figures[old]), as_client(scenario_figures[new])):
+        patch = as_client(patch_figure(displayed, figure))
+        assert apply_patch(displayed, patch) == figure
+
+
+def test_patches_add_and_drop_traces():
+    displayed = {'data': [{'type': 'bar', 'y': [1]}, {'type': 'bar', 'y': [2]}, {'type': 'bar', 'y': [3]}],
+                 'layout': {'title': {'text': 'a'}}}
+    figure = {'data': [{'type': 'bar', 'y': [1], 'name': 'x'}], 'layout': {'title': {'text': 'b'}}}
+    assert apply_patch(displayed, as_client(patch_figure(displayed, figure))) == figure
+    assert apply_patch(figure, as_client(patch_figure(figure, displayed))) == displayed
+
+
+def test_nothing_displayed_sends_the_whole_figure(scenario_figures):
+    figure = scenario_figures['none'][0]
+    assert patch_figure(None, figure) is figure